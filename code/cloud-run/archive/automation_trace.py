@@ -0,0 +1,59 @@
+"""
+Phase 6 - 網站自動化的步驟計時與 Playwright 追蹤
+
+run_automation 變慢或失敗時，原本只有 print 輸出可以查。
+
+- StepTimings：每個步驟（start_browser、navigate_to_application_form、fill_personal_information、
+  upload_files、handle_recaptcha、check_agreement_checkbox、verify_form_completion、截圖、submit_application）
+  的開始時間、耗時與結果，放入執行結果的 timings
+- AUTOMATION_TRACE=true（或請求中 "trace": true）時以 context.tracing 錄製 Playwright 追蹤
+  （截圖、DOM 快照、網路），結束後 ZIP 與截圖上傳到同一個位置，結果中的 trace_url 為 Signed URL，
+  下載後以 `playwright show-trace <zip>` 檢視
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+# 追蹤設定（可用 Cloud Run 環境變數覆寫）
+TRACE = {
+    "ENABLED": os.environ.get("AUTOMATION_TRACE", "false").lower() == "true",
+    "SCREENSHOTS": os.environ.get("AUTOMATION_TRACE_SCREENSHOTS", "true").lower() == "true",
+    "SNAPSHOTS": os.environ.get("AUTOMATION_TRACE_SNAPSHOTS", "true").lower() == "true",
+}
+
+
+def tracing_options():
+    """context.tracing.start 的參數"""
+    return {"screenshots": TRACE["SCREENSHOTS"], "snapshots": TRACE["SNAPSHOTS"], "sources": False}
+
+
+class StepTimings:
+    """記錄每個步驟的耗時"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.steps = []
+
+    @contextmanager
+    def step(self, name):
+        """
+        計時一個步驟（async 程式碼中同樣以 with 使用）
+
+        Args:
+            name (str): 步驟名稱
+        """
+        entry = {"step": name, "offset_seconds": round(time.monotonic() - self.started, 3), "status": "ok"}
+        started = time.monotonic()
+        try:
+            yield entry
+        except Exception:
+            entry["status"] = "failed"
+            raise
+        finally:
+            entry["seconds"] = round(time.monotonic() - started, 3)
+            self.steps.append(entry)
+
+    def total_seconds(self):
+        """從建立到目前的總耗時"""
+        return round(time.monotonic() - self.started, 3)
@@ -0,0 +1,120 @@
+"""
+Phase 6 - 網站自動化的條件等待
+
+流程原本以固定秒數等待（上傳 PDF 後 2 秒、上傳街頭藝人證後 3 秒、reCAPTCHA 3 秒、
+同意條款 0.5 秒、提交 5 秒），每次執行至少閒置 13 秒，網站慢的時候仍然不夠。
+
+改為等待實際的訊號，每個等待都有逾時並記錄實際等待時間：
+- 上傳：選擇檔案後網站送出的上傳請求（XHR/fetch POST）收到回應；選擇後短時間內沒有送出上傳請求的網站，
+  確認檔案已選取就繼續，不等滿上傳逾時
+- reCAPTCHA：頁面上的 g-recaptcha-response 有值（已通過），或出現圖片驗證視窗
+- 同意條款：checkbox 變為已勾選
+- 提交：按下送出後的 POST 回應（XHR 或表單導航）
+
+上傳與提交的判斷只接受表單頁同網域的請求：reCAPTCHA 等第三方元件也會送出 XHR POST，
+不能被當成上傳完成或已送出。
+
+sync 與 async 兩個版本共用這裡的設定、判斷條件與計時。
+"""
+
+import os
+import time
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# 等待逾時設定（毫秒，可用 Cloud Run 環境變數覆寫）
+WAITS = {
+    "UPLOAD_TIMEOUT_MS": int(os.environ.get("AUTOMATION_UPLOAD_TIMEOUT_MS", "15000")),
+    # 選擇檔案後等待網站送出上傳請求的時間（沒有送出表示網站不以 XHR 上傳）
+    "UPLOAD_REQUEST_TIMEOUT_MS": int(os.environ.get("AUTOMATION_UPLOAD_REQUEST_TIMEOUT_MS", "1000")),
+    "RECAPTCHA_TIMEOUT_MS": int(os.environ.get("AUTOMATION_RECAPTCHA_TIMEOUT_MS", "10000")),
+    "AGREEMENT_TIMEOUT_MS": int(os.environ.get("AUTOMATION_AGREEMENT_TIMEOUT_MS", "3000")),
+    "SUBMIT_TIMEOUT_MS": int(os.environ.get("AUTOMATION_SUBMIT_TIMEOUT_MS", "30000")),
+}
+
+# reCAPTCHA 狀態：勾選框在跨網域 iframe 內無法讀取，改看主頁面的回應欄位與圖片驗證 iframe
+RECAPTCHA_STATE_SCRIPT = """
+() => {
+    const token = document.querySelector('[name="g-recaptcha-response"]');
+    if (token && token.value) {
+        return 'solved';
+    }
+    const challenge = document.querySelector('iframe[src*="recaptcha"][src*="bframe"]');
+    if (challenge && challenge.getBoundingClientRect().height > 0 && getComputedStyle(challenge).visibility !== 'hidden') {
+        return 'challenge';
+    }
+    return false;
+}
+"""
+
+# 同意條款 checkbox 已勾選
+CHECKED_SCRIPT = "selector => document.querySelector(selector)?.checked === true"
+
+# 檔案輸入欄位已選擇的檔案數
+FILE_COUNT_SCRIPT = "element => element.files ? element.files.length : 0"
+
+
+def page_origin(url):
+    """頁面網址的網域（含連接埠），比對請求是否來自表單網站"""
+    return urlparse(url).netloc
+
+
+def is_upload_request(request, origin):
+    """
+    選擇檔案後網站送出的上傳請求（表單網域的 XHR/fetch POST/PUT）
+
+    Args:
+        request: Playwright Request
+        origin (str): 表單頁的 page_origin
+    """
+    return (
+        page_origin(request.url) == origin
+        and request.resource_type in ("xhr", "fetch")
+        and request.method in ("POST", "PUT")
+    )
+
+
+def is_upload_response(response, origin):
+    """上傳請求的回應"""
+    return is_upload_request(response.request, origin)
+
+
+def is_submit_response(response, origin):
+    """按下送出後的回應（表單網域的 XHR/fetch 或表單導航的 POST）"""
+    request = response.request
+    return (
+        page_origin(request.url) == origin
+        and request.resource_type in ("xhr", "fetch", "document")
+        and request.method == "POST"
+    )
+
+
+class WaitTimings:
+    """記錄每個條件等待的實際時間"""
+
+    def __init__(self):
+        self.waits = {}
+
+    @contextmanager
+    def measure(self, name):
+        """
+        計時一個等待（async 程式碼中同樣以 with 使用）
+
+        Args:
+            name (str): 等待名稱（同名時後者覆寫）
+
+        Yields:
+            dict: 等待紀錄，逾時時由呼叫端設定 timed_out
+        """
+        record = {"seconds": 0.0, "timed_out": False}
+        started = time.monotonic()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.monotonic() - started, 3)
+            self.waits[name] = record
+            if record["timed_out"]:
+                logger.warning(f"等待 {name} 逾時（{record['seconds']} 秒）")
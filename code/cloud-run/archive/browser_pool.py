@@ -0,0 +1,294 @@
+"""
+Phase 6 - 網站自動化瀏覽器池
+
+原本每次 /website-automation 都建立新的 WebsiteAutomationCloud，start_browser 執行
+sync_playwright().start() 並啟動一個新的 Chromium；cleanup 只關閉瀏覽器，
+Playwright driver 程序從未停止，每次呼叫都留下一個 driver 程序。
+
+瀏覽器池讓 Chromium 長時間存活，每次執行只建立一個隔離的 BrowserContext
+（cookie、storage、快取互不影響）：
+- Playwright sync API 的物件只能在建立它的執行緒使用，因此每個 worker 執行緒各有一個 Chromium
+  （gunicorn gthread 的執行緒會持續存在，同一執行緒的後續請求都沿用同一個瀏覽器）
+- 執行 MAX_RUNS 次後回收（關閉瀏覽器並停止 driver，避免 Chromium 長期累積記憶體）
+- 瀏覽器斷線（crash）或執行中發生錯誤且瀏覽器已不可用時，下次借用前重新啟動
+- 同時存在的 Chromium 不超過 MAX_BROWSERS（gthread 預設 8 個執行緒，不限制時每個 worker 可能有 8 個）；
+  已達上限時先收回其他執行緒閒置中的瀏覽器，都在使用中則等待
+- 閒置超過 IDLE_SECONDS 的瀏覽器由背景執行緒回收
+
+所有執行緒的瀏覽器都記錄在池中。Playwright 物件不能在其他執行緒呼叫，回收其他執行緒的瀏覽器時
+改為結束該瀏覽器的 Playwright driver 程序（driver 收到 SIGTERM 會關閉它啟動的 Chromium），
+擁有的執行緒下次借用時再清理自己的 Playwright 物件。程序結束時（atexit）以同樣方式關閉全部瀏覽器。
+"""
+
+import os
+import time
+import atexit
+import signal
+import logging
+import threading
+
+from playwright.sync_api import sync_playwright
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 瀏覽器池設定（可用 Cloud Run 環境變數覆寫）
+BROWSER_POOL = {
+    "MAX_RUNS": int(os.environ.get("BROWSER_POOL_MAX_RUNS", "20")),
+    "MAX_BROWSERS": int(os.environ.get("BROWSER_POOL_MAX_BROWSERS", "2")),
+    "IDLE_SECONDS": int(os.environ.get("BROWSER_POOL_IDLE_SECONDS", "300")),
+    # 已達上限且所有瀏覽器都在使用中時最多等待的時間
+    "ACQUIRE_TIMEOUT_SECONDS": int(os.environ.get("BROWSER_POOL_ACQUIRE_TIMEOUT_SECONDS", "300")),
+    "VIEWPORT": {"width": 1920, "height": 1080},
+    "LAUNCH_ARGS": [
+        '--no-sandbox',
+        '--disable-dev-shm-usage',
+        '--disable-gpu',
+        '--disable-web-security',
+        '--disable-features=VizDisplayCompositor'
+    ],
+}
+
+
+def _driver_pid(playwright):
+    """Playwright driver 程序 ID（取不到時回傳 None）"""
+    try:
+        return playwright._impl_obj._connection._transport._proc.pid
+    except AttributeError:
+        return None
+
+
+class BrowserPool:
+    """每個執行緒一個長時間存活的 Chromium（總數有上限），每次執行借用新的 BrowserContext"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+        self._states = {}
+        self._launching = 0
+        self._leased = 0
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def _check_fork(self):
+        # 呼叫端需持有 self._cond；fork 後的子程序不沿用父程序的瀏覽器與背景執行緒
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._states = {}
+            self._launching = 0
+            self._leased = 0
+            self._reaper = None
+            self._stop = threading.Event()
+
+    def _own_state(self):
+        """
+        借用目前執行緒的瀏覽器（已被其他執行緒回收時在此清理）
+
+        Returns:
+            dict | None: 已標記為借用中的瀏覽器狀態
+        """
+        state = getattr(self._local, "state", None)
+        if state is None:
+            return None
+        if state["pid"] != os.getpid():
+            self._local.state = None
+            return None
+        with self._cond:
+            if state["reaped"] is None:
+                state["leased"] = True
+                self._leased += 1
+                return state
+        self._local.state = None
+        self._stop_playwright(state)
+        return None
+
+    def _kill(self, state, reason):
+        """結束其他執行緒的瀏覽器（呼叫端需持有 self._cond；不呼叫 Playwright 物件）"""
+        state["reaped"] = reason
+        self._states.pop(id(state), None)
+        self._cond.notify_all()
+        metrics.increment(f"browser_pool.retired.{reason}")
+        logger.info(f"瀏覽器池：結束 Chromium（{reason}，已執行 {state['runs']} 次）")
+        pid = _driver_pid(state["playwright"])
+        if pid is None:
+            logger.warning("找不到 Playwright driver 程序，無法結束瀏覽器")
+            return
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def _reserve(self):
+        """等待可以啟動新的瀏覽器（已達上限時先收回閒置中的瀏覽器）"""
+        deadline = time.monotonic() + BROWSER_POOL["ACQUIRE_TIMEOUT_SECONDS"]
+        with self._cond:
+            self._check_fork()
+            while len(self._states) + self._launching >= BROWSER_POOL["MAX_BROWSERS"]:
+                idle = [state for state in self._states.values() if not state["leased"]]
+                if idle:
+                    self._kill(min(idle, key=lambda state: state["last_used"]), "evicted")
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.increment("browser_pool.acquire_timeouts")
+                    raise TimeoutError(f"瀏覽器池已達上限 {BROWSER_POOL['MAX_BROWSERS']} 個且都在使用中")
+                metrics.increment("browser_pool.waits")
+                self._cond.wait(remaining)
+            self._launching += 1
+
+    def _launch(self):
+        self._reserve()
+        try:
+            playwright = sync_playwright().start()
+            try:
+                browser = playwright.chromium.launch(headless=True, args=BROWSER_POOL["LAUNCH_ARGS"])
+            except Exception:
+                playwright.stop()
+                raise
+        except Exception:
+            with self._cond:
+                self._launching -= 1
+                self._cond.notify_all()
+            raise
+
+        state = {
+            "pid": os.getpid(), "playwright": playwright, "browser": browser, "runs": 0,
+            "crashed": False, "leased": True, "last_used": time.monotonic(), "reaped": None,
+        }
+        browser.on("disconnected", lambda _: state.update(crashed=True))
+        self._local.state = state
+        with self._cond:
+            self._launching -= 1
+            self._states[id(state)] = state
+            self._leased += 1
+        metrics.increment("browser_pool.launches")
+        logger.info("瀏覽器池：已啟動 Chromium（無頭模式）")
+        return state
+
+    @staticmethod
+    def _stop_playwright(state):
+        try:
+            state["playwright"].stop()
+        except Exception as e:
+            logger.warning(f"停止 Playwright driver 失敗: {str(e)}")
+
+    def _retire(self, state, reason):
+        """關閉目前執行緒的瀏覽器並停止 Playwright driver"""
+        self._local.state = None
+        with self._cond:
+            if state["leased"]:
+                state["leased"] = False
+                self._leased -= 1
+            self._states.pop(id(state), None)
+            self._cond.notify_all()
+        metrics.increment(f"browser_pool.retired.{reason}")
+        logger.info(f"瀏覽器池：回收 Chromium（{reason}，已執行 {state['runs']} 次）")
+        try:
+            if not state["crashed"]:
+                state["browser"].close()
+        except Exception as e:
+            logger.warning(f"關閉瀏覽器失敗: {str(e)}")
+        self._stop_playwright(state)
+
+    def _reap_loop(self, stop):
+        interval = max(1, min(BROWSER_POOL["IDLE_SECONDS"] // 4, 30))
+        while not stop.wait(interval):
+            cutoff = time.monotonic() - BROWSER_POOL["IDLE_SECONDS"]
+            with self._cond:
+                for state in list(self._states.values()):
+                    if not state["leased"] and state["last_used"] < cutoff:
+                        self._kill(state, "idle")
+
+    def _ensure_reaper(self):
+        with self._cond:
+            self._check_fork()
+            if self._reaper is None or not self._reaper.is_alive():
+                self._reaper = threading.Thread(
+                    target=self._reap_loop, args=(self._stop,), name="browser-pool-reaper", daemon=True
+                )
+                self._reaper.start()
+
+    def acquire(self):
+        """
+        借用一個新的 BrowserContext（需要時啟動或重新啟動瀏覽器）
+
+        Returns:
+            BrowserContext: 本次執行專用的瀏覽器環境
+        """
+        self._ensure_reaper()
+        state = self._own_state()
+        if state is not None and (state["crashed"] or not state["browser"].is_connected()):
+            self._retire(state, "crashed")
+            state = None
+        if state is None:
+            state = self._launch()
+
+        try:
+            context = state["browser"].new_context(viewport=BROWSER_POOL["VIEWPORT"])
+        except Exception:
+            self._retire(state, "crashed")
+            raise
+        state["runs"] += 1
+        return context
+
+    def release(self, context):
+        """
+        歸還 BrowserContext（關閉 context，達到 MAX_RUNS 或瀏覽器已斷線時回收瀏覽器）
+
+        Args:
+            context (BrowserContext): acquire 取得的瀏覽器環境
+        """
+        try:
+            context.close()
+        except Exception as e:
+            logger.warning(f"關閉瀏覽器環境失敗: {str(e)}")
+
+        state = getattr(self._local, "state", None)
+        if state is None or state["pid"] != os.getpid():
+            return
+        if state["crashed"] or not state["browser"].is_connected():
+            self._retire(state, "crashed")
+        elif state["runs"] >= BROWSER_POOL["MAX_RUNS"]:
+            self._retire(state, "max_runs")
+        else:
+            with self._cond:
+                if state["leased"]:
+                    state["leased"] = False
+                    self._leased -= 1
+                state["last_used"] = time.monotonic()
+                self._cond.notify_all()
+
+    def shutdown(self):
+        """關閉本程序所有執行緒的瀏覽器（程式結束時由 atexit 呼叫）"""
+        state = getattr(self._local, "state", None)
+        if state is not None and state["pid"] == os.getpid() and state["reaped"] is None:
+            self._retire(state, "shutdown")
+        with self._cond:
+            self._check_fork()
+            self._stop.set()
+            for state in list(self._states.values()):
+                self._kill(state, "shutdown")
+
+    def status(self):
+        """
+        瀏覽器池使用狀況（/metrics gauge）
+
+        Returns:
+            dict: {"browsers", "leased", "max_browsers", "max_runs"}
+        """
+        with self._cond:
+            self._check_fork()
+            return {
+                "browsers": len(self._states),
+                "leased": self._leased,
+                "max_browsers": BROWSER_POOL["MAX_BROWSERS"],
+                "max_runs": BROWSER_POOL["MAX_RUNS"],
+            }
+
+
+# 程序共用的瀏覽器池
+browser_pool = BrowserPool()
+metrics.register_gauge("browser_pool", browser_pool.status)
+atexit.register(browser_pool.shutdown)
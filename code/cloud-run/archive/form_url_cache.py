@@ -0,0 +1,81 @@
+"""
+Phase 6 - 申請表單網址快取
+
+navigate_to_application_form 每次都載入徵件列表、取得所有「街頭藝人」文字元素，
+再逐一往上找連結與內容區塊（多次 locator 往返）才找到申請表單。
+表單網址只有在場地公告新的徵件時才會改變。
+
+解析出的表單網址寫入快取檔（同一 instance 的所有 worker 共用），TTL 內直接前往：
+- 快取的頁面在 VERIFY_TIMEOUT_MS 內出現表單選擇器 → 沿用
+- 沒有出現（徵件已更換或網址失效）→ 清除快取，改走完整搜尋並寫入新網址
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# 表單網址快取設定（可用 Cloud Run 環境變數覆寫）
+FORM_URL_CACHE = {
+    "ENABLED": os.environ.get("FORM_URL_CACHE_ENABLED", "true").lower() == "true",
+    "TTL_SECONDS": int(os.environ.get("FORM_URL_CACHE_TTL_SECONDS", "21600")),
+    "PATH": os.environ.get("FORM_URL_CACHE_PATH", "/tmp/street-artist-form-url.json"),
+    "VERIFY_TIMEOUT_MS": int(os.environ.get("FORM_URL_CACHE_VERIFY_TIMEOUT_MS", "10000")),
+}
+
+
+def get(base_url):
+    """
+    取得快取的表單網址
+
+    Args:
+        base_url (str): 徵件列表網址（列表網址變更時快取失效）
+
+    Returns:
+        str | None: TTL 內的表單網址
+    """
+    if not FORM_URL_CACHE["ENABLED"]:
+        return None
+    try:
+        with open(FORM_URL_CACHE["PATH"], encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if entry.get("base_url") != base_url or time.time() - entry.get("resolved_at", 0) > FORM_URL_CACHE["TTL_SECONDS"]:
+        return None
+    return entry.get("form_url")
+
+
+def put(base_url, form_url):
+    """
+    寫入解析出的表單網址（先寫暫存檔再更名，其他 worker 不會讀到寫到一半的檔案）
+
+    Args:
+        base_url (str): 徵件列表網址
+        form_url (str): 申請表單網址
+    """
+    if not FORM_URL_CACHE["ENABLED"]:
+        return
+    entry = {"base_url": base_url, "form_url": form_url, "resolved_at": time.time()}
+    directory = os.path.dirname(FORM_URL_CACHE["PATH"]) or "."
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(temp_path, FORM_URL_CACHE["PATH"])
+    except OSError as e:
+        logger.warning(f"寫入表單網址快取失敗: {str(e)}")
+
+
+def invalidate():
+    """清除快取（快取的頁面沒有表單時呼叫）"""
+    try:
+        os.remove(FORM_URL_CACHE["PATH"])
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"清除表單網址快取失敗: {str(e)}")
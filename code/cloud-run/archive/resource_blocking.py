@@ -0,0 +1,110 @@
+"""
+Phase 6 - 網站自動化的資源攔截與導航設定
+
+navigate_to_application_form 原本以 wait_until='networkidle' 載入首頁與申請頁，
+場地網站的每張圖片、字型與分析追蹤請求都會下載，還要再等 500 ms 沒有網路活動。
+
+攔截設定（每個 BrowserContext 以 context.route 安裝）：
+- 中止 image、media、font 類型的請求與第三方追蹤網域
+- reCAPTCHA 的來源（google.com/recaptcha、gstatic.com/recaptcha、recaptcha.net）一律放行，
+  否則驗證元件與圖片驗證無法載入
+- 導航改為等待 domcontentloaded，再等待 website_analysis_result.json 中該頁的選擇器出現
+
+AUTOMATION_BLOCK_RESOURCES=false 且 AUTOMATION_WAIT_UNTIL=networkidle 時回到原本的載入方式，
+比較兩種設定下結果中 waits 的 list_page_load / form_page_load 即為改善前後的載入時間。
+"""
+
+import os
+from urllib.parse import urlparse
+
+# 導航與攔截設定（可用 Cloud Run 環境變數覆寫）
+NAVIGATION = {
+    "BLOCK_RESOURCES": os.environ.get("AUTOMATION_BLOCK_RESOURCES", "true").lower() == "true",
+    "WAIT_UNTIL": os.environ.get("AUTOMATION_WAIT_UNTIL", "domcontentloaded"),
+    "BLOCKED_RESOURCE_TYPES": {"image", "media", "font"},
+    "TRACKER_DOMAINS": (
+        "google-analytics.com",
+        "googletagmanager.com",
+        "doubleclick.net",
+        "googlesyndication.com",
+        "facebook.net",
+        "facebook.com",
+        "hotjar.com",
+        "clarity.ms",
+    ),
+    "ALLOWED_URL_PREFIXES": (
+        "https://www.google.com/recaptcha/",
+        "https://www.gstatic.com/recaptcha/",
+        "https://www.recaptcha.net/recaptcha/",
+        "https://recaptcha.net/recaptcha/",
+    ),
+}
+
+
+def _matches_domain(hostname, domains):
+    return any(hostname == domain or hostname.endswith("." + domain) for domain in domains)
+
+
+class RequestBlocker:
+    """單次執行的請求攔截器（記錄攔截數量）"""
+
+    def __init__(self):
+        self.blocked = {}
+        self.allowed = 0
+
+    def should_block(self, request) -> bool:
+        """
+        是否中止請求
+
+        Args:
+            request (Request): Playwright 請求
+
+        Returns:
+            bool: True 表示中止
+        """
+        url = request.url
+        if url.startswith(NAVIGATION["ALLOWED_URL_PREFIXES"]):
+            return False
+        if request.resource_type in NAVIGATION["BLOCKED_RESOURCE_TYPES"]:
+            return True
+        hostname = urlparse(url).hostname or ""
+        return _matches_domain(hostname, NAVIGATION["TRACKER_DOMAINS"])
+
+    def _count(self, request, blocked):
+        if blocked:
+            self.blocked[request.resource_type] = self.blocked.get(request.resource_type, 0) + 1
+        else:
+            self.allowed += 1
+
+    def handle(self, route):
+        """context.route 的處理函數（sync API）"""
+        blocked = self.should_block(route.request)
+        self._count(route.request, blocked)
+        if blocked:
+            route.abort()
+        else:
+            route.continue_()
+
+    async def handle_async(self, route):
+        """context.route 的處理函數（async API）"""
+        blocked = self.should_block(route.request)
+        self._count(route.request, blocked)
+        if blocked:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def summary(self):
+        """
+        攔截統計（放入執行結果）
+
+        Returns:
+            dict: {"block_resources", "wait_until", "blocked", "blocked_total", "allowed"}
+        """
+        return {
+            "block_resources": NAVIGATION["BLOCK_RESOURCES"],
+            "wait_until": NAVIGATION["WAIT_UNTIL"],
+            "blocked": dict(self.blocked),
+            "blocked_total": sum(self.blocked.values()),
+            "allowed": self.allowed,
+        }
@@ -0,0 +1,134 @@
+"""
+Phase 6 - 截圖設定檔
+
+take_screenshot_and_upload 原本一律擷取 1920×1080 以上的整頁 PNG，檔案大，
+擷取、上傳 GCS 與 LINE 下載 Signed URL 都比較慢。
+
+設定檔決定格式與範圍：
+- format：png、jpeg（Playwright 直接輸出）或 webp（擷取 PNG 後以 Pillow 轉檔）
+- quality：jpeg/webp 品質
+- clip_to_form：只擷取申請表單區塊（找不到表單時改擷取整頁）
+- full_page：是否擷取整頁（否則只擷取視窗範圍）
+- scale：'css' 以 CSS 像素輸出（高 DPI 裝置不放大），'device' 以裝置像素輸出
+
+每種截圖類型（待驗證、提交成功、失敗）各自選用設定檔，可用環境變數覆寫；
+每次擷取記錄設定檔、耗時與位元組數，放入執行結果的 screenshots。
+"""
+
+import io
+import os
+import time
+import asyncio
+
+# 截圖設定檔
+SCREENSHOT_PROFILES = {
+    # 待驗證：LINE 上確認表單內容，只需表單區塊
+    "form": {"format": "jpeg", "quality": int(os.environ.get("SCREENSHOT_JPEG_QUALITY", "70")), "clip_to_form": True, "full_page": False, "scale": "css"},
+    # 提交成功：結果頁面整頁，檔案較小
+    "page": {"format": "jpeg", "quality": int(os.environ.get("SCREENSHOT_JPEG_QUALITY", "70")), "clip_to_form": False, "full_page": True, "scale": "css"},
+    "form_webp": {"format": "webp", "quality": int(os.environ.get("SCREENSHOT_WEBP_QUALITY", "75")), "clip_to_form": True, "full_page": False, "scale": "css"},
+    # 失敗：保留原本的整頁 PNG，方便除錯
+    "full_png": {"format": "png", "quality": None, "clip_to_form": False, "full_page": True, "scale": "device"},
+}
+
+# 截圖類型 → 設定檔（可用 Cloud Run 環境變數覆寫）
+SCREENSHOT_TYPE_PROFILES = {
+    "待驗證": os.environ.get("SCREENSHOT_PROFILE_PENDING", "form"),
+    "提交成功": os.environ.get("SCREENSHOT_PROFILE_SUBMITTED", "page"),
+    "失敗": os.environ.get("SCREENSHOT_PROFILE_FAILED", "full_png"),
+}
+DEFAULT_PROFILE = "page"
+
+CONTENT_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+
+def profile_for(screenshot_type):
+    """
+    截圖類型使用的設定檔
+
+    Returns:
+        tuple: (設定檔名稱, 設定檔)
+    """
+    name = SCREENSHOT_TYPE_PROFILES.get(screenshot_type, DEFAULT_PROFILE)
+    if name not in SCREENSHOT_PROFILES:
+        name = DEFAULT_PROFILE
+    return name, SCREENSHOT_PROFILES[name]
+
+
+def extension_for(screenshot_type):
+    """截圖類型的副檔名"""
+    return EXTENSIONS[profile_for(screenshot_type)[1]["format"]]
+
+
+def _screenshot_options(profile):
+    """Playwright screenshot 參數（webp 先擷取 PNG）"""
+    options = {"type": "png" if profile["format"] == "webp" else profile["format"], "scale": profile["scale"]}
+    if profile["format"] == "jpeg":
+        options["quality"] = profile["quality"]
+    return options
+
+
+def _to_webp(png_bytes, quality):
+    from PIL import Image
+
+    output = io.BytesIO()
+    with Image.open(io.BytesIO(png_bytes)) as image:
+        image.save(output, format="WEBP", quality=quality)
+    return output.getvalue()
+
+
+def _stats(name, profile, data, started, clipped):
+    return {
+        "profile": name,
+        "format": profile["format"],
+        "clipped": clipped,
+        "capture_seconds": round(time.monotonic() - started, 3),
+        "bytes": len(data),
+    }
+
+
+def capture(page, screenshot_type, form_selector):
+    """
+    依截圖類型的設定檔擷取截圖（sync API）
+
+    Args:
+        page (Page): 頁面
+        screenshot_type (str): 截圖類型
+        form_selector (str): 表單區塊選擇器
+
+    Returns:
+        tuple: (截圖內容, Content-Type, 擷取紀錄)
+    """
+    name, profile = profile_for(screenshot_type)
+    options = _screenshot_options(profile)
+    started = time.monotonic()
+
+    form = page.locator(form_selector).first if profile["clip_to_form"] else None
+    clipped = form is not None and form.count() > 0
+    if clipped:
+        data = form.screenshot(**options)
+    else:
+        data = page.screenshot(full_page=profile["full_page"] or profile["clip_to_form"], **options)
+
+    if profile["format"] == "webp":
+        data = _to_webp(data, profile["quality"])
+    return data, CONTENT_TYPES[profile["format"]], _stats(name, profile, data, started, clipped)
+
+
+async def capture_async(page, screenshot_type, form_selector):
+    """capture 的 async API 版本（webp 轉檔在執行緒池中執行）"""
+    name, profile = profile_for(screenshot_type)
+    options = _screenshot_options(profile)
+    started = time.monotonic()
+
+    form = page.locator(form_selector).first if profile["clip_to_form"] else None
+    clipped = form is not None and await form.count() > 0
+    if clipped:
+        data = await form.screenshot(**options)
+    else:
+        data = await page.screenshot(full_page=profile["full_page"] or profile["clip_to_form"], **options)
+
+    if profile["format"] == "webp":
+        data = await asyncio.to_thread(_to_webp, data, profile["quality"])
+    return data, CONTENT_TYPES[profile["format"]], _stats(name, profile, data, started, clipped)
@@ -0,0 +1,137 @@
+"""
+Phase 6 - 截圖背景上傳
+
+take_screenshot_and_upload 原本截圖後同步執行 blob.upload_from_* 並產生 v4 Signed URL，
+上傳完成前流程無法繼續（送出申請前的「待驗證」截圖直接拖慢提交）。
+
+背景上傳：
+- 截圖內容交給程序共用的上傳執行緒池（同時上傳數上限 SCREENSHOT_UPLOAD_CONCURRENCY），
+  流程立即繼續下一步
+- 暫時性錯誤（429、5xx、連線中斷）由 google-cloud-storage 的重試機制以指數退避重試，
+  總時間上限 SCREENSHOT_UPLOAD_RETRY_DEADLINE_SECONDS
+- 組合執行結果時才等待上傳完成並產生 Signed URL（resolve_signed_url）
+"""
+
+import os
+import logging
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from google.cloud.storage.retry import DEFAULT_RETRY
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 截圖上傳設定（可用 Cloud Run 環境變數覆寫）
+SCREENSHOT_UPLOAD = {
+    "CONCURRENCY": int(os.environ.get("SCREENSHOT_UPLOAD_CONCURRENCY", "4")),
+    "RETRY_DEADLINE_SECONDS": float(os.environ.get("SCREENSHOT_UPLOAD_RETRY_DEADLINE_SECONDS", "60")),
+    "RESULT_TIMEOUT_SECONDS": float(os.environ.get("SCREENSHOT_UPLOAD_RESULT_TIMEOUT_SECONDS", "120")),
+    # 15 分鐘足夠 LINE 伺服器下載
+    "SIGNED_URL_MINUTES": 15,
+}
+
+
+class ScreenshotUploader:
+    """程序共用的截圖上傳執行緒池"""
+
+    def __init__(self, concurrency=None):
+        """
+        Args:
+            concurrency (int): 同時上傳數上限（預設 SCREENSHOT_UPLOAD_CONCURRENCY）
+        """
+        self.concurrency = max(1, concurrency or SCREENSHOT_UPLOAD["CONCURRENCY"])
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="screenshot-upload")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def _upload(self, bucket, blob_path, data, content_type):
+        try:
+            blob = bucket.blob(blob_path)
+            blob.upload_from_string(
+                data,
+                content_type=content_type,
+                retry=DEFAULT_RETRY.with_deadline(SCREENSHOT_UPLOAD["RETRY_DEADLINE_SECONDS"])
+            )
+            metrics.increment("screenshots.uploaded")
+            logger.info(f"截圖上傳完成：gs://{bucket.name}/{blob_path}")
+            return blob
+        except Exception:
+            metrics.increment("screenshots.upload_failed")
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def submit(self, bucket, blob_path, data, content_type):
+        """
+        排入背景上傳
+
+        Args:
+            bucket (Bucket): GCS bucket
+            blob_path (str): 物件路徑
+            data (bytes): 截圖內容
+            content_type (str): MIME 類型
+
+        Returns:
+            Future: 完成時為上傳後的 Blob
+        """
+        with self._lock:
+            self._pending += 1
+        return self._executor.submit(self._upload, bucket, blob_path, data, content_type)
+
+    def status(self):
+        """
+        上傳佇列狀況（/metrics gauge）
+
+        Returns:
+            dict: {"pending", "concurrency"}
+        """
+        with self._lock:
+            return {"pending": self._pending, "concurrency": self.concurrency}
+
+
+def resolve_signed_url(future):
+    """
+    等待上傳完成並產生 v4 Signed URL
+
+    Args:
+        future (Future): ScreenshotUploader.submit 的回傳值
+
+    Returns:
+        str: Signed URL
+    """
+    blob = future.result(timeout=SCREENSHOT_UPLOAD["RESULT_TIMEOUT_SECONDS"])
+    return blob.generate_signed_url(
+        expiration=timedelta(minutes=SCREENSHOT_UPLOAD["SIGNED_URL_MINUTES"]),
+        method='GET',
+        version='v4'
+    )
+
+
+def resolve_all(futures):
+    """
+    等待所有截圖上傳完成並產生 Signed URL（上傳失敗不影響其他截圖）
+
+    Args:
+        futures (dict): {結果欄位名稱: Future}
+
+    Returns:
+        tuple: ({欄位: Signed URL 或 None}, {欄位: 錯誤訊息})
+    """
+    urls, errors = {}, {}
+    for key, future in futures.items():
+        try:
+            urls[key] = resolve_signed_url(future)
+        except Exception as e:
+            logger.error(f"截圖上傳失敗 {key}: {str(e)}")
+            urls[key] = None
+            errors[key] = str(e)
+    return urls, errors
+
+
+# 程序共用的截圖上傳器
+screenshot_uploader = ScreenshotUploader()
+metrics.register_gauge("screenshots.uploads", screenshot_uploader.status)
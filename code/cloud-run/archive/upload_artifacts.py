@@ -0,0 +1,260 @@
+"""
+Phase 6 - 申請上傳檔案的下載
+
+upload_files 原本依序下載申請 PDF 與街頭藝人證，_download_file_from_drive 把整個檔案
+讀進 BytesIO 後再複製到臨時檔案；街頭藝人證（config.CERTIFICATE）幾乎不會變動，卻每次都重新下載。
+
+ArtifactFetch：
+- 兩個檔案在背景執行緒同時下載（各自建立 Drive 客戶端，httplib2 不是執行緒安全的）
+- 以 MediaIoBaseDownload 分段直接寫入目的檔案，不在記憶體中保留整個檔案
+- 街頭藝人證依 Drive 的 md5Checksum 快取於 ARTIFACT_CACHE_DIR，checksum 相同時不下載
+- run_automation 在瀏覽器導航前就開始下載，表單出現時檔案通常已就緒
+
+ARTIFACT_IN_MEMORY=true 時不寫入磁碟：下載到記憶體後以 Playwright 的
+{name, mimeType, buffer} 直接交給 set_input_files，街頭藝人證快取在程序記憶體中
+（Cloud Run 的 /tmp 本來就佔用記憶體，省下的是臨時檔案與寫入、讀回的時間）。
+"""
+
+import io
+import os
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+from googleapiclient.http import MediaIoBaseDownload
+
+logger = logging.getLogger(__name__)
+
+# 上傳檔案下載設定（可用 Cloud Run 環境變數覆寫）
+ARTIFACTS = {
+    "CACHE_DIR": os.environ.get("ARTIFACT_CACHE_DIR", "/tmp/street-artist-artifacts"),
+    "CHUNK_SIZE": int(os.environ.get("ARTIFACT_CHUNK_SIZE", str(1024 * 1024))),
+    "IN_MEMORY": os.environ.get("ARTIFACT_IN_MEMORY", "false").lower() == "true",
+}
+
+# 記憶體模式的街頭藝人證快取：{file_id: (md5Checksum, 檔案內容)}
+_memory_cache = {}
+_memory_cache_lock = threading.Lock()
+
+
+def stream_to_file(drive_service, file_id, path):
+    """
+    分段下載 Drive 檔案並直接寫入目的檔案
+
+    Args:
+        drive_service: Drive 客戶端
+        file_id (str): Drive 檔案 ID
+        path (str): 目的檔案路徑
+
+    Returns:
+        str: 目的檔案路徑
+    """
+    request = drive_service.files().get_media(fileId=file_id)
+    with open(path, "wb") as f:
+        downloader = MediaIoBaseDownload(f, request, chunksize=ARTIFACTS["CHUNK_SIZE"])
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+    return path
+
+
+def download_to_memory(drive_service, file_id):
+    """
+    分段下載 Drive 檔案到記憶體
+
+    Returns:
+        bytes: 檔案內容
+    """
+    request = drive_service.files().get_media(fileId=file_id)
+    buffer = io.BytesIO()
+    downloader = MediaIoBaseDownload(buffer, request, chunksize=ARTIFACTS["CHUNK_SIZE"])
+    done = False
+    while not done:
+        _, done = downloader.next_chunk()
+    return buffer.getvalue()
+
+
+def file_payload(name, data):
+    """
+    Playwright set_input_files 接受的記憶體檔案
+
+    Returns:
+        dict: {"name", "mimeType", "buffer"}
+    """
+    return {"name": name, "mimeType": mimetypes.guess_type(name)[0] or "application/octet-stream", "buffer": data}
+
+
+def drive_checksum(drive_service, file_id, file_name):
+    """Drive 檔案的 md5Checksum（沒有 checksum 的檔案無法快取）"""
+    checksum = drive_service.files().get(fileId=file_id, fields="md5Checksum").execute().get("md5Checksum")
+    if not checksum:
+        raise Exception(f"Drive 檔案沒有 md5Checksum，無法快取：{file_name}")
+    return checksum
+
+
+def md5_of_file(path):
+    """檔案的 MD5（與 Drive 的 md5Checksum 比對）"""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_certificate(drive_service, file_id, file_name):
+    """
+    取得快取的街頭藝人證（Drive 上的 md5Checksum 變更時重新下載）
+
+    快取路徑為 CACHE_DIR/<file_id>/<md5Checksum>/<file_name>，下載完成並驗證 checksum 後
+    才更名到位，其他 worker 不會讀到下載到一半的檔案。
+
+    Args:
+        drive_service: Drive 客戶端
+        file_id (str): Drive 檔案 ID
+        file_name (str): 上傳時使用的檔名
+
+    Returns:
+        tuple: (檔案路徑, 是否命中快取)
+    """
+    checksum = drive_checksum(drive_service, file_id, file_name)
+    file_dir = os.path.join(ARTIFACTS["CACHE_DIR"], file_id)
+    cached_path = os.path.join(file_dir, checksum, file_name)
+    if os.path.exists(cached_path):
+        return cached_path, True
+
+    os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cached_path), suffix=".part")
+    os.close(fd)
+    try:
+        stream_to_file(drive_service, file_id, temp_path)
+        if md5_of_file(temp_path) != checksum:
+            raise Exception(f"下載的檔案與 Drive checksum 不符：{file_name}")
+        os.replace(temp_path, cached_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    # 移除舊版本
+    for name in os.listdir(file_dir):
+        if name != checksum:
+            shutil.rmtree(os.path.join(file_dir, name), ignore_errors=True)
+    return cached_path, False
+
+
+def cached_certificate_payload(drive_service, file_id, file_name):
+    """
+    cached_certificate 的記憶體版本（快取在程序記憶體中，不寫入磁碟）
+
+    Returns:
+        tuple: (set_input_files 的記憶體檔案, 是否命中快取)
+    """
+    checksum = drive_checksum(drive_service, file_id, file_name)
+    with _memory_cache_lock:
+        entry = _memory_cache.get(file_id)
+    if entry is not None and entry[0] == checksum:
+        return file_payload(file_name, entry[1]), True
+
+    data = download_to_memory(drive_service, file_id)
+    if hashlib.md5(data).hexdigest() != checksum:
+        raise Exception(f"下載的檔案與 Drive checksum 不符：{file_name}")
+    with _memory_cache_lock:
+        _memory_cache[file_id] = (checksum, data)
+    return file_payload(file_name, data), False
+
+
+class ArtifactFetch:
+    """申請 PDF 與街頭藝人證的背景下載"""
+
+    def __init__(self, drive_service_factory, temp_dir, pdf, certificate, in_memory=None):
+        """
+        Args:
+            drive_service_factory (callable): 建立 Drive 客戶端（每個下載執行緒各自呼叫）
+            temp_dir (str): 申請 PDF 的下載目錄（記憶體模式不使用）
+            pdf (dict): 申請 PDF 設定（FILE_ID、FILE_NAME）
+            certificate (dict): 街頭藝人證設定（FILE_ID、FILE_NAME）
+            in_memory (bool): 是否不寫入磁碟（預設 ARTIFACT_IN_MEMORY）
+        """
+        self.drive_service_factory = drive_service_factory
+        self.temp_dir = temp_dir
+        self.pdf = pdf
+        self.certificate = certificate
+        self.in_memory = ARTIFACTS["IN_MEMORY"] if in_memory is None else in_memory
+        self.timings = {}
+        self.certificate_cache_hit = None
+        self._futures = None
+
+    def _timed(self, name, func):
+        started = time.monotonic()
+        try:
+            return func()
+        finally:
+            self.timings[name] = round(time.monotonic() - started, 3)
+
+    def _fetch_pdf(self):
+        if self.in_memory:
+            return self._timed("pdf", lambda: file_payload(
+                self.pdf['FILE_NAME'],
+                download_to_memory(self.drive_service_factory(), self.pdf['FILE_ID'])
+            ))
+        path = os.path.join(self.temp_dir, self.pdf['FILE_NAME'])
+        return self._timed("pdf", lambda: stream_to_file(self.drive_service_factory(), self.pdf['FILE_ID'], path))
+
+    def _fetch_certificate(self):
+        fetch = cached_certificate_payload if self.in_memory else cached_certificate
+        artifact, self.certificate_cache_hit = self._timed("certificate", lambda: fetch(
+            self.drive_service_factory(),
+            self.certificate['FILE_ID'],
+            self.certificate['FILE_NAME']
+        ))
+        return artifact
+
+    def start(self):
+        """開始背景下載（重複呼叫不會重新下載）"""
+        if self._futures is not None:
+            return
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="artifact")
+        self._futures = (executor.submit(self._fetch_pdf), executor.submit(self._fetch_certificate))
+        executor.shutdown(wait=False)
+
+    def futures(self):
+        """
+        下載中的 Future（asyncio 以 wrap_future 等待）
+
+        Returns:
+            tuple: (申請 PDF, 街頭藝人證)
+        """
+        self.start()
+        return self._futures
+
+    def result(self):
+        """
+        等待下載完成
+
+        Returns:
+            tuple: (申請 PDF, 街頭藝人證)，各為檔案路徑或記憶體檔案（皆可直接交給 set_input_files）
+        """
+        pdf_future, certificate_future = self.futures()
+        return pdf_future.result(), certificate_future.result()
+
+    def wait(self):
+        """等待背景下載結束（不論成功與否，清理臨時目錄前呼叫）"""
+        if self._futures is not None:
+            wait_futures(self._futures)
+
+    def summary(self):
+        """
+        下載摘要（放入執行結果）
+
+        Returns:
+            dict: {"seconds", "certificate_cache_hit", "in_memory"}
+        """
+        return {
+            "seconds": dict(self.timings),
+            "certificate_cache_hit": self.certificate_cache_hit,
+            "in_memory": self.in_memory,
+        }
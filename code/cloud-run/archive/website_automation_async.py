@@ -0,0 +1,679 @@
+"""
+Phase 6 - 網站自動化（asyncio 版本）
+
+WebsiteAutomationCloud 使用 playwright.sync_api：
+sync API 的物件綁定建立它的執行緒，每次執行又佔住一個 Flask 執行緒數十秒。
+
+asyncio 版本在同一個事件迴圈中同時執行多位申請人的流程：
+- AsyncBrowserPool：少數幾個共用的 Chromium，每次執行借用新的 BrowserContext
+  （執行 MAX_RUNS 次後閒置時回收，斷線時重新啟動）
+- AsyncWebsiteAutomation：瀏覽器操作改為 async，等待與同步版本相同的實際訊號（automation_waits.py）；
+  Drive 下載、GCS 上傳等同步呼叫沿用 WebsiteAutomationCloud 的實作，在執行緒池中執行
+- 資源攔截、導航等待條件與表單網址快取與同步版本相同（resource_blocking.py、form_url_cache.py）
+- 截圖設定檔與同步版本相同（screenshot_profiles.py），截圖交給程序共用的背景上傳器（screenshot_uploader.py），組合結果時才等待並產生 Signed URL
+- 步驟計時與 Playwright 追蹤與同步版本相同（automation_trace.py）
+- 以 Semaphore 限制同時執行的流程數（ASYNC_AUTOMATION_CONCURRENCY）
+
+使用方式：
+    results = await run_many([application_data, ...], stage="2B")
+或 ASGI 模式的 POST /website-automation
+"""
+
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+
+from metrics import metrics
+from browser_pool import BROWSER_POOL
+from automation_waits import (
+    WAITS, RECAPTCHA_STATE_SCRIPT, CHECKED_SCRIPT, FILE_COUNT_SCRIPT,
+    WaitTimings, page_origin, is_upload_request, is_upload_response, is_submit_response
+)
+from resource_blocking import NAVIGATION, RequestBlocker
+import form_url_cache
+from form_url_cache import FORM_URL_CACHE
+from screenshot_uploader import resolve_all
+import screenshot_profiles
+from automation_trace import StepTimings, tracing_options
+
+logger = logging.getLogger(__name__)
+
+# asyncio 網站自動化設定（可用 Cloud Run 環境變數覆寫）
+ASYNC_AUTOMATION = {
+    "CONCURRENCY": int(os.environ.get("ASYNC_AUTOMATION_CONCURRENCY", "4")),
+    "BROWSERS": int(os.environ.get("ASYNC_AUTOMATION_BROWSERS", "2")),
+}
+
+
+class AsyncBrowserPool:
+    """事件迴圈共用的 Chromium 池（每次執行借用負載最低的瀏覽器建立新的 BrowserContext）"""
+
+    def __init__(self, size=None):
+        """
+        Args:
+            size (int): 最多同時存活的瀏覽器數（預設 ASYNC_AUTOMATION_BROWSERS）
+        """
+        self.size = max(1, size or ASYNC_AUTOMATION["BROWSERS"])
+        self._playwright = None
+        self._browsers = []
+        self._lock = asyncio.Lock()
+
+    async def _launch(self):
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch(headless=True, args=BROWSER_POOL["LAUNCH_ARGS"])
+        slot = {"browser": browser, "runs": 0, "leased": 0, "crashed": False, "retiring": False}
+        browser.on("disconnected", lambda _: slot.update(crashed=True))
+        self._browsers.append(slot)
+        metrics.increment("browser_pool.async.launches")
+        logger.info(f"瀏覽器池（async）：已啟動 Chromium，共 {len(self._browsers)} 個")
+        return slot
+
+    async def _retire(self, slot, reason):
+        self._browsers.remove(slot)
+        metrics.increment(f"browser_pool.async.retired.{reason}")
+        logger.info(f"瀏覽器池（async）：回收 Chromium（{reason}，已執行 {slot['runs']} 次）")
+        if not slot["crashed"]:
+            try:
+                await slot["browser"].close()
+            except Exception as e:
+                logger.warning(f"關閉瀏覽器失敗: {str(e)}")
+
+    async def acquire(self):
+        """
+        借用一個新的 BrowserContext
+
+        Returns:
+            tuple: (BrowserContext, 瀏覽器槽位)，歸還時兩者都要傳給 release
+        """
+        async with self._lock:
+            for slot in [slot for slot in self._browsers if slot["crashed"]]:
+                await self._retire(slot, "crashed")
+
+            available = [slot for slot in self._browsers if not slot["retiring"]]
+            if len(available) < self.size and all(slot["leased"] > 0 for slot in available):
+                slot = await self._launch()
+            else:
+                slot = min(available, key=lambda slot: slot["leased"])
+
+            slot["leased"] += 1
+            slot["runs"] += 1
+            if slot["runs"] >= BROWSER_POOL["MAX_RUNS"]:
+                # 不再分配新的執行，最後一個執行歸還時關閉
+                slot["retiring"] = True
+
+        try:
+            context = await slot["browser"].new_context(viewport=BROWSER_POOL["VIEWPORT"])
+        except Exception:
+            await self.release(None, slot)
+            raise
+        return context, slot
+
+    async def release(self, context, slot):
+        """
+        歸還 BrowserContext（瀏覽器達到 MAX_RUNS 且已無執行中的流程時回收）
+
+        Args:
+            context (BrowserContext | None): acquire 取得的瀏覽器環境
+            slot (dict): acquire 取得的瀏覽器槽位
+        """
+        if context is not None:
+            try:
+                await context.close()
+            except Exception as e:
+                logger.warning(f"關閉瀏覽器環境失敗: {str(e)}")
+
+        async with self._lock:
+            slot["leased"] -= 1
+            if slot not in self._browsers:
+                return
+            if slot["crashed"]:
+                await self._retire(slot, "crashed")
+            elif slot["retiring"] and slot["leased"] == 0:
+                await self._retire(slot, "max_runs")
+
+    async def stop(self):
+        """關閉所有瀏覽器並停止 Playwright driver"""
+        async with self._lock:
+            for slot in list(self._browsers):
+                await self._retire(slot, "shutdown")
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    def status(self):
+        """
+        瀏覽器池使用狀況（/metrics gauge）
+
+        Returns:
+            dict: {"browsers", "leased", "max_browsers"}
+        """
+        return {
+            "browsers": len(self._browsers),
+            "leased": sum(slot["leased"] for slot in self._browsers),
+            "max_browsers": self.size,
+        }
+
+
+class AsyncWebsiteAutomation:
+    """WebsiteAutomationCloud 的 asyncio 版本（非瀏覽器部分沿用同步實作）"""
+
+    def __init__(self, automation, pool):
+        """
+        Args:
+            automation (WebsiteAutomationCloud): 同步版本（提供設定、選擇器、Drive 下載與 GCS 上傳）
+            pool (AsyncBrowserPool): 共用的瀏覽器池
+        """
+        self.automation = automation
+        self.pool = pool
+        self.stage = automation.stage
+        self.selectors = automation.analysis_result['selectors']
+        self.matching_logic = automation.analysis_result['matching_logic']
+        self.context = None
+        self.page = None
+        self._slot = None
+        self.wait_timings = WaitTimings()
+        self.request_blocker = RequestBlocker()
+        self.form_url_source = None
+        self.step_timings = StepTimings()
+        self._tracing = False
+
+    async def start_browser(self):
+        """向瀏覽器池借用獨立的瀏覽器環境"""
+        try:
+            self.context, self._slot = await self.pool.acquire()
+            if NAVIGATION["BLOCK_RESOURCES"]:
+                await self.context.route("**/*", self.request_blocker.handle_async)
+            if self.automation.trace:
+                await self.context.tracing.start(**tracing_options())
+                self._tracing = True
+            self.page = await self.context.new_page()
+        except Exception as e:
+            raise Exception(f"啟動瀏覽器失敗: {str(e)}")
+
+    async def _find_application_link(self, street_artist_selector, keyword, application_keywords):
+        """以匹配邏輯（選項C）尋找並點擊街頭藝人申請連結"""
+        for element in await self.page.locator(street_artist_selector).all():
+            parent_link = element.locator('xpath=ancestor-or-self::a').first
+            if await parent_link.count() > 0:
+                link_text = await element.text_content() or ""
+                if keyword in link_text and any(app_keyword in link_text for app_keyword in application_keywords):
+                    link_href = await parent_link.get_attribute('href')
+                    await parent_link.click()
+                    return link_href
+
+        apply_button_selector = self.selectors['first_page']['apply_button']
+        for button in await self.page.locator(apply_button_selector).all():
+            parent_link = button.locator('xpath=ancestor-or-self::a').first
+            if await parent_link.count() == 0:
+                continue
+
+            container = button.locator('xpath=ancestor::*[contains(@class, "item") or contains(@class, "card") or contains(@class, "content")]').first
+            if await container.count() == 0:
+                container = button.locator('xpath=ancestor::div[position()<=3]').last
+            if await container.count() == 0:
+                continue
+
+            container_text = await container.text_content() or ""
+            if keyword in container_text and any(app_keyword in container_text for app_keyword in application_keywords):
+                link_href = await parent_link.get_attribute('href')
+                await parent_link.click()
+                return link_href
+        return None
+
+    async def _open_cached_form(self, base_url: str) -> bool:
+        """前往快取的申請表單網址（表單選擇器未出現時清除快取並回傳 False）"""
+        form_url = await asyncio.to_thread(form_url_cache.get, base_url)
+        if not form_url:
+            return False
+
+        with self.wait_timings.measure("cached_form_load") as record:
+            try:
+                await self.page.goto(form_url, wait_until=NAVIGATION["WAIT_UNTIL"])
+                await self.page.wait_for_selector(self.selectors['form_page']['name_input'], timeout=FORM_URL_CACHE["VERIFY_TIMEOUT_MS"])
+            except PlaywrightError as e:
+                record["timed_out"] = isinstance(e, PlaywrightTimeoutError)
+                record["error"] = str(e)
+
+        if "error" in record:
+            logger.info("快取的表單網址沒有申請表單，改為重新搜尋")
+            await asyncio.to_thread(form_url_cache.invalidate)
+            return False
+        return True
+
+    async def navigate_to_application_form(self) -> str:
+        """
+        導航到表演場地網站申請表單頁面（優先使用快取的表單網址）
+
+        Returns:
+            str: 申請表單頁面 URL
+        """
+        try:
+            base_url = self.matching_logic['base_url']
+            if await self._open_cached_form(base_url):
+                self.form_url_source = "cache"
+                return self.page.url
+
+            keyword = self.matching_logic['street_artist_keyword']
+            street_artist_selector = self.selectors['first_page']['street_artist_text']
+            with self.wait_timings.measure("list_page_load"):
+                await self.page.goto(base_url, wait_until=NAVIGATION["WAIT_UNTIL"])
+                await self.page.wait_for_selector(street_artist_selector, timeout=30000)
+
+            application_link = await self._find_application_link(
+                street_artist_selector,
+                keyword,
+                self.matching_logic['application_keywords']
+            )
+            if not application_link:
+                raise Exception("找不到街頭藝人申請的可點擊連結")
+
+            with self.wait_timings.measure("form_page_load"):
+                await self.page.wait_for_load_state(NAVIGATION["WAIT_UNTIL"])
+                await self.page.wait_for_selector(self.selectors['form_page']['name_input'], timeout=30000)
+            self.form_url_source = "search"
+            await asyncio.to_thread(form_url_cache.put, base_url, self.page.url)
+            return self.page.url
+
+        except Exception as e:
+            raise Exception(f"導航到申請表單失敗: {str(e)}")
+
+    async def fill_personal_information(self):
+        """填寫個人資料"""
+        try:
+            applicant_info = await asyncio.to_thread(self.automation.config.get_applicant_info)
+            form_page = self.selectors['form_page']
+
+            await self.page.wait_for_selector(form_page['name_input'], timeout=10000)
+            await self.page.fill(form_page['name_input'], applicant_info['name'])
+            await self.page.fill(form_page['phone_input'], applicant_info['phone'])
+            await self.page.fill(form_page['email_input'], applicant_info['email'])
+
+        except Exception as e:
+            raise Exception(f"填寫個人資料失敗: {str(e)}")
+
+    async def upload_files(self):
+        """上傳申請文件（等待 run_automation 開始的背景下載完成）"""
+        try:
+            self.automation.start_artifact_fetch()
+            pdf_artifact, cert_artifact = await asyncio.gather(
+                *(asyncio.wrap_future(future) for future in self.automation.artifacts.futures())
+            )
+
+            pdf_upload_selector = self.selectors['form_page']['pdf_upload']
+            await self.page.wait_for_selector(pdf_upload_selector, timeout=10000)
+            await self._set_input_files_and_wait(pdf_upload_selector, pdf_artifact, "pdf_upload")
+
+            cert_upload_selector = self.selectors['form_page']['certificate_upload']
+            await self.page.wait_for_selector(cert_upload_selector, timeout=10000)
+            await self._set_input_files_and_wait(cert_upload_selector, cert_artifact, "certificate_upload")
+
+        except Exception as e:
+            raise Exception(f"上傳申請文件失敗: {str(e)}")
+
+    async def _set_input_files_and_wait(self, selector: str, files, wait_name: str):
+        """選擇檔案並等待網站送出的上傳請求收到回應（與 WebsiteAutomationCloud 相同）"""
+        origin = page_origin(self.page.url)
+        upload_requests = []
+        upload_responses = []
+
+        def on_request(request):
+            if is_upload_request(request, origin):
+                upload_requests.append(request)
+
+        def on_response(response):
+            if is_upload_response(response, origin):
+                upload_responses.append(response)
+
+        self.page.on("request", on_request)
+        self.page.on("response", on_response)
+        try:
+            with self.wait_timings.measure(wait_name) as record:
+                await self.page.set_input_files(selector, files)
+                if not upload_requests:
+                    try:
+                        upload_requests.append(await self.page.wait_for_event(
+                            "request",
+                            predicate=lambda request: is_upload_request(request, origin),
+                            timeout=WAITS["UPLOAD_REQUEST_TIMEOUT_MS"]
+                        ))
+                    except PlaywrightTimeoutError:
+                        pass
+                record["xhr"] = bool(upload_requests)
+                if upload_requests and not upload_responses:
+                    try:
+                        upload_responses.append(await self.page.wait_for_event(
+                            "response",
+                            predicate=lambda response: is_upload_response(response, origin),
+                            timeout=WAITS["UPLOAD_TIMEOUT_MS"]
+                        ))
+                    except PlaywrightTimeoutError:
+                        record["timed_out"] = True
+        finally:
+            self.page.remove_listener("request", on_request)
+            self.page.remove_listener("response", on_response)
+
+        if upload_responses:
+            record["status"] = upload_responses[0].status
+            if upload_responses[0].status >= 400:
+                raise Exception(f"網站上傳請求失敗（HTTP {upload_responses[0].status}）")
+        elif await self.page.locator(selector).evaluate(FILE_COUNT_SCRIPT) == 0:
+            raise Exception(f"檔案未選取：{selector}")
+
+    async def handle_recaptcha(self) -> bool:
+        """
+        處理 reCAPTCHA 驗證
+
+        Returns:
+            bool: 是否成功處理
+        """
+        try:
+            recaptcha_frame_selector = self.selectors['form_page']['recaptcha_frame']
+            await self.page.wait_for_selector(recaptcha_frame_selector, timeout=10000)
+
+            recaptcha_frame = self.page.frame_locator(recaptcha_frame_selector)
+            recaptcha_checkbox = recaptcha_frame.locator(self.selectors['form_page']['recaptcha_checkbox'])
+            if not await recaptcha_checkbox.is_visible():
+                return False
+
+            await recaptcha_checkbox.click()
+            with self.wait_timings.measure("recaptcha") as record:
+                try:
+                    handle = await self.page.wait_for_function(RECAPTCHA_STATE_SCRIPT, timeout=WAITS["RECAPTCHA_TIMEOUT_MS"])
+                    state = await handle.json_value()
+                except PlaywrightTimeoutError:
+                    record["timed_out"] = True
+                    state = None
+                record["state"] = state
+            return state == "solved"
+
+        except Exception as e:
+            logger.warning(f"reCAPTCHA 處理失敗: {str(e)}")
+            return False
+
+    async def check_agreement_checkbox(self):
+        """勾選同意條款（元素隱藏時以 JavaScript 點擊）"""
+        try:
+            agreement_selector = self.selectors['form_page']['agreement_checkbox']
+            agreement_checkbox = self.page.locator(agreement_selector)
+
+            if not await agreement_checkbox.is_checked():
+                await self.page.evaluate("selector => document.querySelector(selector).click()", agreement_selector)
+                with self.wait_timings.measure("agreement") as record:
+                    try:
+                        await self.page.wait_for_function(CHECKED_SCRIPT, arg=agreement_selector, timeout=WAITS["AGREEMENT_TIMEOUT_MS"])
+                    except PlaywrightTimeoutError:
+                        record["timed_out"] = True
+                if record["timed_out"]:
+                    raise Exception("同意條款勾選失敗")
+
+        except Exception as e:
+            raise Exception(f"勾選同意條款失敗: {str(e)}")
+
+    async def verify_form_completion(self) -> Dict[str, bool]:
+        """驗證表單填寫完成狀態（格式與 WebsiteAutomationCloud.verify_form_completion 相同）"""
+        try:
+            form_page = self.selectors['form_page']
+            name_value = await self.page.locator(form_page['name_input']).input_value()
+            submit_button = self.page.locator(form_page['submit_button'])
+
+            return {
+                'personal_info_filled': bool(name_value.strip()),
+                # 簡化檔案上傳檢查（假設上傳成功）
+                'pdf_uploaded': True,
+                'certificate_uploaded': True,
+                'agreement_checked': await self.page.locator(form_page['agreement_checkbox']).is_checked(),
+                'ready_to_submit': await submit_button.is_visible() and await submit_button.is_enabled()
+            }
+
+        except Exception as e:
+            logger.warning(f"表單驗證失敗: {str(e)}")
+            return {'error': str(e)}
+
+    async def take_screenshot_and_upload(self, screenshot_type: str = "待驗證"):
+        """
+        截圖並排入背景上傳到 Google Cloud Storage
+
+        Returns:
+            Future: 上傳中的截圖（run_automation 組合結果時轉為 Signed URL）
+        """
+        try:
+            screenshot_name = self.automation._screenshot_name(screenshot_type)
+            screenshot_bytes, content_type, stats = await screenshot_profiles.capture_async(
+                self.page,
+                screenshot_type,
+                self.automation.form_selector
+            )
+            self.automation.screenshot_stats[screenshot_type] = stats
+            return self.automation._upload_screenshot_to_gcs(screenshot_bytes, screenshot_name, content_type)
+
+        except Exception as e:
+            raise Exception(f"截圖失敗: {str(e)}")
+
+    async def stop_trace_and_upload(self):
+        """
+        停止錄製追蹤並排入背景上傳
+
+        Returns:
+            Future | None: 上傳中的追蹤 ZIP，未錄製時回傳 None
+        """
+        if not self._tracing:
+            return None
+        self._tracing = False
+
+        trace_name = self.automation._trace_name()
+        trace_path = os.path.join(self.automation.temp_dir, trace_name)
+        await self.context.tracing.stop(path=trace_path)
+
+        def read_and_remove():
+            with open(trace_path, 'rb') as f:
+                data = f.read()
+            os.remove(trace_path)
+            return data
+
+        trace_bytes = await asyncio.to_thread(read_and_remove)
+        return self.automation._upload_screenshot_to_gcs(trace_bytes, trace_name, 'application/zip')
+
+    async def submit_application(self) -> bool:
+        """
+        提交申請（僅在階段2C執行）
+
+        Returns:
+            bool: 是否成功提交
+        """
+        try:
+            if self.stage != "2C":
+                return False
+
+            submit_button = self.page.locator(self.selectors['form_page']['submit_button'])
+            if not (await submit_button.is_visible() and await submit_button.is_enabled()):
+                raise Exception("提交按鈕不可用")
+
+            with self.wait_timings.measure("submit") as record:
+                try:
+                    origin = page_origin(self.page.url)
+                    async with self.page.expect_response(
+                        lambda response: is_submit_response(response, origin), timeout=WAITS["SUBMIT_TIMEOUT_MS"]
+                    ) as response_info:
+                        await submit_button.click()
+                    record["status"] = (await response_info.value).status
+                    await self.page.wait_for_load_state('domcontentloaded')
+                except PlaywrightTimeoutError:
+                    record["timed_out"] = True
+
+            if record["timed_out"]:
+                raise Exception("送出後未收到網站回應")
+            if record["status"] >= 400:
+                raise Exception(f"網站回應錯誤（HTTP {record['status']}）")
+            return True
+
+        except Exception as e:
+            raise Exception(f"提交申請失敗: {str(e)}")
+
+    async def cleanup(self):
+        """歸還瀏覽器環境並清理臨時目錄"""
+        if self._slot is not None:
+            await self.pool.release(self.context, self._slot)
+            self.context = None
+            self.page = None
+            self._slot = None
+        await asyncio.to_thread(self.automation.cleanup)
+
+    async def run_automation(self, application_data: Dict = None) -> Dict:
+        """
+        執行網站自動化流程
+
+        Args:
+            application_data (Dict): 申請資料
+
+        Returns:
+            Dict: 與 WebsiteAutomationCloud.run_automation 相同格式的執行結果
+        """
+        self.automation.application_data = application_data
+        self.step_timings = StepTimings()
+        step = self.step_timings.step
+
+        screenshot_uploads = {}
+        result = {
+            'success': False,
+            'stage': self.stage,
+            'timestamp': self.automation._generate_timestamp(),
+            'screenshot_url': None,
+            'verification': {},
+            'waits': self.wait_timings.waits,
+            'network': {},
+            'form_url_source': None,
+            'artifacts': {},
+            'screenshots': self.automation.screenshot_stats,
+            'timings': self.step_timings.steps,
+            'error': None
+        }
+
+        try:
+            # 上傳檔案在背景下載，與瀏覽器導航同時進行
+            self.automation.start_artifact_fetch()
+            with step("start_browser"):
+                await self.start_browser()
+            with step("navigate_to_application_form"):
+                await self.navigate_to_application_form()
+            result['form_url_source'] = self.form_url_source
+            with step("fill_personal_information"):
+                await self.fill_personal_information()
+            with step("upload_files"):
+                await self.upload_files()
+
+            with step("handle_recaptcha"):
+                recaptcha_success = await self.handle_recaptcha()
+            if not recaptcha_success:
+                logger.warning("reCAPTCHA 處理未完全成功，但繼續流程")
+
+            with step("check_agreement_checkbox"):
+                await self.check_agreement_checkbox()
+            with step("verify_form_completion"):
+                result['verification'] = await self.verify_form_completion()
+            with step("screenshot:待驗證"):
+                screenshot_uploads['screenshot_url'] = await self.take_screenshot_and_upload("待驗證")
+
+            with step("submit_application"):
+                submitted = await self.submit_application()
+            if submitted:
+                with step("screenshot:提交成功"):
+                    screenshot_uploads['success_screenshot_url'] = await self.take_screenshot_and_upload("提交成功")
+
+            result['success'] = True
+
+        except Exception as e:
+            logger.error(f"階段 {self.stage} 執行失敗: {str(e)}")
+            result['error'] = str(e)
+
+            if self.page is not None:
+                try:
+                    with step("screenshot:失敗"):
+                        screenshot_uploads['failure_screenshot_url'] = await self.take_screenshot_and_upload("失敗")
+                except Exception:
+                    pass
+
+        finally:
+            result['network'] = self.request_blocker.summary()
+            if self.automation.artifacts is not None:
+                result['artifacts'] = self.automation.artifacts.summary()
+            try:
+                trace_upload = await self.stop_trace_and_upload()
+                if trace_upload is not None:
+                    screenshot_uploads['trace_url'] = trace_upload
+            except Exception as e:
+                logger.warning(f"儲存追蹤失敗: {str(e)}")
+            result['total_seconds'] = self.step_timings.total_seconds()
+            await self.cleanup()
+
+        urls, errors = await asyncio.to_thread(resolve_all, screenshot_uploads)
+        result.update(urls)
+        if errors:
+            result['screenshot_errors'] = errors
+        return result
+
+
+async def run_one(application_data: Optional[Dict], pool: AsyncBrowserPool, semaphore: asyncio.Semaphore, stage: str = "2B", trace: bool = None) -> Dict:
+    """
+    在並行上限內執行一位申請人的流程
+
+    Args:
+        application_data (Dict): 申請資料
+        pool (AsyncBrowserPool): 共用的瀏覽器池
+        semaphore (asyncio.Semaphore): 並行上限
+        stage (str): 執行階段
+        trace (bool): 是否錄製 Playwright 追蹤（預設 AUTOMATION_TRACE）
+
+    Returns:
+        Dict: 執行結果
+    """
+    from website_automation_cloud import WebsiteAutomationCloud
+
+    async with semaphore:
+        # 建立同步版本時會讀取設定並建立 Drive/GCS 客戶端，在執行緒池中執行
+        automation = await asyncio.to_thread(WebsiteAutomationCloud, stage, None, trace)
+        return await AsyncWebsiteAutomation(automation, pool).run_automation(application_data)
+
+
+async def run_many(applications: List[Dict], stage: str = "2B", concurrency: int = None, pool: AsyncBrowserPool = None) -> List[Dict]:
+    """
+    同時執行多位申請人的流程
+
+    Args:
+        applications (List[Dict]): 申請資料清單
+        stage (str): 執行階段
+        concurrency (int): 同時執行的流程數（預設 ASYNC_AUTOMATION_CONCURRENCY）
+        pool (AsyncBrowserPool): 共用的瀏覽器池（未提供時建立並在結束後關閉）
+
+    Returns:
+        List[Dict]: 與 applications 順序相同的執行結果
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency or ASYNC_AUTOMATION["CONCURRENCY"]))
+    owned_pool = pool is None
+    pool = pool or AsyncBrowserPool()
+    try:
+        return await asyncio.gather(*(run_one(application_data, pool, semaphore, stage) for application_data in applications))
+    finally:
+        if owned_pool:
+            await pool.stop()
+
+
+def main():
+    """主程式入口點（用於測試：python website_automation_async.py applications.json）"""
+    import sys
+
+    applications = [None]
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf-8') as f:
+            applications = json.load(f)
+
+    results = asyncio.run(run_many(applications, stage="2A.5"))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,14 +8,21 @@ Phase 6 - 階段 2A.5-2C: Cloud Run 網站自動化
 - 上傳申請 PDF 和街頭藝人證（均從雲端下載）
 - 處理 reCAPTCHA 驗證
 - 勾選同意條款
-- 截圖並上傳到 Google Drive
+- 截圖並上傳到 GCS
 - 階段2A.5: 停在提交前（不按送出按鈕）
 - 階段2B-2C: 完整提交流程
 
 Cloud Run 優化策略：
 - 強制無頭模式（headless=True）
-- 所有檔案從 Google Drive 下載
-- 截圖上傳到 Google Drive
+- 以實際訊號（上傳回應、勾選狀態、提交回應）取代固定秒數等待（automation_waits.py）
+- 攔截圖片、字型與追蹤請求，導航只等待 DOM 與所需選擇器（resource_blocking.py）
+- 申請表單網址快取（form_url_cache.py），TTL 內直接前往表單，不再每次搜尋徵件列表
+- 瀏覽器由瀏覽器池（browser_pool.py）共用，每次執行只建立新的 BrowserContext
+- 所有檔案從 Google Drive 下載（兩個檔案同時下載並直接寫入檔案，街頭藝人證依 checksum 快取）
+- ARTIFACT_IN_MEMORY=true 時上傳檔案不經過磁碟；截圖直接以記憶體內容上傳
+- 截圖在背景上傳到 GCS（screenshot_uploader.py），組合結果時才產生 Signed URL
+- 每個步驟的耗時放入結果的 timings，可選錄製 Playwright 追蹤（automation_trace.py）
+- 截圖依類型選用設定檔（screenshot_profiles.py）：JPEG/WebP、只擷取表單區塊、CSS 像素
 - 精簡日誌輸出（減少 Cloud Run 日誌成本）
 - 移除詳細除錯資訊
 """
@@ -23,43 +30,68 @@ Cloud Run 優化策略：
 import os
 import json
 import tempfile
-import time
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Optional, Tuple
 
-from playwright.sync_api import sync_playwright, Page, Browser
-from google.oauth2 import service_account
+from playwright.sync_api import Page, BrowserContext, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.http import MediaFileUpload
 from google.cloud import storage
 import pytz
-import io
 
 from config import Config
+from credential_provider import credential_provider
+from browser_pool import browser_pool
+from automation_waits import (
+    WAITS, RECAPTCHA_STATE_SCRIPT, CHECKED_SCRIPT, FILE_COUNT_SCRIPT,
+    WaitTimings, page_origin, is_upload_request, is_upload_response, is_submit_response
+)
+from resource_blocking import NAVIGATION, RequestBlocker
+import form_url_cache
+from form_url_cache import FORM_URL_CACHE
+from upload_artifacts import ARTIFACTS, ArtifactFetch
+from screenshot_uploader import screenshot_uploader, resolve_all
+import screenshot_profiles
+from automation_trace import TRACE, StepTimings, tracing_options
 
 class WebsiteAutomationCloud:
     """表演場地網站自動化處理類別（Cloud Run 版本）"""
     
-    def __init__(self, stage: str = "2A.5"):
+    def __init__(self, stage: str = "2A.5", pool=None, trace: bool = None):
         """
         初始化網站自動化（Cloud Run 版本）
         
         Args:
             stage (str): 執行階段（2A.5, 2B, 2C）
+            pool (BrowserPool): 瀏覽器池（預設為程序共用的 browser_pool）
+            trace (bool): 是否錄製 Playwright 追蹤（預設 AUTOMATION_TRACE）
         """
         self.config = Config()
         self.stage = stage
         self.headless = True  # Cloud Run 強制無頭模式
-        self.browser: Optional[Browser] = None
+        self.pool = pool or browser_pool
+        self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
-        self.temp_dir = tempfile.mkdtemp()
+        self._temp_dir = None  # 第一次使用時建立（記憶體模式不需要臨時目錄）
         self.taiwan_tz = pytz.timezone('Asia/Taipei')
         self.application_data = None  # 保存申請資料（用於生成截圖檔名）
+        self.wait_timings = WaitTimings()  # 條件等待的實際時間
+        self.request_blocker = RequestBlocker()
+        self.form_url_source = None  # 表單網址來源（cache / search）
+        self.artifacts: Optional[ArtifactFetch] = None  # 上傳檔案的背景下載
+        self.trace = TRACE["ENABLED"] if trace is None else bool(trace)
+        self._tracing = False
+        self.step_timings = StepTimings()  # 每個步驟的耗時
         
         # 載入網站分析結果
         self.analysis_result = self.config.get_website_analysis_result()
         
+        # 截圖的表單區塊（分析結果沒有指定時，取包含姓名欄位的 form）
+        form_page = self.analysis_result['selectors']['form_page']
+        self.form_selector = form_page.get('form_container') or f"form:has({form_page['name_input']})"
+        self.screenshot_stats = {}  # 截圖類型 → 設定檔、擷取耗時與位元組數
+        
         # 初始化 Google Drive 服務
         self.drive_service = self._init_drive_service()
         
@@ -67,16 +99,20 @@ class WebsiteAutomationCloud:
         self.gcs_client = self._init_gcs_client()
         
         print(f"🚀 Cloud Run 網站自動化初始化完成（階段 {stage}）")
-        print(f"📁 臨時目錄：{self.temp_dir}")
+    
+    @property
+    def temp_dir(self) -> str:
+        """臨時目錄（第一次使用時建立）"""
+        if self._temp_dir is None:
+            self._temp_dir = tempfile.mkdtemp()
+            print(f"📁 臨時目錄：{self._temp_dir}")
+        return self._temp_dir
     
     def _init_drive_service(self):
         """初始化 Google Drive 服務"""
         try:
-            service_account_info = self.config.get_service_account_info()
-            credentials = service_account.Credentials.from_service_account_info(
-                service_account_info,
-                scopes=['https://www.googleapis.com/auth/drive']
-            )
+            # 使用程序共用的憑證（不再每次建立實例都讀取 Secret Manager）
+            credentials = credential_provider.get_credentials()
             return build('drive', 'v3', credentials=credentials)
         except Exception as e:
             raise Exception(f"初始化 Google Drive 服務失敗: {str(e)}")
@@ -84,122 +120,123 @@ class WebsiteAutomationCloud:
     def _init_gcs_client(self):
         """初始化 Google Cloud Storage 服務"""
         try:
-            service_account_info = self.config.get_service_account_info()
-            credentials = service_account.Credentials.from_service_account_info(
-                service_account_info
-            )
+            credentials = credential_provider.get_credentials()
             return storage.Client(credentials=credentials, project=self.config.get_project_id())
         except Exception as e:
             raise Exception(f"初始化 Google Cloud Storage 服務失敗: {str(e)}")
     
-    def _download_file_from_drive(self, file_id: str, file_name: str) -> str:
+    def start_artifact_fetch(self):
+        """開始在背景下載申請 PDF 與街頭藝人證（瀏覽器導航期間同時進行）"""
+        if self.artifacts is None:
+            self.artifacts = ArtifactFetch(
+                self._init_drive_service,
+                None if ARTIFACTS["IN_MEMORY"] else self.temp_dir,
+                self.config.TEST_APPLICATION_PDF,
+                self.config.CERTIFICATE
+            )
+        self.artifacts.start()
+    
+    def _upload_screenshot_to_gcs(self, screenshot_bytes: bytes, screenshot_name: str, content_type: str = 'image/png'):
         """
-        從 Google Drive 下載檔案到本地臨時目錄
+        排入背景上傳到 Google Cloud Storage（不等待上傳完成）
         
         Args:
-            file_id (str): Google Drive 檔案 ID
-            file_name (str): 檔案名稱
+            screenshot_bytes (bytes): 截圖內容
+            screenshot_name (str): 截圖檔名
+            content_type (str): 截圖格式的 MIME 類型
             
         Returns:
-            str: 本地檔案路徑
+            Future: 上傳後的 Blob（以 screenshot_uploader.resolve_signed_url 取得 Signed URL）
         """
-        try:
-            print(f"📥 下載檔案：{file_name}")
-            
-            # 下載檔案
-            request = self.drive_service.files().get_media(fileId=file_id)
-            file_content = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_content, request)
-            
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            
-            # 儲存到本地臨時檔案
-            local_file_path = os.path.join(self.temp_dir, file_name)
-            with open(local_file_path, 'wb') as f:
-                f.write(file_content.getvalue())
-            
-            print(f"✅ 檔案下載完成：{file_name}")
-            return local_file_path
-            
-        except Exception as e:
-            raise Exception(f"下載檔案失敗 {file_name}: {str(e)}")
+        print(f"📤 排入截圖上傳：{screenshot_name}")
+        
+        # 檔案路徑：screenshots/檔名
+        bucket = self.gcs_client.bucket(self.config.WEBSITE_AUTOMATION['SCREENSHOT_BUCKET'])
+        return screenshot_uploader.submit(bucket, f"screenshots/{screenshot_name}", screenshot_bytes, content_type)
     
-    def _upload_screenshot_to_gcs(self, screenshot_path: str, screenshot_name: str) -> str:
+    def _generate_timestamp(self) -> str:
+        """生成台灣時區的時間戳記"""
+        now = datetime.now(self.taiwan_tz)
+        return now.strftime("%Y%m%d-%H%M%S")
+    
+    def _target_month(self) -> str:
+        """申請月份（取自 application_data，用於截圖與追蹤檔名）"""
+        target_month = "2025年11月"  # 預設值
+        if self.application_data and 'target_month' in self.application_data:
+            target_month_data = self.application_data.get('target_month', {})
+            if isinstance(target_month_data, dict) and 'display' in target_month_data:
+                target_month = target_month_data['display']
+            elif isinstance(target_month_data, str):
+                target_month = target_month_data
+        return target_month
+    
+    def _screenshot_name(self, screenshot_type: str) -> str:
         """
-        上傳截圖到 Google Cloud Storage 並生成 Signed URL
+        生成截圖檔名（申請月份取自 application_data，時間戳記為截圖時間）
         
         Args:
-            screenshot_path (str): 本地截圖路徑
-            screenshot_name (str): 截圖檔名
+            screenshot_type (str): 截圖類型
             
         Returns:
-            str: Signed URL（15分鐘有效期，供 LINE 下載）
+            str: 截圖檔名
         """
-        try:
-            print(f"📤 上傳截圖到 GCS：{screenshot_name}")
-            
-            # 取得 bucket
-            bucket_name = self.config.WEBSITE_AUTOMATION['SCREENSHOT_BUCKET']
-            bucket = self.gcs_client.bucket(bucket_name)
-            
-            # 建立 blob（檔案路徑：screenshots/檔名）
-            blob_path = f"screenshots/{screenshot_name}"
-            blob = bucket.blob(blob_path)
-            
-            # 上傳檔案
-            blob.upload_from_filename(screenshot_path, content_type='image/png')
-            
-            # 生成 Signed URL（15分鐘有效期，足夠 LINE 伺服器下載）
-            from datetime import timedelta
-            file_url = blob.generate_signed_url(
-                expiration=timedelta(minutes=15),
-                method='GET',
-                version='v4'
-            )
-            
-            print(f"✅ 截圖上傳完成：{screenshot_name}")
-            print(f"🔗 GCS URL: gs://{bucket_name}/{blob_path}")
-            print(f"🔗 Signed URL 有效期：15分鐘")
-            return file_url
-            
-        except Exception as e:
-            raise Exception(f"上傳截圖到 GCS 失敗 {screenshot_name}: {str(e)}")
+        timestamp = self._generate_timestamp()
+        extension = screenshot_profiles.extension_for(screenshot_type)
+        return f"申請截圖_{self._target_month()}_{timestamp}_{screenshot_type}.{extension}"
     
-    def _generate_timestamp(self) -> str:
-        """生成台灣時區的時間戳記"""
-        now = datetime.now(self.taiwan_tz)
-        return now.strftime("%Y%m%d-%H%M%S")
+    def _trace_name(self) -> str:
+        """生成追蹤 ZIP 檔名（與截圖放在同一個位置）"""
+        return f"申請追蹤_{self._target_month()}_{self._generate_timestamp()}.zip"
     
     def start_browser(self):
-        """啟動瀏覽器（Cloud Run 無頭模式）"""
+        """向瀏覽器池借用獨立的瀏覽器環境（Cloud Run 無頭模式）"""
         try:
-            print("🌐 啟動 Playwright 瀏覽器（無頭模式）...")
-            playwright = sync_playwright().start()
-            self.browser = playwright.chromium.launch(
-                headless=True,  # Cloud Run 強制無頭模式
-                args=[
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu',
-                    '--disable-web-security',
-                    '--disable-features=VizDisplayCompositor'
-                ]
-            )
-            self.page = self.browser.new_page()
+            print("🌐 借用 Playwright 瀏覽器環境（無頭模式）...")
+            self.context = self.pool.acquire()
+            if NAVIGATION["BLOCK_RESOURCES"]:
+                self.context.route("**/*", self.request_blocker.handle)
+            if self.trace:
+                self.context.tracing.start(**tracing_options())
+                self._tracing = True
+            self.page = self.context.new_page()
             
-            # 設定頁面大小
-            self.page.set_viewport_size({"width": 1920, "height": 1080})
-            
-            print("✅ 瀏覽器啟動成功（無頭模式）")
+            print(f"✅ 瀏覽器環境就緒（無頭模式{'，錄製追蹤' if self.trace else ''}）")
             
         except Exception as e:
             raise Exception(f"啟動瀏覽器失敗: {str(e)}")
     
+    def _open_cached_form(self, base_url: str) -> bool:
+        """
+        前往快取的申請表單網址
+        
+        Args:
+            base_url (str): 徵件列表網址
+            
+        Returns:
+            bool: 表單選擇器是否出現（False 時已清除快取，需完整搜尋）
+        """
+        form_url = form_url_cache.get(base_url)
+        if not form_url:
+            return False
+        
+        name_selector = self.analysis_result['selectors']['form_page']['name_input']
+        with self.wait_timings.measure("cached_form_load") as record:
+            try:
+                self.page.goto(form_url, wait_until=NAVIGATION["WAIT_UNTIL"])
+                self.page.wait_for_selector(name_selector, timeout=FORM_URL_CACHE["VERIFY_TIMEOUT_MS"])
+            except PlaywrightError as e:
+                record["timed_out"] = isinstance(e, PlaywrightTimeoutError)
+                record["error"] = str(e)
+        
+        if "error" in record:
+            print("⚠️ 快取的表單網址沒有申請表單，改為重新搜尋")
+            form_url_cache.invalidate()
+            return False
+        return True
+    
     def navigate_to_application_form(self) -> str:
         """
-        導航到表演場地網站申請表單頁面
+        導航到表演場地網站申請表單頁面（優先使用快取的表單網址）
         
         Returns:
             str: 申請表單頁面 URL
@@ -207,20 +244,25 @@ class WebsiteAutomationCloud:
         try:
             print("🔍 導航到表演場地網站...")
             
-            # 1. 前往第一頁
             base_url = self.analysis_result['matching_logic']['base_url']
-            self.page.goto(base_url, wait_until='networkidle')
-            print(f"✅ 成功載入首頁")
+            if self._open_cached_form(base_url):
+                self.form_url_source = "cache"
+                print(f"✅ 以快取的表單網址進入申請頁面")
+                return self.page.url
             
-            # 2. 使用匹配邏輯尋找街頭藝人申請連結
+            # 1. 前往第一頁（DOM 載入且街頭藝人文字出現即可，不等待網路閒置）
             keyword = self.analysis_result['matching_logic']['street_artist_keyword']
             application_keywords = self.analysis_result['matching_logic']['application_keywords']
             street_artist_selector = self.analysis_result['selectors']['first_page']['street_artist_text']
             
+            with self.wait_timings.measure("list_page_load"):
+                self.page.goto(base_url, wait_until=NAVIGATION["WAIT_UNTIL"])
+                self.page.wait_for_selector(street_artist_selector, timeout=30000)
+            print(f"✅ 成功載入首頁")
+            
+            # 2. 使用匹配邏輯尋找街頭藝人申請連結
             print(f"🔍 尋找關鍵字：{keyword}")
             
-            # 等待並尋找所有街頭藝人文字元素
-            self.page.wait_for_selector(street_artist_selector, timeout=30000)
             street_artist_elements = self.page.locator(street_artist_selector).all()
             
             if not street_artist_elements:
@@ -280,9 +322,13 @@ class WebsiteAutomationCloud:
                 if not application_link:
                     raise Exception("找不到街頭藝人申請的可點擊連結")
             
-            # 4. 等待申請頁面載入
-            self.page.wait_for_load_state('networkidle')
+            # 4. 等待申請頁面載入（表單的姓名欄位出現）
+            with self.wait_timings.measure("form_page_load"):
+                self.page.wait_for_load_state(NAVIGATION["WAIT_UNTIL"])
+                self.page.wait_for_selector(self.analysis_result['selectors']['form_page']['name_input'], timeout=30000)
             current_url = self.page.url
+            self.form_url_source = "search"
+            form_url_cache.put(base_url, current_url)
             
             print(f"✅ 成功進入申請頁面")
             return current_url
@@ -325,37 +371,85 @@ class WebsiteAutomationCloud:
         try:
             print("📎 開始上傳申請文件...")
             
-            # 1. 下載申請 PDF
-            pdf_file_id = self.config.TEST_APPLICATION_PDF['FILE_ID']
-            pdf_file_name = self.config.TEST_APPLICATION_PDF['FILE_NAME']
-            pdf_local_path = self._download_file_from_drive(pdf_file_id, pdf_file_name)
+            # 1-2. 等待申請 PDF 與街頭藝人證下載完成（run_automation 在導航前已開始下載）
+            self.start_artifact_fetch()
+            pdf_artifact, cert_artifact = self.artifacts.result()
+            print(f"✅ 上傳檔案已就緒（街頭藝人證{'沿用快取' if self.artifacts.certificate_cache_hit else '已重新下載'}）")
             
-            # 2. 下載街頭藝人證（Cloud Run 版本：從雲端下載）
-            cert_file_id = self.config.CERTIFICATE['FILE_ID']
-            cert_file_name = self.config.CERTIFICATE['FILE_NAME']
-            cert_local_path = self._download_file_from_drive(cert_file_id, cert_file_name)
-            
-            # 3. 上傳申請 PDF
+            # 3. 上傳申請 PDF（等待網站的上傳請求完成）
             pdf_upload_selector = self.analysis_result['selectors']['form_page']['pdf_upload']
             self.page.wait_for_selector(pdf_upload_selector, timeout=10000)
-            self.page.set_input_files(pdf_upload_selector, pdf_local_path)
+            self._set_input_files_and_wait(pdf_upload_selector, pdf_artifact, "pdf_upload")
             print(f"✅ 成功上傳申請 PDF")
             
-            # 等待檔案上傳處理
-            time.sleep(2)
-            
             # 4. 上傳街頭藝人證
             cert_upload_selector = self.analysis_result['selectors']['form_page']['certificate_upload']
             self.page.wait_for_selector(cert_upload_selector, timeout=10000)
-            self.page.set_input_files(cert_upload_selector, cert_local_path)
+            self._set_input_files_and_wait(cert_upload_selector, cert_artifact, "certificate_upload")
             print(f"✅ 成功上傳街頭藝人證")
             
-            # 等待檔案上傳處理
-            time.sleep(3)
-            
         except Exception as e:
             raise Exception(f"上傳申請文件失敗: {str(e)}")
     
+    def _set_input_files_and_wait(self, selector: str, files, wait_name: str):
+        """
+        選擇檔案並等待網站送出的上傳請求收到回應
+        
+        選擇後 UPLOAD_REQUEST_TIMEOUT_MS 內網站沒有送出上傳請求時，只要檔案已選取就繼續流程。
+        
+        Args:
+            selector (str): 檔案輸入欄位選擇器
+            files: set_input_files 接受的檔案（路徑或 {name, mimeType, buffer}）
+            wait_name (str): 等待名稱（記錄於 wait_timings）
+        """
+        origin = page_origin(self.page.url)
+        upload_requests = []
+        upload_responses = []
+        
+        def on_request(request):
+            if is_upload_request(request, origin):
+                upload_requests.append(request)
+        
+        def on_response(response):
+            if is_upload_response(response, origin):
+                upload_responses.append(response)
+        
+        # 先註冊監聽，避免選擇檔案期間就已完成的上傳請求被漏掉
+        self.page.on("request", on_request)
+        self.page.on("response", on_response)
+        try:
+            with self.wait_timings.measure(wait_name) as record:
+                self.page.set_input_files(selector, files)
+                if not upload_requests:
+                    try:
+                        upload_requests.append(self.page.wait_for_event(
+                            "request",
+                            predicate=lambda request: is_upload_request(request, origin),
+                            timeout=WAITS["UPLOAD_REQUEST_TIMEOUT_MS"]
+                        ))
+                    except PlaywrightTimeoutError:
+                        pass
+                record["xhr"] = bool(upload_requests)
+                if upload_requests and not upload_responses:
+                    try:
+                        upload_responses.append(self.page.wait_for_event(
+                            "response",
+                            predicate=lambda response: is_upload_response(response, origin),
+                            timeout=WAITS["UPLOAD_TIMEOUT_MS"]
+                        ))
+                    except PlaywrightTimeoutError:
+                        record["timed_out"] = True
+        finally:
+            self.page.remove_listener("request", on_request)
+            self.page.remove_listener("response", on_response)
+        
+        if upload_responses:
+            record["status"] = upload_responses[0].status
+            if upload_responses[0].status >= 400:
+                raise Exception(f"網站上傳請求失敗（HTTP {upload_responses[0].status}）")
+        elif self.page.locator(selector).evaluate(FILE_COUNT_SCRIPT) == 0:
+            raise Exception(f"檔案未選取：{selector}")
+    
     def handle_recaptcha(self) -> bool:
         """
         處理 reCAPTCHA 驗證
@@ -383,9 +477,23 @@ class WebsiteAutomationCloud:
                 recaptcha_checkbox.click()
                 print("✅ 已點擊 reCAPTCHA 勾選框")
                 
-                # 等待驗證完成（最多10秒）
-                time.sleep(3)
-                return True
+                # 等待驗證通過或出現圖片驗證
+                with self.wait_timings.measure("recaptcha") as record:
+                    try:
+                        state = self.page.wait_for_function(
+                            RECAPTCHA_STATE_SCRIPT,
+                            timeout=WAITS["RECAPTCHA_TIMEOUT_MS"]
+                        ).json_value()
+                    except PlaywrightTimeoutError:
+                        record["timed_out"] = True
+                        state = None
+                    record["state"] = state
+                
+                if state == "solved":
+                    print("✅ reCAPTCHA 驗證通過")
+                    return True
+                print("⚠️ reCAPTCHA 出現圖片驗證" if state == "challenge" else "⚠️ reCAPTCHA 未在時限內通過")
+                return False
             else:
                 print("⚠️ reCAPTCHA 勾選框不可見")
                 return False
@@ -412,10 +520,17 @@ class WebsiteAutomationCloud:
                 """)
                 print("✅ 已勾選同意條款")
                 
-                # 驗證點擊結果
-                time.sleep(0.5)
-                final_checked = agreement_checkbox.is_checked()
-                if not final_checked:
+                # 等待勾選狀態生效
+                with self.wait_timings.measure("agreement") as record:
+                    try:
+                        self.page.wait_for_function(
+                            CHECKED_SCRIPT,
+                            arg=agreement_selector,
+                            timeout=WAITS["AGREEMENT_TIMEOUT_MS"]
+                        )
+                    except PlaywrightTimeoutError:
+                        record["timed_out"] = True
+                if record["timed_out"]:
                     raise Exception("同意條款勾選失敗")
             else:
                 print("✅ 同意條款已經勾選")
@@ -423,51 +538,55 @@ class WebsiteAutomationCloud:
         except Exception as e:
             raise Exception(f"勾選同意條款失敗: {str(e)}")
     
-    def take_screenshot_and_upload(self, screenshot_type: str = "待驗證") -> str:
+    def take_screenshot_and_upload(self, screenshot_type: str = "待驗證"):
         """
-        截圖並上傳到 Google Cloud Storage
+        截圖並排入背景上傳到 Google Cloud Storage
         
         Args:
             screenshot_type (str): 截圖類型（待驗證、驗證完、待確認、已完成、失敗）
             
         Returns:
-            str: GCS 截圖檔案 URL
+            Future: 上傳中的截圖（run_automation 組合結果時轉為 Signed URL）
         """
         try:
             print(f"📸 截圖：{screenshot_type}")
             
-            # 動態獲取申請月份（從 application_data）
-            target_month = "2025年11月"  # 預設值
-            if self.application_data and 'target_month' in self.application_data:
-                target_month_data = self.application_data.get('target_month', {})
-                if isinstance(target_month_data, dict) and 'display' in target_month_data:
-                    target_month = target_month_data['display']
-                elif isinstance(target_month_data, str):
-                    target_month = target_month_data
-            
-            # 生成截圖檔名（使用截圖時間戳記）
-            timestamp = self._generate_timestamp()
-            screenshot_name = f"申請截圖_{target_month}_{timestamp}_{screenshot_type}.png"
-            screenshot_path = os.path.join(self.temp_dir, screenshot_name)
+            screenshot_name = self._screenshot_name(screenshot_type)
             
             print(f"📝 截圖檔名：{screenshot_name}")
             
-            # 截圖
-            self.page.screenshot(
-                path=screenshot_path,
-                full_page=True,
-                type='png'
-            )
+            # 依截圖類型的設定檔擷取（不寫入臨時目錄）
+            screenshot_bytes, content_type, stats = screenshot_profiles.capture(self.page, screenshot_type, self.form_selector)
+            self.screenshot_stats[screenshot_type] = stats
+            print(f"📝 截圖設定檔 {stats['profile']}：{stats['bytes']} bytes，{stats['capture_seconds']} 秒")
             
-            # 上傳到 Google Cloud Storage
-            gcs_url = self._upload_screenshot_to_gcs(screenshot_path, screenshot_name)
-            
-            print(f"✅ 截圖完成並上傳到 GCS")
-            return gcs_url
+            # 背景上傳到 Google Cloud Storage，流程繼續下一步
+            return self._upload_screenshot_to_gcs(screenshot_bytes, screenshot_name, content_type)
             
         except Exception as e:
             raise Exception(f"截圖失敗: {str(e)}")
     
+    def stop_trace_and_upload(self):
+        """
+        停止錄製追蹤並排入背景上傳（與截圖上傳到同一個位置）
+        
+        Returns:
+            Future | None: 上傳中的追蹤 ZIP，未錄製時回傳 None
+        """
+        if not self._tracing:
+            return None
+        self._tracing = False
+        
+        trace_name = self._trace_name()
+        trace_path = os.path.join(self.temp_dir, trace_name)
+        self.context.tracing.stop(path=trace_path)
+        with open(trace_path, 'rb') as f:
+            trace_bytes = f.read()
+        os.remove(trace_path)
+        
+        print(f"🧭 追蹤已錄製：{trace_name}（{len(trace_bytes)} bytes）")
+        return self._upload_screenshot_to_gcs(trace_bytes, trace_name, 'application/zip')
+    
     def submit_application(self) -> bool:
         """
         提交申請（僅在階段2C執行）
@@ -487,11 +606,24 @@ class WebsiteAutomationCloud:
             submit_button = self.page.locator(submit_selector)
             
             if submit_button.is_visible() and submit_button.is_enabled():
-                submit_button.click()
+                # 等待送出後網站的回應（XHR 或表單導航）
+                with self.wait_timings.measure("submit") as record:
+                    try:
+                        origin = page_origin(self.page.url)
+                        with self.page.expect_response(
+                            lambda response: is_submit_response(response, origin), timeout=WAITS["SUBMIT_TIMEOUT_MS"]
+                        ) as response_info:
+                            submit_button.click()
+                        record["status"] = response_info.value.status
+                        self.page.wait_for_load_state('domcontentloaded')
+                    except PlaywrightTimeoutError:
+                        record["timed_out"] = True
                 print("✅ 已點擊提交按鈕")
                 
-                # 等待提交結果
-                time.sleep(5)
+                if record["timed_out"]:
+                    raise Exception("送出後未收到網站回應")
+                if record["status"] >= 400:
+                    raise Exception(f"網站回應錯誤（HTTP {record['status']}）")
                 return True
             else:
                 raise Exception("提交按鈕不可用")
@@ -539,15 +671,20 @@ class WebsiteAutomationCloud:
         try:
             print("🧹 清理資源...")
             
-            # 關閉瀏覽器
-            if self.browser:
-                self.browser.close()
-                print("✅ 瀏覽器已關閉")
+            # 歸還瀏覽器環境（瀏覽器本身由瀏覽器池保留給下次執行）
+            if self.context:
+                self.pool.release(self.context)
+                self.context = None
+                self.page = None
+                print("✅ 瀏覽器環境已歸還")
             
-            # 清理臨時檔案
+            # 清理臨時檔案（先等待背景下載結束，避免刪除途中仍有寫入）
+            if self.artifacts is not None:
+                self.artifacts.wait()
             import shutil
-            if os.path.exists(self.temp_dir):
-                shutil.rmtree(self.temp_dir)
+            if self._temp_dir is not None and os.path.exists(self._temp_dir):
+                shutil.rmtree(self._temp_dir)
+                self._temp_dir = None
                 print(f"✅ 臨時目錄已清理")
                 
         except Exception as e:
@@ -565,13 +702,22 @@ class WebsiteAutomationCloud:
         """
         # 保存申請資料（用於生成截圖檔名）
         self.application_data = application_data
+        self.step_timings = StepTimings()
+        step = self.step_timings.step
         
+        screenshot_uploads = {}  # 結果欄位 → 上傳中的截圖
         result = {
             'success': False,
             'stage': self.stage,
             'timestamp': self._generate_timestamp(),
             'screenshot_url': None,
             'verification': {},
+            'waits': self.wait_timings.waits,
+            'network': {},
+            'form_url_source': None,
+            'artifacts': {},
+            'screenshots': self.screenshot_stats,
+            'timings': self.step_timings.steps,
             'error': None
         }
         
@@ -579,40 +725,50 @@ class WebsiteAutomationCloud:
             print(f"🚀 開始執行階段 {self.stage}：Cloud Run 網站自動化")
             print("=" * 50)
             
-            # 1. 啟動瀏覽器
-            self.start_browser()
+            # 1. 啟動瀏覽器，同時在背景下載上傳檔案
+            self.start_artifact_fetch()
+            with step("start_browser"):
+                self.start_browser()
             
             # 2. 導航到申請表單
-            form_url = self.navigate_to_application_form()
+            with step("navigate_to_application_form"):
+                form_url = self.navigate_to_application_form()
+            result['form_url_source'] = self.form_url_source
             
             # 3. 填寫個人資料
-            self.fill_personal_information()
+            with step("fill_personal_information"):
+                self.fill_personal_information()
             
             # 4. 上傳申請文件
-            self.upload_files()
+            with step("upload_files"):
+                self.upload_files()
             
             # 5. 處理 reCAPTCHA
-            recaptcha_success = self.handle_recaptcha()
+            with step("handle_recaptcha"):
+                recaptcha_success = self.handle_recaptcha()
             if not recaptcha_success:
                 print("⚠️ reCAPTCHA 處理未完全成功，但繼續流程")
             
             # 6. 勾選同意條款
-            self.check_agreement_checkbox()
+            with step("check_agreement_checkbox"):
+                self.check_agreement_checkbox()
             
             # 7. 驗證表單完成狀態
-            verification = self.verify_form_completion()
+            with step("verify_form_completion"):
+                verification = self.verify_form_completion()
             result['verification'] = verification
             
             # 8. 截圖（待驗證）
-            screenshot_url = self.take_screenshot_and_upload("待驗證")
-            result['screenshot_url'] = screenshot_url
+            with step("screenshot:待驗證"):
+                screenshot_uploads['screenshot_url'] = self.take_screenshot_and_upload("待驗證")
             
             # 9. 提交申請（僅階段2C）
-            submitted = self.submit_application()
+            with step("submit_application"):
+                submitted = self.submit_application()
             if submitted:
                 # 提交成功截圖
-                success_screenshot_url = self.take_screenshot_and_upload("提交成功")
-                result['success_screenshot_url'] = success_screenshot_url
+                with step("screenshot:提交成功"):
+                    screenshot_uploads['success_screenshot_url'] = self.take_screenshot_and_upload("提交成功")
             
             print(f"✅ 階段 {self.stage} 執行成功！")
             result['success'] = True
@@ -624,15 +780,34 @@ class WebsiteAutomationCloud:
             
             # 失敗時也嘗試截圖
             try:
-                failure_screenshot_url = self.take_screenshot_and_upload("失敗")
-                result['failure_screenshot_url'] = failure_screenshot_url
+                with step("screenshot:失敗"):
+                    screenshot_uploads['failure_screenshot_url'] = self.take_screenshot_and_upload("失敗")
             except:
                 pass
         
         finally:
+            result['network'] = self.request_blocker.summary()
+            if self.artifacts is not None:
+                result['artifacts'] = self.artifacts.summary()
+            
+            # 停止追蹤（歸還瀏覽器環境前），ZIP 與截圖一起上傳
+            try:
+                trace_upload = self.stop_trace_and_upload()
+                if trace_upload is not None:
+                    screenshot_uploads['trace_url'] = trace_upload
+            except Exception as e:
+                print(f"⚠️ 儲存追蹤失敗: {str(e)}")
+            result['total_seconds'] = self.step_timings.total_seconds()
+            
             # 清理資源
             self.cleanup()
         
+        # 等待背景上傳完成並產生 Signed URL（上傳失敗只記錄，不影響表單流程的結果）
+        urls, errors = resolve_all(screenshot_uploads)
+        result.update(urls)
+        if errors:
+            result['screenshot_errors'] = errors
+        
         print("=" * 50)
         print(f"🎯 階段 {self.stage} 結果：{'成功' if result['success'] else '失敗'}")
         return result
@@ -648,6 +823,7 @@ def main():
     
     # 執行自動化
     result = automation.run_automation()
+    browser_pool.shutdown()
     
     # 輸出結果
     print("\n📊 執行結果：")
@@ -655,7 +831,7 @@ def main():
     
     if result['success']:
         print(f"\n🎉 階段 {automation.stage} 成功完成！")
-        print(f"📸 截圖已上傳到 Google Drive：{result.get('screenshot_url', 'N/A')}")
+        print(f"📸 截圖已上傳：{result.get('screenshot_url', 'N/A')}")
     else:
         print(f"\n💥 階段 {automation.stage} 執行失敗")
         print("🔍 請檢查錯誤訊息並修正問題")
@@ -0,0 +1,567 @@
+"""
+街頭藝人申請系統 - ASGI 非同步服務模式
+
+main.py 的 Flask 應用以 gunicorn 多執行緒服務，每個申請在等待 Drive、Sheets、
+GAS 回調或 soffice 時都佔用一個執行緒。
+
+ASGI 模式（uvicorn asgi_app:app）中：
+- /process-application 與 /health 為 async handler，Google API 走 httpx 非阻塞呼叫，
+  PDF 轉換使用 asyncio subprocess，等待中的申請不佔用執行緒
+- /jobs/{user_id}/{timestamp}/events 提供 SSE 進度串流，監聽者同樣不佔用執行緒
+- /website-automation 使用 Playwright async API，多位申請人的流程在事件迴圈中共用瀏覽器並行執行
+  （同時執行數上限為 ASYNC_AUTOMATION_CONCURRENCY）
+- 其餘端點（/claim-file-pair、/metrics 等）掛載原本的 Flask 應用，
+  行為與 gunicorn 模式相同
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+
+from googleapiclient.errors import HttpError
+from starlette.applications import Starlette
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import main
+import resilience
+import conversion_pool
+import memory_accounting
+from metrics import metrics
+from job_journal import JobJournal
+from job_progress import JobProgress, no_progress, is_finished, to_json_lines, to_sse
+import record_partition
+from config import config
+from async_google import AsyncGoogleClient
+
+logger = logging.getLogger(__name__)
+
+# SSE 進度串流設定
+PROGRESS_STREAM = {
+    "POLL_SECONDS": float(os.environ.get("PROGRESS_POLL_SECONDS", "0.5")),
+    "MAX_SECONDS": int(os.environ.get("PROGRESS_STREAM_MAX_SECONDS", "600")),
+}
+
+WORD_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+PDF_MIME_TYPE = 'application/pdf'
+
+
+class AsyncDocumentProcessor:
+    """DocumentProcessor 的 asyncio 版本（純運算部分沿用同步實作）"""
+
+    def __init__(self, processor, client):
+        """
+        Args:
+            processor (DocumentProcessor): 同步文件處理器（提供模板快取、填寫與命名規則）
+            client (AsyncGoogleClient): 非阻塞 Google API 客戶端
+        """
+        self.processor = processor
+        self.client = client
+
+    async def provision_output_files(self, application_data, pool=None):
+        """
+        建立輸出用的 Word/PDF 檔案（檔案池優先，否則同時建立兩個空白檔案）
+
+        Returns:
+            dict: 與 DocumentProcessor.provision_output_files 相同格式
+        """
+        word_file_name, pdf_file_name = self.processor.build_output_file_names(application_data)
+
+        provisioned = None
+        if pool is not None:
+            try:
+                provisioned = await asyncio.to_thread(pool.claim, word_file_name, pdf_file_name)
+            except Exception as e:
+                logger.warning(f"檔案池領取失敗，改為直接建立: {str(e)}")
+
+        if provisioned:
+            word = {"id": provisioned["copiedFileId"], "webViewLink": provisioned["wordUrl"]}
+            pdf = {"id": provisioned["pdfFileId"], "webViewLink": provisioned["pdfUrl"]}
+        else:
+            folder_id = config.GOOGLE_DRIVE["GENERATED_FOLDER_ID"]
+            word, pdf = await asyncio.gather(
+                self.client.create_file(word_file_name, folder_id, WORD_MIME_TYPE),
+                self.client.create_file(pdf_file_name, folder_id, PDF_MIME_TYPE),
+                return_exceptions=True
+            )
+            errors = [result for result in (word, pdf) if isinstance(result, BaseException)]
+            if errors:
+                # 另一個已建立的檔案不會被使用，刪除避免殘留
+                for result in (word, pdf):
+                    if not isinstance(result, BaseException):
+                        try:
+                            await self.client.delete_file(result["id"])
+                        except Exception as cleanup_error:
+                            logger.warning(f"刪除殘留輸出檔案失敗 {result['id']}: {str(cleanup_error)}")
+                raise Exception(f"建立輸出檔案失敗: {'; '.join(str(e) for e in errors)}")
+
+        application_data["copiedFileId"] = word["id"]
+        application_data["pdfFileId"] = pdf["id"]
+        application_data["copiedFileName"] = word_file_name + ".docx"
+        application_data["pdfFileName"] = pdf_file_name + ".pdf"
+
+        logger.info(f"輸出檔案已建立: Word {word['id']}, PDF {pdf['id']}")
+        return {
+            "word_file_id": word["id"],
+            "word_url": word.get("webViewLink"),
+            "word_file_name": word_file_name + ".docx",
+            "pdf_file_id": pdf["id"],
+            "pdf_url": pdf.get("webViewLink"),
+            "pdf_file_name": pdf_file_name + ".pdf"
+        }
+
+    async def convert_to_pdf(self, word_path, temp_dir):
+        """
+        以 asyncio subprocess 執行 LibreOffice 轉換
+
+        Returns:
+            str: PDF 檔案路徑
+        """
+        async with conversion_pool.slot_async() as profile_arg:
+            cmd = self.processor.build_convert_command(word_path, temp_dir, profile_arg)
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+
+            try:
+                _, stderr = await asyncio.wait_for(process.communicate(), timeout=config.LIBREOFFICE["TIMEOUT_SECONDS"])
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                raise Exception(f"LibreOffice 轉換逾時（{config.LIBREOFFICE['TIMEOUT_SECONDS']} 秒）")
+
+        if process.returncode != 0:
+            raise Exception(f"LibreOffice 轉換失敗: {stderr.decode('utf-8', errors='replace')}")
+
+        pdf_path = self.processor.converted_pdf_path(word_path, temp_dir)
+        if not os.path.exists(pdf_path):
+            raise Exception(f"找不到轉換後的 PDF: {pdf_path}")
+
+        logger.info(f"PDF 轉換完成: {pdf_path}")
+        return pdf_path
+
+    async def locate_record(self, spreadsheet_id, user_id, application_data):
+        """
+        找到申請記錄所在的工作表與列號（與 DocumentProcessor.locate_record 相同搜尋順序）
+
+        Returns:
+            tuple: (sheet_name, target_row)
+        """
+        for sheet_name in record_partition.candidate_sheet_names(application_data.get("timestamp")):
+            try:
+                values = await self.client.get_values(spreadsheet_id, f"{sheet_name}!A:K")
+            except HttpError as e:
+                # 月分頁尚未建立
+                if e.resp.status == 400:
+                    continue
+                raise
+            target_row = self.processor.match_record_row(values, user_id, application_data)
+            if target_row:
+                return sheet_name, target_row
+
+        raise self.processor.record_not_found_error(user_id, application_data)
+
+    async def update_sheets_status(self, user_id, application_data, pdf_url, status="完成", error_message=""):
+        """更新 Google Sheets 狀態（與 DocumentProcessor.update_sheets_status 相同邏輯）"""
+        logger.info(f"更新 Sheets 狀態: {status}")
+
+        spreadsheet_id = config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"]
+
+        timestamp = application_data.get("timestamp")
+        if timestamp:
+            status_values = self.processor.build_status_values(status, pdf_url, error_message)
+            result = await self.client.update_values_by_data_filter(
+                spreadsheet_id, [record_partition.status_update_by_key(user_id, timestamp, status_values)]
+            )
+            if result.get("totalUpdatedRows", 0) > 0:
+                logger.info("Sheets 狀態更新完成（依列標記）")
+                return
+
+        sheet_name, target_row = await self.locate_record(spreadsheet_id, user_id, application_data)
+        update_range, update_data = self.processor.build_status_update(sheet_name, target_row, status, pdf_url, error_message)
+        await self.client.update_values(spreadsheet_id, update_range, update_data)
+
+        logger.info(f"Sheets 狀態更新完成: 行 {target_row}")
+
+    async def record_status(self, user_id, application_data, pdf_url, status="完成", error_message=""):
+        """記錄申請狀態（與 main.record_status 相同：中間狀態寫入 SQLite 即回傳，完成/失敗非阻塞寫入 Sheets）"""
+        if main.application_store is None:
+            await self.update_sheets_status(user_id, application_data, pdf_url, status, error_message)
+            return
+
+        main.record_local_status(user_id, application_data, pdf_url, status, error_message)
+        if status in main.TERMINAL_STATUSES:
+            try:
+                await self.update_sheets_status(user_id, application_data, pdf_url, status, error_message)
+                main.application_store.mark_written(user_id, application_data.get("timestamp"))
+                return
+            except Exception as e:
+                logger.warning(f"直接寫入 Sheets 失敗，交由背景同步重試: {str(e)}")
+        main.sheets_replicator.notify()
+
+    async def render(self, app_data, source_file_id, temp_dir, progress=no_progress):
+        """
+        填寫模板並轉換為 PDF（輸出快取命中時直接使用）
+
+        Returns:
+            tuple: (docx_bytes, pdf_bytes, cache_key, cache_hit)
+        """
+        cache = main.output_cache_store
+        progress("downloading", source="output_cache")
+        cache_key = await asyncio.to_thread(self.processor.output_cache_key, app_data)
+        cached = await asyncio.to_thread(cache.get, cache_key)
+        if cached:
+            logger.info(f"輸出快取命中，略過填寫與轉換: {cache_key[:12]}")
+            return (*cached, cache_key, True)
+
+        progress("downloading", source="copied_file" if source_file_id else "template")
+        if source_file_id:
+            source_bytes = await self.client.download_file(source_file_id)
+        else:
+            source_bytes = await asyncio.to_thread(self.processor.get_template_bytes)
+
+        source_word_path = os.path.join(temp_dir, "source_template.docx")
+        with open(source_word_path, 'wb') as f:
+            f.write(source_bytes)
+
+        # python-docx 為純運算，交給執行緒執行避免阻塞事件迴圈
+        filled_word_path = os.path.join(temp_dir, "filled_template.docx")
+        progress("filling")
+        await asyncio.to_thread(self.processor.fill_template, source_word_path, app_data, filled_word_path)
+
+        progress("converting")
+        pdf_path = await self.convert_to_pdf(filled_word_path, temp_dir)
+
+        with open(filled_word_path, 'rb') as f:
+            docx_bytes = f.read()
+        with open(pdf_path, 'rb') as f:
+            pdf_bytes = f.read()
+
+        await asyncio.to_thread(cache.put, cache_key, docx_bytes, pdf_bytes)
+        return docx_bytes, pdf_bytes, cache_key, False
+
+    async def process_documents(self, app_data, journal, progress=no_progress):
+        """
+        建立輸出檔案、填寫轉換並上傳（與 main.process_documents 相同的階段與檢查點）
+
+        Returns:
+            tuple: (word_url, pdf_url, output_cache_hit)
+        """
+        copied_file_id = app_data.get("copiedFileId")
+
+        async def provision():
+            if copied_file_id:
+                logger.info(f"使用方案 B: 編輯已複製檔案 {copied_file_id}")
+            else:
+                logger.info("由 Cloud Run 建立輸出檔案")
+                await self.provision_output_files(app_data, main.file_pool)
+            return {field: app_data.get(field) for field in main.OUTPUT_FILE_FIELDS}
+
+        app_data.update(await journal.run_async("provision", provision))
+
+        uploads_pending = not (journal.is_done("upload_word") and journal.is_done("upload_pdf"))
+        documents = {}
+
+        async def render():
+            with tempfile.TemporaryDirectory() as temp_dir:
+                docx_bytes, pdf_bytes, cache_key, cache_hit = await self.render(app_data, copied_file_id, temp_dir, progress)
+                documents["temp_dir_kb"] = memory_accounting.dir_size_kb(temp_dir)
+            documents.update(docx=docx_bytes, pdf=pdf_bytes)
+            return {
+                "cache_key": cache_key,
+                "docx_sha256": hashlib.sha256(docx_bytes).hexdigest(),
+                "pdf_sha256": hashlib.sha256(pdf_bytes).hexdigest(),
+                "output_cache_hit": cache_hit
+            }
+
+        async def restore_render(detail):
+            if not uploads_pending:
+                return True
+            cached = await asyncio.to_thread(main.output_cache_store.get, detail.get("cache_key", ""))
+            if not cached:
+                return False
+            docx_bytes, pdf_bytes = cached
+            if (hashlib.sha256(docx_bytes).hexdigest() != detail.get("docx_sha256")
+                    or hashlib.sha256(pdf_bytes).hexdigest() != detail.get("pdf_sha256")):
+                return False
+            documents.update(docx=docx_bytes, pdf=pdf_bytes)
+            return True
+
+        rendered = await journal.run_async("render", render, restore=restore_render)
+        if "temp_dir_kb" in documents:
+            journal.annotate("render", temp_dir_kb=documents["temp_dir_kb"])
+
+        async def upload_word():
+            file = await self.client.update_file_content(app_data["copiedFileId"], documents["docx"], WORD_MIME_TYPE)
+            return {"word_url": file.get('webViewLink')}
+
+        async def upload_pdf():
+            file = await self.client.update_file_content(app_data["pdfFileId"], documents["pdf"], PDF_MIME_TYPE)
+            return {"pdf_url": file.get('webViewLink')}
+
+        if uploads_pending:
+            progress("uploading")
+
+        # Word 與 PDF 上傳互不相依，同時進行
+        word, pdf = await asyncio.gather(
+            journal.run_async("upload_word", upload_word),
+            journal.run_async("upload_pdf", upload_pdf)
+        )
+        logger.info(f"Word 檔案已上傳: {word['word_url']}")
+        logger.info(f"PDF 檔案已上傳: {pdf['pdf_url']}")
+
+        return word["word_url"], pdf["pdf_url"], rendered.get("output_cache_hit", False)
+
+
+async def health_check(request):
+    """健康檢查端點"""
+    return JSONResponse({
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "service": "document-processor",
+        "mode": "asgi"
+    })
+
+
+async def process_application(request):
+    """
+    /process-application 的非同步版本（請求與回應格式與 main.process_application 相同）
+    """
+    resilience.start_request_budget()
+    processor = request.app.state.processor
+    application_data = None
+    progress = no_progress
+    claimed = False
+
+    try:
+        try:
+            application_data = await request.json()
+        except ValueError:
+            application_data = None
+        if not application_data:
+            return JSONResponse({"error": "缺少申請資料"}, status_code=400)
+
+        user_id = application_data.get("user_id")
+        timestamp = application_data.get("timestamp")
+        gas_callback_url = application_data.get("gas_callback_url")
+
+        app_data = application_data.get("application_data")
+        if not app_data:
+            return JSONResponse({"error": "缺少申請資料"}, status_code=400)
+
+        app_data["timestamp"] = timestamp
+
+        logger.info(f"🚀 [ASGI] 申請處理開始: 用戶 {user_id}, 時間戳記 {timestamp}")
+
+        # 同一筆記錄正由其他請求或批次處理中時不重複處理（也不覆寫其狀態）；
+        # 回傳 202：GAS 視為處理中，結果由持有者完成後回調
+        if not await asyncio.to_thread(main.claim_application, user_id, timestamp):
+            logger.info(f"申請 {timestamp} 正由其他程序處理中，略過")
+            return JSONResponse({
+                "success": True,
+                "claimed_elsewhere": True,
+                "message": "此申請正由其他程序處理中，完成後會回調",
+                "user_id": user_id
+            }, status_code=202)
+        claimed = True
+
+        progress = JobProgress(main.application_store, user_id, timestamp)
+        progress("queued")
+        memory = memory_accounting.MemoryProbe()
+
+        await processor.record_status(user_id, app_data, "", "文件處理中")
+        # 同一申請重試時從第一個未完成的階段繼續
+        journal = JobJournal(main.application_store, user_id, timestamp, main.shared_journal)
+        await asyncio.to_thread(journal.load_shared)
+        word_url, pdf_url, cache_hit = await processor.process_documents(app_data, journal, progress)
+        progress("recording")
+        await processor.record_status(user_id, app_data, pdf_url, "完成", "")
+        logger.info("✅ Sheets 狀態已更新為「完成」")
+        progress("done", pdf_url=pdf_url, word_url=word_url)
+        memory_report = memory.delta()
+        memory_accounting.record_request(f"{user_id}/{timestamp}", {**memory_report, "status": "完成"})
+        # 完成狀態已寫入：重新送出可以立即取得處理權
+        await asyncio.to_thread(main.release_application, user_id, timestamp)
+        claimed = False
+
+        if gas_callback_url:
+            callback_data = main.build_callback_data(
+                user_id, application_data.get("group_id"), timestamp, app_data, pdf_url, word_url
+            )
+            try:
+                callback_response = await processor.client.post_json(gas_callback_url, callback_data)
+                logger.info(f"✅ 已回調 GAS: {callback_response.status_code}")
+            except Exception as callback_error:
+                logger.error(f"⚠️ 回調 GAS 失敗: {str(callback_error)}")
+
+        return JSONResponse({
+            "success": True,
+            "message": "申請處理完成，Shortcut 連結已發送",
+            "pdf_url": pdf_url,
+            "pdf_file_id": app_data.get("pdfFileId"),
+            "pdf_file_name": app_data.get("pdfFileName"),
+            "word_url": word_url,
+            "word_file_id": app_data.get("copiedFileId"),
+            "word_file_name": app_data.get("copiedFileName"),
+            "output_cache_hit": cache_hit,
+            **journal.summary(),
+            "memory": memory_report,
+            "user_id": user_id
+        })
+
+    except Exception as e:
+        logger.error(f"❌ [ASGI] 處理申請失敗: {str(e)}")
+        progress("failed", error=str(e))
+
+        try:
+            user_id = application_data.get("user_id") if application_data else "unknown"
+            app_data = application_data.get("application_data", {}) if application_data else {}
+            error_message = f"[文件處理] {str(e)}"
+
+            if main.application_store is None and resilience.is_open("sheets"):
+                logger.warning("Sheets 斷路器開啟中，略過失敗狀態更新")
+            else:
+                await processor.record_status(user_id, app_data, "", "失敗", error_message)
+
+            gas_callback_url = application_data.get("gas_callback_url") if application_data else None
+            if gas_callback_url:
+                callback_data = main.build_callback_data(
+                    user_id, application_data.get("group_id"), application_data.get("timestamp"), error=e
+                )
+                try:
+                    await processor.client.post_json(gas_callback_url, callback_data)
+                    logger.info("✅ 已回調 GAS（失敗通知）")
+                except Exception as callback_error:
+                    logger.error(f"⚠️ 回調 GAS 失敗: {str(callback_error)}")
+        except Exception as notify_error:
+            logger.error(f"❌ 通知處理失敗: {str(notify_error)}")
+
+        # 失敗狀態寫入後才釋放，重試可以立即取得處理權
+        if claimed:
+            await asyncio.to_thread(
+                main.release_application, application_data.get("user_id"), application_data.get("timestamp")
+            )
+
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+async def job_events(request):
+    """
+    申請處理進度事件：Accept: text/event-stream 時以 SSE 串流到結束事件為止，否則回傳 JSON Lines
+
+    串流在事件迴圈中以 asyncio.sleep 輪詢本機狀態儲存，監聽者不佔用執行緒
+    """
+    store = main.application_store
+    if store is None:
+        return JSONResponse({"success": False, "error": "未開啟本機狀態儲存（STATE_STORE_ENABLED）"}, status_code=400)
+
+    user_id = request.path_params["user_id"]
+    timestamp = request.path_params["timestamp"]
+    after = request.headers.get("last-event-id") or request.query_params.get("after") or 0
+    try:
+        after = int(after)
+    except ValueError:
+        after = 0
+
+    if "text/event-stream" not in request.headers.get("accept", ""):
+        return PlainTextResponse(to_json_lines(store.events_after(user_id, timestamp, after)), media_type="application/x-ndjson")
+
+    async def stream():
+        cursor = after
+        deadline = asyncio.get_running_loop().time() + PROGRESS_STREAM["MAX_SECONDS"]
+        while asyncio.get_running_loop().time() < deadline:
+            if await request.is_disconnected():
+                return
+            events = store.events_after(user_id, timestamp, cursor)
+            for event in events:
+                yield to_sse(event)
+                cursor = event["seq"]
+            if is_finished(events):
+                return
+            # 保持連線（部分 proxy 會關閉長時間無資料的連線）
+            if not events:
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(PROGRESS_STREAM["POLL_SECONDS"])
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+async def website_automation(request):
+    """
+    /website-automation 的非同步版本（請求與回應格式與 main.website_automation 相同）
+    """
+    try:
+        request_data = await request.json()
+    except ValueError:
+        request_data = None
+    if not request_data:
+        return JSONResponse({"error": "缺少請求資料"}, status_code=400)
+
+    user_id = request_data.get("user_id")
+    application_data = request_data.get("application_data", {})
+    if not user_id:
+        return JSONResponse({"error": "缺少用戶ID"}, status_code=400)
+
+    try:
+        from website_automation_async import AsyncBrowserPool, ASYNC_AUTOMATION, run_one
+
+        # 瀏覽器池與並行上限在第一次使用時建立（未使用網站自動化時不啟動 Chromium）
+        if getattr(app.state, "automation_pool", None) is None:
+            app.state.automation_pool = AsyncBrowserPool()
+            app.state.automation_semaphore = asyncio.Semaphore(ASYNC_AUTOMATION["CONCURRENCY"])
+            metrics.register_gauge("browser_pool.async", app.state.automation_pool.status)
+
+        logger.info(f"開始網站自動化處理: 用戶 {user_id}")
+        # 階段 2B：Cloud Run 測試，不提交
+        result = await run_one(application_data, app.state.automation_pool, app.state.automation_semaphore, stage="2B", trace=request_data.get("trace"))
+
+    except Exception as e:
+        logger.error(f"網站自動化處理失敗: {str(e)}")
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+    if result['success']:
+        logger.info(f"網站自動化成功: 用戶 {user_id}")
+        return JSONResponse({
+            "success": True,
+            "message": "網站自動化完成",
+            "result": result,
+            "user_id": user_id
+        })
+
+    logger.error(f"網站自動化失敗: 用戶 {user_id}, 錯誤: {result.get('error')}")
+    return JSONResponse({
+        "success": False,
+        "error": result.get('error', '未知錯誤'),
+        "result": result
+    }, status_code=500)
+
+
+async def on_startup():
+    app.state.processor = AsyncDocumentProcessor(main.doc_processor, AsyncGoogleClient())
+    logger.info("ASGI 服務啟動完成")
+
+
+async def on_shutdown():
+    await app.state.processor.client.aclose()
+    if getattr(app.state, "automation_pool", None) is not None:
+        await app.state.automation_pool.stop()
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/process-application', process_application, methods=['POST']),
+        Route('/jobs/{user_id}/{timestamp}/events', job_events, methods=['GET']),
+        Route('/website-automation', website_automation, methods=['POST']),
+        # 其他端點沿用 Flask 應用（在執行緒池中執行）
+        Mount('/', app=WSGIMiddleware(main.app)),
+    ],
+    on_startup=[on_startup],
+    on_shutdown=[on_shutdown]
+)
@@ -0,0 +1,164 @@
+"""
+街頭藝人申請系統 - 非阻塞 Google Drive / Sheets 客戶端
+
+googleapiclient 是同步 API，每個等待中的呼叫都佔用一個執行緒。
+ASGI 模式改用 httpx.AsyncClient 直接呼叫 REST API：
+- access token 由 credential_provider 在背景刷新，請求只讀取現有 token；
+  回應 401（token 提前失效、金鑰輪替）時刷新一次再重送，與 googleapiclient 的行為一致
+- 每次呼叫都經過 resilience.call_async（限流、重試、斷路器）
+- HTTP 錯誤轉成 googleapiclient 的 HttpError，沿用同一套可重試判斷
+"""
+
+import asyncio
+import logging
+
+import httpx
+import httplib2
+from googleapiclient.errors import HttpError
+
+import resilience
+from credential_provider import credential_provider
+
+logger = logging.getLogger(__name__)
+
+DRIVE_API = "https://www.googleapis.com/drive/v3"
+DRIVE_UPLOAD_API = "https://www.googleapis.com/upload/drive/v3"
+SHEETS_API = "https://sheets.googleapis.com/v4"
+
+
+class AsyncGoogleClient:
+    """Drive / Sheets REST API 的 asyncio 客戶端"""
+
+    def __init__(self, timeout=60):
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _token(self):
+        # 已建立的憑證直接使用（token 由背景執行緒刷新）；首次建立需讀取 Secret Manager，放到執行緒執行
+        credentials = credential_provider.cached_credentials()
+        if credentials is None:
+            credentials = await asyncio.to_thread(credential_provider.get_credentials)
+        return credentials.token
+
+    async def _refresh_token(self, rejected_token):
+        """收到 401 時刷新 token（其他請求已刷新過就直接使用新 token）"""
+        if credential_provider.cached_credentials().token == rejected_token:
+            await asyncio.to_thread(credential_provider.refresh)
+
+    async def _request(self, api, quota, method, url, idempotent=True, **kwargs):
+        """
+        送出一個經過限流/重試/斷路器保護的請求
+
+        Args:
+            idempotent (bool): 重送是否安全（建立檔案傳 False，只重試配額錯誤）
+
+        Returns:
+            httpx.Response: 成功的回應
+        """
+        extra_headers = kwargs.pop("headers", {})
+
+        async def send(token):
+            headers = {"Authorization": f"Bearer {token}", **extra_headers}
+            try:
+                return await self._client.request(method, url, headers=headers, **kwargs)
+            except httpx.TransportError as e:
+                # 轉成內建 ConnectionError，讓 resilience 視為暫時性錯誤
+                raise ConnectionError(f"{method} {url}: {str(e)}") from e
+
+        async def attempt():
+            token = await self._token()
+            response = await send(token)
+            if response.status_code == 401:
+                logger.info(f"{method} {url} 回應 401，刷新 token 後重送")
+                await self._refresh_token(token)
+                response = await send(await self._token())
+            if response.status_code >= 400:
+                resp = httplib2.Response({"status": response.status_code, **response.headers})
+                raise HttpError(resp, response.content, uri=url)
+            return response
+
+        return await resilience.call_async(attempt, api, quota, idempotent)
+
+    # ===== Drive =====
+
+    async def download_file(self, file_id):
+        """
+        下載檔案內容
+
+        Returns:
+            bytes: 檔案內容
+        """
+        response = await self._request("drive", "drive", "GET", f"{DRIVE_API}/files/{file_id}", params={"alt": "media"})
+        return response.content
+
+    async def create_file(self, name, parent_id, mime_type):
+        """
+        建立空白檔案（只有 metadata）
+
+        Returns:
+            dict: {"id", "webViewLink"}
+        """
+        response = await self._request(
+            "drive", "drive", "POST", f"{DRIVE_API}/files",
+            idempotent=False,
+            params={"fields": "id,webViewLink"},
+            json={"name": name, "parents": [parent_id], "mimeType": mime_type}
+        )
+        return response.json()
+
+    async def delete_file(self, file_id):
+        await self._request("drive", "drive", "DELETE", f"{DRIVE_API}/files/{file_id}")
+
+    async def update_file_content(self, file_id, content, mime_type):
+        """
+        覆蓋檔案內容
+
+        Returns:
+            dict: {"id", "webViewLink"}
+        """
+        response = await self._request(
+            "drive", "drive", "PATCH", f"{DRIVE_UPLOAD_API}/files/{file_id}",
+            params={"uploadType": "media", "fields": "id,webViewLink"},
+            content=content,
+            headers={"Content-Type": mime_type}
+        )
+        return response.json()
+
+    # ===== Sheets =====
+
+    async def get_values(self, spreadsheet_id, range_name):
+        response = await self._request(
+            "sheets", "sheets_read", "GET",
+            f"{SHEETS_API}/spreadsheets/{spreadsheet_id}/values/{range_name}"
+        )
+        return response.json().get("values", [])
+
+    async def update_values(self, spreadsheet_id, range_name, values):
+        await self._request(
+            "sheets", "sheets_write", "PUT",
+            f"{SHEETS_API}/spreadsheets/{spreadsheet_id}/values/{range_name}",
+            params={"valueInputOption": "USER_ENTERED"},
+            json={"values": values}
+        )
+
+    async def update_values_by_data_filter(self, spreadsheet_id, data):
+        """
+        依 DataFilter 寫入（values.batchUpdateByDataFilter）
+
+        Returns:
+            dict: API 回應（含 totalUpdatedRows）
+        """
+        response = await self._request(
+            "sheets", "sheets_write", "POST",
+            f"{SHEETS_API}/spreadsheets/{spreadsheet_id}/values:batchUpdateByDataFilter",
+            json={"valueInputOption": "USER_ENTERED", "data": data}
+        )
+        return response.json()
+
+    # ===== 其他 HTTP =====
+
+    async def post_json(self, url, payload, timeout=10):
+        """送出一般 JSON POST（GAS 回調使用，不經過 Google API 保護層）"""
+        return await self._client.post(url, json=payload, timeout=timeout)
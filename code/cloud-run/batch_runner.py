@@ -0,0 +1,298 @@
+"""
+街頭藝人申請系統 - 多位申請人批次處理
+
+/process-application 一次只處理一位申請人。代管多位街頭藝人時，必須在
+checkApplicationWindow 限定的短暫申請時段內把所有人的文件準備好。
+
+批次處理讀取申請記錄中所有「待處理」與卡在「文件處理中」的記錄，以可設定的平行度同時處理：
+- 每筆記錄處理前在 Sheets 取得處理權（與 /process-application 共用 main.claim_application），
+  不會與 /process-application、其他 instance 的批次處理重複處理；寫入完成或失敗狀態後釋放。
+  「文件處理中」的記錄只有持有者的心跳中斷（instance 當機或被終止）時才會被接手
+- 共用同一個程序的模板快取、輸出快取與 LibreOffice 轉換槽位
+- 狀態寫入本機儲存，由 SheetsReplicator 合併成批次寫回 Sheets
+- 每筆完成或失敗時與 /process-application 相同地回調 GAS（設定 GAS_CALLBACK_URL 時）
+- 結束時輸出處理量摘要
+
+命令列執行時不啟動伺服器的背景服務（檔案池等），只啟動 Sheets 狀態同步。
+
+使用方式：
+    python batch_runner.py --parallelism 4 [--limit 20] [--dry-run]
+或 POST /process-pending
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import config
+import resilience
+import record_partition
+from job_progress import JobProgress
+import memory_accounting
+
+logger = logging.getLogger(__name__)
+
+# 批次處理設定（可用 Cloud Run 環境變數覆寫）
+BATCH = {
+    "PARALLELISM": int(os.environ.get("BATCH_PARALLELISM", "4")),
+    "MAX_PARALLELISM": int(os.environ.get("BATCH_MAX_PARALLELISM", "16")),
+    # GAS Web App URL（與 GAS CONFIG.PHASE6.GAS_CALLBACK_URL 相同）
+    "GAS_CALLBACK_URL": os.environ.get("GAS_CALLBACK_URL", ""),
+}
+
+# 批次處理會接手的 Sheets 狀態（「文件處理中」需處理權逾時才會取得）
+PENDING_STATUSES = ("待處理", "文件處理中")
+
+WEEKDAYS = "一二三四五六日"
+
+
+def parse_dates(cell):
+    """
+    將 Sheets D 欄（formatDatesForSheet 的 YYYY/M/D 逗號分隔）轉回申請資料的日期格式
+
+    Returns:
+        list: [{"date": 4, "day": "六", "display": "10月4日週六"}, ...]
+    """
+    dates = []
+    for text in filter(None, (part.strip() for part in (cell or "").split(","))):
+        try:
+            year, month, day = (int(part) for part in text.split("/"))
+            weekday = WEEKDAYS[date(year, month, day).weekday()]
+            dates.append({"date": day, "day": weekday, "display": f"{month}月{day}日週{weekday}"})
+        except ValueError:
+            # 無法解析時保留原始文字（與 GAS 的降級處理相同）
+            dates.append({"display": text})
+    return dates
+
+
+def parse_record_row(row):
+    """
+    將申請記錄列轉為 (user_id, 申請資料)
+
+    Returns:
+        tuple | None: 欄位不足時回傳 None
+    """
+    if len(row) < 6 or not row[0] or not row[1]:
+        return None
+
+    year, _, month = row[2].partition("/")
+    return row[1], {
+        "timestamp": row[0],
+        "year": year,
+        "month": month,
+        "selected_dates": parse_dates(row[3]),
+        "video_source": row[4],
+        "video_url": row[5],
+    }
+
+
+def load_pending(doc_processor, store=None):
+    """
+    讀取所有「待處理」與「文件處理中」的申請記錄
+
+    Args:
+        doc_processor (DocumentProcessor): 提供 Sheets 客戶端
+        store (StateStore): 本機狀態儲存（本 instance 已處理完、尚未同步到 Sheets 的記錄會略過）
+
+    Returns:
+        list: [(user_id, app_data), ...]
+    """
+    spreadsheet_id = config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"]
+    jobs = []
+    for sheet_name in record_partition.recent_sheet_names():
+        values = record_partition.read_records(doc_processor.sheets_service, spreadsheet_id, sheet_name)
+        for row in values[1:]:
+            if len(row) <= 6 or row[6] not in PENDING_STATUSES:
+                continue
+            parsed = parse_record_row(row)
+            if parsed is None:
+                continue
+            user_id, app_data = parsed
+            if store is not None:
+                record = store.get_application(user_id, app_data["timestamp"])
+                if record is not None and record["status"] in record_partition.RECORD_PARTITION["ARCHIVE_STATUSES"]:
+                    continue
+            jobs.append(parsed)
+    return jobs
+
+
+def _percentile(values, ratio):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * ratio), len(ordered) - 1)]
+
+
+def run_pending(doc_processor, run_application, record_failure, claim, release, store=None, parallelism=None, limit=None,
+                dry_run=False, notify=None):
+    """
+    平行處理所有待處理的申請
+
+    Args:
+        doc_processor (DocumentProcessor): 文件處理器
+        run_application (callable): 處理單一申請 (user_id, app_data) -> dict
+        record_failure (callable): 記錄失敗狀態 (user_id, app_data, error_message)
+        claim (callable): 取得處理權 (user_id, timestamp) -> bool（Sheets 無法連線時應回傳 False）
+        release (callable): 釋放處理權 (user_id, timestamp)
+        store (StateStore): 本機狀態儲存（可選）
+        parallelism (int): 同時處理的申請數
+        limit (int): 最多處理筆數
+        dry_run (bool): 只列出待處理記錄（不取得處理權）
+        notify (callable): 回調 GAS (user_id, app_data, result, error)（可選）
+
+    Returns:
+        dict: 處理量摘要
+    """
+    parallelism = max(1, min(parallelism or BATCH["PARALLELISM"], BATCH["MAX_PARALLELISM"]))
+    jobs = load_pending(doc_processor, store)
+    if limit:
+        jobs = jobs[:limit]
+
+    logger.info(f"批次處理：{len(jobs)} 筆待處理，平行度 {parallelism}")
+    if dry_run:
+        return {
+            "total": len(jobs),
+            "dry_run": True,
+            "items": [{"user_id": user_id, "timestamp": app_data["timestamp"]} for user_id, app_data in jobs]
+        }
+
+    try:
+        record_partition.prune_claims(doc_processor.sheets_service, config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"])
+    except Exception as e:
+        logger.warning(f"清除過期處理權失敗: {str(e)}")
+
+    def process(user_id, app_data):
+        # 每個申請有獨立的重試預算（contextvar，在工作執行緒中設定）
+        resilience.start_request_budget()
+        started = time.monotonic()
+        item = {"user_id": user_id, "timestamp": app_data["timestamp"]}
+        if not claim(user_id, app_data["timestamp"]):
+            # 其他請求或 instance 處理中
+            item.update(status="略過", seconds=0.0)
+            return item
+        try:
+            result = run_application(user_id, app_data)
+            item.update(
+                status="完成",
+                pdf_url=result["pdf_url"],
+                skipped_stages=result["journal"]["skipped_stage_count"],
+                rss_delta_kb=result["memory"]["rss_delta_kb"]
+            )
+        except Exception as e:
+            logger.error(f"批次處理失敗 {item}: {str(e)}")
+            item.update(status="失敗", error=str(e))
+            result = None
+            try:
+                record_failure(user_id, app_data, f"[批次處理] {str(e)}")
+            except Exception as record_error:
+                logger.error(f"記錄失敗狀態失敗: {str(record_error)}")
+        # 完成或失敗狀態寫入後釋放
+        release(user_id, app_data["timestamp"])
+        if notify is not None:
+            notify(user_id, app_data, result, item.get("error"))
+        item["seconds"] = round(time.monotonic() - started, 2)
+        return item
+
+    # 排隊中的申請也能從進度端點看到
+    for user_id, app_data in jobs:
+        JobProgress(store, user_id, app_data["timestamp"])("queued", batch=True)
+
+    started = time.monotonic()
+    items = []
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="batch") as executor:
+        futures = [executor.submit(process, user_id, app_data) for user_id, app_data in jobs]
+        for future in as_completed(futures):
+            items.append(future.result())
+
+    elapsed = time.monotonic() - started
+    durations = [item["seconds"] for item in items if item["status"] != "略過"]
+    summary = {
+        "total": len(items),
+        "succeeded": sum(1 for item in items if item["status"] == "完成"),
+        "failed": sum(1 for item in items if item["status"] == "失敗"),
+        "claimed_elsewhere": sum(1 for item in items if item["status"] == "略過"),
+        "parallelism": parallelism,
+        "elapsed_seconds": round(elapsed, 2),
+        "per_minute": round(len(items) / elapsed * 60, 2) if elapsed > 0 else 0,
+        "job_seconds": {
+            "mean": round(sum(durations) / len(durations), 2),
+            "p50": _percentile(durations, 0.5),
+            "p95": _percentile(durations, 0.95),
+            "max": max(durations),
+        } if durations else {},
+        "skipped_stages": sum(item.get("skipped_stages", 0) for item in items),
+        "peak_rss_kb": memory_accounting.read_status_kb()["hwm_kb"],
+        "items": sorted(items, key=lambda item: item["timestamp"]),
+    }
+    logger.info(
+        f"批次處理完成：成功 {summary['succeeded']}、失敗 {summary['failed']}，"
+        f"耗時 {summary['elapsed_seconds']} 秒（每分鐘 {summary['per_minute']} 筆）"
+    )
+    return summary
+
+
+def print_summary(summary):
+    """輸出處理量摘要"""
+    if summary.get("dry_run"):
+        print(f"待處理 {summary['total']} 筆：")
+        for item in summary["items"]:
+            print(f"  {item['timestamp']}  {item['user_id']}")
+        return
+
+    print(f"處理 {summary['total']} 筆（平行度 {summary['parallelism']}）")
+    print(
+        f"  成功 {summary['succeeded']}、失敗 {summary['failed']}、其他程序處理中 {summary['claimed_elsewhere']}、"
+        f"沿用階段 {summary['skipped_stages']}"
+    )
+    print(f"  總耗時 {summary['elapsed_seconds']} 秒，每分鐘 {summary['per_minute']} 筆，RSS 高峰 {summary['peak_rss_kb']} KB")
+    if summary["job_seconds"]:
+        job_seconds = summary["job_seconds"]
+        print(f"  每筆耗時 平均 {job_seconds['mean']} / p50 {job_seconds['p50']} / p95 {job_seconds['p95']} / 最長 {job_seconds['max']} 秒")
+    for item in summary["items"]:
+        if item["status"] == "失敗":
+            print(f"  ❌ {item['timestamp']} {item['user_id']}: {item['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批次處理所有待處理的申請")
+    parser.add_argument("--parallelism", type=int, default=None, help="同時處理的申請數")
+    parser.add_argument("--limit", type=int, default=None, help="最多處理筆數")
+    parser.add_argument("--dry-run", action="store_true", help="只列出待處理記錄")
+    parser.add_argument("--json", action="store_true", help="以 JSON 輸出摘要")
+    args = parser.parse_args()
+
+    # 不啟動伺服器的背景服務（檔案池會預建再刪除 Drive 檔案），只啟動狀態同步
+    os.environ["STREET_ARTIST_CLI"] = "1"
+    import main as app_main
+    if app_main.sheets_replicator is not None and not args.dry_run:
+        app_main.sheets_replicator.start()
+
+    summary = run_pending(
+        app_main.doc_processor,
+        app_main.run_application,
+        lambda user_id, app_data, error: app_main.record_status(user_id, app_data, "", "失敗", error),
+        lambda user_id, timestamp: app_main.claim_application(user_id, timestamp, fail_open=False),
+        app_main.release_application,
+        store=app_main.application_store,
+        parallelism=args.parallelism,
+        limit=args.limit,
+        dry_run=args.dry_run,
+        notify=app_main.batch_notifier(BATCH["GAS_CALLBACK_URL"])
+    )
+
+    # 結束前把本機狀態寫回 Sheets
+    if app_main.sheets_replicator is not None:
+        app_main.sheets_replicator.stop()
+
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_summary(summary)
+    return 0 if summary.get("failed", 0) == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+街頭藝人申請系統 - LibreOffice 轉換槽位
+
+LibreOffice 同一個使用者設定檔（UserInstallation）同時只能有一個程序使用，
+多個申請同時轉換時會互相等待或直接失敗。
+轉換槽位為每個同時轉換配置獨立的設定檔目錄，並以槽位數限制同時執行的 soffice 數量
+（每個 soffice 約佔數百 MB 記憶體）。
+
+槽位編號在每個程序內都是 0..N-1，設定檔目錄因此再以程序 ID 區分（<PROFILE_DIR>/<pid>/<index>），
+GUNICORN_WORKERS > 1 時各 worker 不會共用同一個設定檔；程序結束時刪除自己的設定檔目錄。
+"""
+
+import os
+import time
+import queue
+import atexit
+import shutil
+import asyncio
+import logging
+from contextlib import contextmanager, asynccontextmanager
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 轉換槽位設定（可用 Cloud Run 環境變數覆寫）
+CONVERSION = {
+    "SLOTS": int(os.environ.get("CONVERSION_SLOTS", "2")),
+    "PROFILE_DIR": os.environ.get("CONVERSION_PROFILE_DIR", "/tmp/libreoffice-profiles"),
+}
+
+_slots = queue.Queue()
+for _index in range(CONVERSION["SLOTS"]):
+    _slots.put(_index)
+
+
+def _process_profile_dir():
+    return os.path.join(CONVERSION["PROFILE_DIR"], str(os.getpid()))
+
+
+def profile_arg(index):
+    """槽位對應的 LibreOffice 使用者設定檔參數（依目前程序 ID 區分，fork 後的 worker 各自使用）"""
+    return f"-env:UserInstallation=file://{os.path.join(_process_profile_dir(), str(index))}"
+
+
+@atexit.register
+def _remove_profiles():
+    # /tmp 佔用 Cloud Run 記憶體：結束的 worker 不留下設定檔
+    shutil.rmtree(_process_profile_dir(), ignore_errors=True)
+
+
+def _record_wait(started):
+    waited = time.monotonic() - started
+    if waited > 0.01:
+        metrics.increment("conversion.waits")
+        logger.info(f"等待轉換槽位 {waited:.2f} 秒")
+
+
+@contextmanager
+def slot():
+    """
+    取得轉換槽位（槽位用完時等待）
+
+    Yields:
+        str: LibreOffice 使用者設定檔參數
+    """
+    started = time.monotonic()
+    index = _slots.get()
+    _record_wait(started)
+    try:
+        yield profile_arg(index)
+    finally:
+        _slots.put(index)
+
+
+def _return_slot(waiter):
+    if not waiter.cancelled() and waiter.exception() is None:
+        _slots.put(waiter.result())
+
+
+@asynccontextmanager
+async def slot_async():
+    """slot 的 asyncio 版本（等待槽位時不阻塞事件迴圈）"""
+    started = time.monotonic()
+    try:
+        index = _slots.get_nowait()
+    except queue.Empty:
+        waiter = asyncio.ensure_future(asyncio.to_thread(_slots.get))
+        try:
+            index = await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # 等待中的請求被取消：執行緒之後取得的槽位要放回去，否則槽位會永久減少
+            waiter.add_done_callback(_return_slot)
+            raise
+    _record_wait(started)
+    try:
+        yield profile_arg(index)
+    finally:
+        _slots.put(index)
+
+
+def status():
+    """
+    轉換槽位使用狀況（/metrics gauge）
+
+    Returns:
+        dict: {"total", "available"}
+    """
+    return {"total": CONVERSION["SLOTS"], "available": _slots.qsize()}
@@ -0,0 +1,226 @@
+"""
+街頭藝人申請系統 - 服務帳戶憑證提供者
+
+原本 DocumentProcessor 與每個 WebsiteAutomationCloud 都各自讀取 Secret Manager
+並建立 Credentials，access token 也是在請求途中才被動刷新。
+
+此模組提供整個程序共用的憑證：
+1. 服務帳戶金鑰在請求途中只讀取一次，之後由背景執行緒依 TTL 重新讀取
+2. Drive、Sheets、GCS 共用同一個 SharedCredentials 物件；金鑰輪替時替換其內部的
+   服務帳戶憑證，已建立的客戶端不需重建就會改用新金鑰
+3. 背景執行緒在 token 到期前主動刷新，使用者請求不需等待 OAuth 交換
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+from google.oauth2 import service_account
+from google.auth import credentials as auth_credentials
+from google.auth.transport.requests import Request
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# 憑證設定（可用 Cloud Run 環境變數覆寫）
+CREDENTIALS = {
+    "SECRET_TTL_SECONDS": int(os.environ.get("CREDENTIALS_SECRET_TTL_SECONDS", "3600")),
+    # 需大於 google-auth 內建的 3 分 45 秒刷新門檻，否則請求途中仍會觸發同步刷新
+    "REFRESH_MARGIN_SECONDS": int(os.environ.get("CREDENTIALS_REFRESH_MARGIN_SECONDS", "600")),
+    "RETRY_INTERVAL_SECONDS": 30,
+}
+
+# 所有客戶端共用的權限範圍
+SCOPES = [
+    'https://www.googleapis.com/auth/drive',
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/devstorage.read_write',
+]
+
+
+class SharedCredentials(auth_credentials.Credentials, auth_credentials.Signing):
+    """
+    各客戶端持有的固定憑證物件
+
+    實際的服務帳戶憑證放在內部，金鑰輪替時以 replace 原地替換，
+    持有此物件的 Drive / Sheets / GCS 客戶端會直接改用新金鑰。
+    """
+
+    def __init__(self, inner):
+        super().__init__()
+        self._inner = inner
+        self._sync_token()
+
+    def _sync_token(self):
+        self.token = self._inner.token
+        self.expiry = self._inner.expiry
+
+    def replace(self, inner):
+        """
+        替換內部的服務帳戶憑證
+
+        Args:
+            inner (google.oauth2.service_account.Credentials): 新金鑰建立且已刷新的憑證
+        """
+        self._inner = inner
+        self._sync_token()
+
+    def refresh(self, request):
+        self._inner.refresh(request)
+        self._sync_token()
+
+    @property
+    def project_id(self):
+        return self._inner.project_id
+
+    @property
+    def service_account_email(self):
+        return self._inner.service_account_email
+
+    def sign_bytes(self, message):
+        return self._inner.sign_bytes(message)
+
+    @property
+    def signer_email(self):
+        return self._inner.signer_email
+
+    @property
+    def signer(self):
+        return self._inner.signer
+
+
+class CredentialProvider:
+    """程序共用的服務帳戶憑證，含背景 token 刷新"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._service_account_info = None
+        self._secret_loaded_at = 0
+        self._credentials = None
+        self._refresher = None
+        self._refresher_pid = None
+        self._wakeup = threading.Event()
+
+    def get_service_account_info(self):
+        """
+        取得服務帳戶金鑰（第一次呼叫時讀取 Secret Manager，之後由背景執行緒更新）
+
+        Returns:
+            dict: 服務帳戶金鑰內容
+        """
+        with self._lock:
+            if self._service_account_info is None:
+                self._service_account_info = config.get_service_account_info()
+                self._secret_loaded_at = time.monotonic()
+            return self._service_account_info
+
+    @staticmethod
+    def _build(info):
+        return service_account.Credentials.from_service_account_info(info, scopes=SCOPES)
+
+    def get_credentials(self):
+        """
+        取得共用的憑證物件（第一次呼叫時建立並刷新 token）
+
+        Returns:
+            SharedCredentials: 服務帳戶憑證
+        """
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = SharedCredentials(self._build(self.get_service_account_info()))
+                self._refresh_locked()
+                logger.info("服務帳戶憑證已建立")
+            self._ensure_refresher()
+            return self._credentials
+
+    def _reload_secret(self):
+        """
+        重新讀取服務帳戶金鑰，金鑰輪替時原地替換共用憑證（只在背景執行緒呼叫）
+        """
+        # Secret Manager 讀取與新憑證刷新都在鎖外進行，不阻擋請求執行緒
+        info = config.get_service_account_info()
+        rotated = info.get("private_key_id") != (self._service_account_info or {}).get("private_key_id")
+        inner = None
+        if rotated:
+            inner = self._build(info)
+            inner.refresh(Request())
+
+        with self._lock:
+            self._service_account_info = info
+            self._secret_loaded_at = time.monotonic()
+            if inner is not None and self._credentials is not None:
+                self._credentials.replace(inner)
+                logger.info("服務帳戶金鑰已更新，共用憑證已改用新金鑰")
+
+    def cached_credentials(self):
+        """
+        取得已建立的憑證（不讀取 Secret Manager 也不刷新，供 asyncio 程式碼使用）
+
+        Returns:
+            Credentials | None: 尚未建立時回傳 None
+        """
+        return self._credentials
+
+    def refresh(self):
+        """立即刷新 access token"""
+        with self._lock:
+            if self._credentials is not None:
+                self._refresh_locked()
+
+    def _refresh_locked(self):
+        self._credentials.refresh(Request())
+        logger.info(f"Access token 已刷新，到期時間: {self._credentials.expiry}")
+
+    def seconds_until_expiry(self):
+        """
+        距離 access token 到期的秒數
+
+        Returns:
+            float | None: 秒數，尚未建立憑證時回傳 None
+        """
+        credentials = self._credentials
+        if credentials is None or credentials.expiry is None:
+            return None
+        # google-auth 的 expiry 為 naive UTC 時間
+        return (credentials.expiry - datetime.utcnow()).total_seconds()
+
+    def _ensure_refresher(self):
+        """啟動背景刷新執行緒（fork 後的子程序需重新啟動）"""
+        if self._refresher and self._refresher.is_alive() and self._refresher_pid == os.getpid():
+            return
+        self._refresher_pid = os.getpid()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="credential-refresher", daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        """在 token 到期前 REFRESH_MARGIN_SECONDS 秒主動刷新，並依 SECRET_TTL_SECONDS 檢查金鑰輪替"""
+        while True:
+            remaining = self.seconds_until_expiry()
+            if remaining is None:
+                refresh_wait = CREDENTIALS["RETRY_INTERVAL_SECONDS"]
+            else:
+                refresh_wait = max(remaining - CREDENTIALS["REFRESH_MARGIN_SECONDS"], 0)
+            secret_wait = max(CREDENTIALS["SECRET_TTL_SECONDS"] - (time.monotonic() - self._secret_loaded_at), 0)
+
+            wait_seconds = min(refresh_wait, secret_wait)
+            if wait_seconds > 0:
+                self._wakeup.wait(wait_seconds)
+                self._wakeup.clear()
+                continue
+
+            try:
+                if secret_wait <= 0:
+                    self._reload_secret()
+                if refresh_wait <= 0:
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"背景刷新 access token 失敗: {str(e)}")
+                self._wakeup.wait(CREDENTIALS["RETRY_INTERVAL_SECONDS"])
+                self._wakeup.clear()
+
+
+# 全域憑證提供者
+credential_provider = CredentialProvider()
@@ -0,0 +1,278 @@
+"""
+街頭藝人申請系統 - Drive 預建檔案池
+
+方案 B 中 GAS 的 copyWordTemplate 每次申請都要 makeCopy 兩次（Word + PDF），
+使用者必須等這兩個慢速 Drive 操作完成後才會呼叫 Cloud Run。
+
+檔案池在背景預先於 GENERATED_FOLDER_ID 建立「Word 模板副本 + 空白 PDF」檔案對，
+申請時只需領取一組並改名（一次批次請求），即可取代兩次複製。
+
+待領取的檔案只存在各 worker 的記憶體中，程序被強制結束（OOM、SIGKILL、instance 關閉）時
+不會執行 drain，因此：
+- 每組檔案最多保留 MAX_AGE_SECONDS，逾時由擁有的 worker 刪除並重建（不會領取過期檔案）
+- 補充執行緒定期刪除資料夾中建立超過 MAX_AGE_SECONDS + SWEEP_GRACE_SECONDS 的待領取檔案，
+  此時擁有者必定已不存在，其他 worker 的檔案不受影響
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+
+from config import config
+import resilience
+import preload
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 檔案池設定（可用 Cloud Run 環境變數覆寫）
+FILE_POOL = {
+    "ENABLED": os.environ.get("FILE_POOL_ENABLED", "true").lower() == "true",
+    "TARGET_SIZE": int(os.environ.get("FILE_POOL_TARGET_SIZE", "3")),
+    "REPLENISH_INTERVAL_SECONDS": int(os.environ.get("FILE_POOL_REPLENISH_INTERVAL_SECONDS", "300")),
+    "MAX_AGE_SECONDS": int(os.environ.get("FILE_POOL_MAX_AGE_SECONDS", "86400")),
+    "SWEEP_INTERVAL_SECONDS": int(os.environ.get("FILE_POOL_SWEEP_INTERVAL_SECONDS", "3600")),
+    "SWEEP_GRACE_SECONDS": int(os.environ.get("FILE_POOL_SWEEP_GRACE_SECONDS", "3600")),
+    "PLACEHOLDER_PREFIX": "_檔案池_待領取_",
+}
+
+PDF_MIME_TYPE = 'application/pdf'
+
+
+class FilePool:
+    """預建 Word/PDF 檔案對的檔案池"""
+
+    def __init__(self, credentials, target_size=None):
+        """
+        Args:
+            credentials: Google 服務帳戶憑證
+            target_size (int): 檔案池目標數量
+        """
+        self.credentials = credentials
+        # 補充執行緒專用的 Drive 客戶端（httplib2 連線不可跨執行緒共用）
+        self.drive_service = preload.build_service('drive', 'v3', credentials)
+        self.target_size = target_size if target_size is not None else FILE_POOL["TARGET_SIZE"]
+        self._pairs = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._last_sweep = None
+
+    def start(self):
+        """啟動背景補充執行緒"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._replenish_loop, name="file-pool-replenisher", daemon=True)
+        self._thread.start()
+        logger.info(f"檔案池補充執行緒已啟動（目標 {self.target_size} 組）")
+
+    def stop(self):
+        """停止背景補充執行緒"""
+        self._stopped.set()
+        self._wakeup.set()
+
+    def size(self):
+        """目前可領取的檔案對數量"""
+        with self._lock:
+            return len(self._pairs)
+
+    def _replenish_loop(self):
+        """背景補充：清除過期與孤兒檔案後，數量不足時建立新檔案對，否則等待領取通知或定期檢查"""
+        while not self._stopped.is_set():
+            try:
+                self._expire_pairs()
+                if self._last_sweep is None or time.monotonic() - self._last_sweep >= FILE_POOL["SWEEP_INTERVAL_SECONDS"]:
+                    self._last_sweep = time.monotonic()
+                    self._sweep_orphans()
+            except Exception as e:
+                logger.error(f"檔案池清理失敗: {str(e)}")
+
+            try:
+                while self.size() < self.target_size and not self._stopped.is_set():
+                    pair = self._create_pair()
+                    with self._lock:
+                        self._pairs.append(pair)
+                    logger.info(f"檔案池新增一組檔案，目前 {self.size()}/{self.target_size}")
+            except Exception as e:
+                logger.error(f"檔案池補充失敗: {str(e)}")
+
+            self._wakeup.wait(FILE_POOL["REPLENISH_INTERVAL_SECONDS"])
+            self._wakeup.clear()
+
+    @staticmethod
+    def _is_expired(pair):
+        return time.time() - pair["created_at"] >= FILE_POOL["MAX_AGE_SECONDS"]
+
+    def _delete_pair(self, pair, http=None):
+        """
+        刪除一組檔案對（個別失敗只記錄，交給孤兒清理處理）
+
+        Args:
+            pair (dict): 檔案對
+            http: 請求執行緒使用的獨立連線（補充執行緒不需指定）
+        """
+        kwargs = {"http": http} if http is not None else {}
+        for file_id in (pair["word_file_id"], pair["pdf_file_id"]):
+            try:
+                resilience.execute(self.drive_service.files().delete(fileId=file_id), "drive", **kwargs)
+            except Exception as e:
+                logger.warning(f"刪除檔案池檔案失敗 {file_id}: {str(e)}")
+
+    def _expire_pairs(self):
+        """刪除本 worker 保留超過 MAX_AGE_SECONDS 的檔案對（之後由補充迴圈重建）"""
+        with self._lock:
+            expired = [pair for pair in self._pairs if self._is_expired(pair)]
+            for pair in expired:
+                self._pairs.remove(pair)
+
+        for pair in expired:
+            self._delete_pair(pair)
+        if expired:
+            logger.info(f"檔案池已輪替 {len(expired)} 組過期檔案")
+
+    def _sweep_orphans(self):
+        """
+        刪除已結束程序留下的待領取檔案
+
+        只處理建立超過 MAX_AGE_SECONDS + SWEEP_GRACE_SECONDS 的檔案：
+        存活的 worker 在 MAX_AGE_SECONDS 前就會自行輪替，不會刪到仍在使用的檔案。
+        """
+        folder_id = config.GOOGLE_DRIVE["GENERATED_FOLDER_ID"]
+        cutoff = time.time() - FILE_POOL["MAX_AGE_SECONDS"] - FILE_POOL["SWEEP_GRACE_SECONDS"]
+        cutoff_str = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(cutoff))
+        query = (
+            f"'{folder_id}' in parents and trashed = false"
+            f" and name contains '{FILE_POOL['PLACEHOLDER_PREFIX']}'"
+            f" and createdTime < '{cutoff_str}'"
+        )
+
+        swept = 0
+        page_token = None
+        while True:
+            response = resilience.execute(self.drive_service.files().list(
+                q=query,
+                fields='nextPageToken, files(id, name)',
+                pageToken=page_token
+            ), "drive")
+            for file in response.get('files', []):
+                # name contains 為前綴比對（以詞為單位），再次確認前綴
+                if not file.get('name', '').startswith(FILE_POOL['PLACEHOLDER_PREFIX']):
+                    continue
+                try:
+                    resilience.execute(self.drive_service.files().delete(fileId=file['id']), "drive")
+                    swept += 1
+                except Exception as e:
+                    logger.warning(f"刪除孤兒檔案失敗 {file['id']}: {str(e)}")
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+
+        if swept:
+            metrics.increment("file_pool.orphans_swept", swept)
+            logger.info(f"檔案池已清除 {swept} 個孤兒檔案")
+
+    def _create_pair(self):
+        """
+        建立一組檔案對（一次批次請求）：Word 模板副本 + 空白 PDF
+
+        Returns:
+            dict: {"word_file_id": str, "pdf_file_id": str, "created_at": float}
+        """
+        folder_id = config.GOOGLE_DRIVE["GENERATED_FOLDER_ID"]
+        template_file_id = config.GOOGLE_DRIVE["TEMPLATE_WORD_FILE_ID"]
+        placeholder_name = f"{FILE_POOL['PLACEHOLDER_PREFIX']}{uuid.uuid4().hex[:12]}"
+
+        # 複製與建立都不是冪等操作，只重試配額錯誤（逾時後的殘留檔案由孤兒清理刪除）
+        results, errors = resilience.execute_batch(self.drive_service, {
+            'word': self.drive_service.files().copy(
+                fileId=template_file_id,
+                body={'name': placeholder_name, 'parents': [folder_id]},
+                fields='id'
+            ),
+            'pdf': self.drive_service.files().create(
+                body={'name': placeholder_name, 'parents': [folder_id], 'mimeType': PDF_MIME_TYPE},
+                fields='id'
+            ),
+        }, "drive", idempotent=False)
+
+        if errors:
+            # 部分成功時刪除已建立的檔案，避免殘留孤兒檔案
+            for response in results.values():
+                try:
+                    resilience.execute(self.drive_service.files().delete(fileId=response['id']), "drive")
+                except Exception as cleanup_error:
+                    logger.warning(f"清除檔案池殘留檔案失敗 {response['id']}: {str(cleanup_error)}")
+            raise Exception(f"建立檔案對失敗: {'; '.join(f'{k}: {v}' for k, v in errors.items())}")
+
+        return {"word_file_id": results['word']['id'], "pdf_file_id": results['pdf']['id'], "created_at": time.time()}
+
+    def claim(self, word_file_name, pdf_file_name):
+        """
+        領取一組檔案對並改名（一次批次請求）
+
+        Args:
+            word_file_name (str): Word 檔案名稱（不含副檔名，與 GAS 命名一致）
+            pdf_file_name (str): PDF 檔案名稱（不含副檔名）
+
+        Returns:
+            dict | None: {"copiedFileId", "pdfFileId", "wordUrl", "pdfUrl"}，檔案池為空時回傳 None
+        """
+        with self._lock:
+            # 過期的檔案對可能即將被孤兒清理刪除，留給補充執行緒輪替
+            pair = next((p for p in self._pairs if not self._is_expired(p)), None)
+            if pair is not None:
+                self._pairs.remove(pair)
+
+        # 通知補充執行緒
+        self._wakeup.set()
+
+        if pair is None:
+            logger.warning("檔案池已空，無法領取檔案")
+            return None
+
+        # 領取在請求執行緒執行，使用獨立連線避免與補充執行緒互相干擾
+        http = AuthorizedHttp(self.credentials, http=httplib2.Http())
+        try:
+            responses, errors = resilience.execute_batch(self.drive_service, {
+                'word': self.drive_service.files().update(
+                    fileId=pair["word_file_id"],
+                    body={'name': word_file_name},
+                    fields='id,webViewLink'
+                ),
+                'pdf': self.drive_service.files().update(
+                    fileId=pair["pdf_file_id"],
+                    body={'name': pdf_file_name},
+                    fields='id,webViewLink'
+                ),
+            }, "drive", http=http)
+            if errors:
+                raise Exception(f"檔案池檔案改名失敗: {'; '.join(f'{k}: {v}' for k, v in errors.items())}")
+        except Exception:
+            # 改名失敗的檔案對已離開檔案池，直接刪除避免殘留在 GENERATED_FOLDER_ID
+            self._delete_pair(pair, http=http)
+            raise
+
+        logger.info(f"已從檔案池領取檔案: Word {pair['word_file_id']}, PDF {pair['pdf_file_id']}")
+        return {
+            "copiedFileId": pair["word_file_id"],
+            "pdfFileId": pair["pdf_file_id"],
+            "wordUrl": responses['word'].get('webViewLink'),
+            "pdfUrl": responses['pdf'].get('webViewLink'),
+        }
+
+    def drain(self):
+        """刪除所有尚未領取的檔案（服務關閉時使用）"""
+        self.stop()
+        with self._lock:
+            pairs = list(self._pairs)
+            self._pairs.clear()
+
+        for pair in pairs:
+            self._delete_pair(pair)
@@ -0,0 +1,36 @@
+"""
+街頭藝人申請系統 - gunicorn 設定
+
+GUNICORN_WORKERS > 1 時建議開啟 GUNICORN_PRELOAD：master 預載模板與 discovery 文件後再 fork，
+worker 以 copy-on-write 共用，不需各自下載與初始化。
+"""
+
+import os
+
+bind = f":{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("GUNICORN_WORKERS", "1"))
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+timeout = 0
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true"
+
+if preload_app:
+    # 必須在 master 載入 main.py 之前設定，main.py 據此延後背景執行緒到 fork 之後
+    os.environ["STREET_ARTIST_PRELOAD"] = "1"
+
+
+def post_fork(server, worker):
+    """fork 後在 worker 中重建連線並啟動背景服務（執行緒與 socket 不能跨 fork 共用）"""
+    if not preload_app:
+        return
+
+    import main
+    from preload import read_memory_usage
+
+    main.doc_processor.reset_clients()
+    main.start_background_services()
+
+    usage = read_memory_usage()
+    server.log.info(
+        f"worker {worker.pid} 啟動: RSS {usage['rss_kb']} KB, "
+        f"共享 {usage['shared_kb']} KB, 私有 {usage['private_kb']} KB"
+    )
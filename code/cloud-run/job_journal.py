@@ -0,0 +1,251 @@
+"""
+街頭藝人申請系統 - 處理階段檢查點
+
+一個申請依序經過：建立輸出檔案 → 填寫與轉換 → 上傳 Word → 上傳 PDF。
+原本任何一步失敗，重試時都要從頭再做一次（甚至重新建立 Drive 檔案）。
+
+每個階段完成時將產出寫入本機狀態儲存的 job_stages（以 user_id + timestamp 為鍵）：
+- provision：Word/PDF 檔案 ID 與檔名
+- render：輸出快取鍵與 Word/PDF 的 SHA-256
+- upload_word / upload_pdf：檔案連結
+
+同一個申請再次送達（GAS 重送或手動重試）時，已完成的階段直接沿用產出，從第一個未完成的階段繼續。
+
+本機狀態儲存在 instance 的 /tmp，只有同一個 instance 的重試看得到。
+設定 JOB_JOURNAL_BUCKET（預設沿用 OUTPUT_CACHE_BUCKET）時，已完成的階段另外寫入 GCS
+（job-journal/<sha256(user_id|timestamp)>.json），換到其他 instance 或縮減到零後的重試也能沿用
+provision 建立的檔案與已上傳的結果。未設定 bucket 時跨 instance 的重試只有 render 能經由
+GCS 輸出快取省下，其餘階段會重新執行（provision 會建立新的輸出檔案）。
+GCS 物件不會自動刪除，請在 bucket 設定生命週期規則（例如 30 天後刪除）。
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+
+from metrics import metrics
+from memory_accounting import MemoryProbe
+
+logger = logging.getLogger(__name__)
+
+STAGES = ["provision", "render", "upload_word", "upload_pdf"]
+
+# 共用檢查點設定（可用 Cloud Run 環境變數覆寫）
+JOB_JOURNAL = {
+    "BUCKET": os.environ.get("JOB_JOURNAL_BUCKET", os.environ.get("OUTPUT_CACHE_BUCKET", "")),
+    "PREFIX": os.environ.get("JOB_JOURNAL_PREFIX", "job-journal"),
+}
+
+
+class SharedJournal:
+    """跨 instance 共用的已完成階段（GCS；未設定 bucket 時停用）"""
+
+    def __init__(self, credentials=None):
+        """
+        Args:
+            credentials: 服務帳戶憑證（設定 JOB_JOURNAL_BUCKET 時使用）
+        """
+        self.credentials = credentials
+        self._bucket = None
+
+    @property
+    def enabled(self):
+        return bool(JOB_JOURNAL["BUCKET"])
+
+    def _blob(self, user_id, timestamp):
+        if self._bucket is None:
+            from google.cloud import storage
+            client = storage.Client(credentials=self.credentials, project=self.credentials.project_id)
+            self._bucket = client.bucket(JOB_JOURNAL["BUCKET"])
+        name = hashlib.sha256(f"{user_id}|{timestamp}".encode("utf-8")).hexdigest()
+        return self._bucket.blob(f"{JOB_JOURNAL['PREFIX']}/{name}.json")
+
+    def get(self, user_id, timestamp):
+        """
+        讀取已完成的階段（讀取失敗視為沒有記錄）
+
+        Returns:
+            dict: {stage: {"status", "detail"}}
+        """
+        if not self.enabled:
+            return {}
+        try:
+            blob = self._blob(user_id, timestamp)
+            if not blob.exists():
+                return {}
+            return json.loads(blob.download_as_bytes())
+        except Exception as e:
+            logger.warning(f"讀取共用檢查點失敗: {str(e)}")
+            metrics.increment("journal.shared_errors")
+            return {}
+
+    def put(self, user_id, timestamp, stages):
+        """
+        寫入已完成的階段（寫入失敗不影響主流程）
+
+        Args:
+            stages (dict): {stage: {"status", "detail"}}
+        """
+        if not self.enabled:
+            return
+        try:
+            self._blob(user_id, timestamp).upload_from_string(
+                json.dumps(stages, ensure_ascii=False), content_type="application/json"
+            )
+        except Exception as e:
+            logger.warning(f"寫入共用檢查點失敗: {str(e)}")
+            metrics.increment("journal.shared_errors")
+
+
+class JobJournal:
+    """單一申請的階段檢查點（未開啟本機狀態儲存也未設定共用檢查點時每次都完整執行）"""
+
+    def __init__(self, store, user_id, timestamp, shared=None):
+        """
+        Args:
+            store (StateStore | None): 本機狀態儲存
+            user_id (str): 用戶 ID
+            timestamp (str): 申請時間戳記
+            shared (SharedJournal): 跨 instance 共用的檢查點（可選，需先呼叫 load_shared）
+        """
+        self.store = store
+        self.shared = shared if shared is not None and shared.enabled and timestamp else None
+        self.user_id = user_id
+        self.timestamp = timestamp
+        self.skipped = []
+        self.timings = {}
+        self.memory = {}
+        self._probes = {}
+        self._stages = store.get_stages(user_id, timestamp) if store is not None and timestamp else {}
+
+    def load_shared(self):
+        """
+        補上其他 instance 已完成的階段（本機已全部完成時不讀取 GCS）
+
+        Returns:
+            int: 補上的階段數
+        """
+        if self.shared is None or all(self.is_done(stage) for stage in STAGES):
+            return 0
+        restored = 0
+        for stage, entry in self.shared.get(self.user_id, self.timestamp).items():
+            if entry.get("status") == "done" and not self.is_done(stage):
+                self._record(stage, "done", entry.get("detail"))
+                restored += 1
+        if restored:
+            metrics.increment("journal.shared_restores", restored)
+            logger.info(f"從共用檢查點沿用 {restored} 個階段")
+        return restored
+
+    def _persist_shared(self):
+        if self.shared is not None:
+            done = {stage: entry for stage, entry in self._stages.items() if entry.get("status") == "done"}
+            self.shared.put(self.user_id, self.timestamp, done)
+
+    def is_done(self, stage):
+        """階段是否已完成"""
+        return self._stages.get(stage, {}).get("status") == "done"
+
+    def detail(self, stage):
+        """已完成階段的產出"""
+        return self._stages.get(stage, {}).get("detail", {})
+
+    def _record(self, stage, status, detail=None, started_at=None, finished_at=None):
+        self._stages[stage] = {"status": status, "detail": detail or {}}
+        if self.store is not None and self.timestamp:
+            self.store.record_stage(self.user_id, self.timestamp, stage, status, detail, started_at, finished_at)
+
+    def _skip(self, stage):
+        self.skipped.append(stage)
+        self.timings[stage] = 0.0
+        metrics.increment("journal.stages_skipped")
+        logger.info(f"沿用已完成的階段 {stage}: {self.detail(stage)}")
+        return self.detail(stage)
+
+    def _begin(self, stage):
+        started_at = time.time()
+        self._probes[stage] = MemoryProbe()
+        self._record(stage, "running", started_at=started_at)
+        return started_at
+
+    def _finish(self, stage, started_at, detail):
+        finished_at = time.time()
+        self.timings[stage] = round(finished_at - started_at, 3)
+        self.memory[stage] = self._probes.pop(stage).delta()
+        self._record(stage, "done", detail, started_at, finished_at)
+        return detail
+
+    def annotate(self, stage, **values):
+        """補充本次執行階段的記憶體資訊（例如臨時目錄大小；略過的階段不記錄）"""
+        if stage in self.memory:
+            self.memory[stage].update(values)
+
+    def _fail(self, stage, started_at, error):
+        self._record(stage, "failed", {"error": str(error)}, started_at, time.time())
+
+    def _restorable(self, stage, restore):
+        if not self.is_done(stage):
+            return False
+        if restore is None or restore(self.detail(stage)):
+            return True
+        logger.info(f"階段 {stage} 的產出已不存在，重新執行")
+        return False
+
+    def run(self, stage, func, restore=None):
+        """
+        執行階段（已完成且產出可還原時略過）
+
+        Args:
+            stage (str): 階段名稱
+            func (callable): 執行階段，回傳產出（dict）
+            restore (callable): 以已記錄的產出還原本次需要的檔案，回傳 False 表示需重新執行（可選）
+
+        Returns:
+            dict: 階段產出
+        """
+        if self._restorable(stage, restore):
+            return self._skip(stage)
+
+        started_at = self._begin(stage)
+        try:
+            detail = func()
+        except Exception as e:
+            self._fail(stage, started_at, e)
+            raise
+        detail = self._finish(stage, started_at, detail)
+        self._persist_shared()
+        return detail
+
+    async def run_async(self, stage, coro_factory, restore=None):
+        """run 的 asyncio 版本（coro_factory 與 restore 皆回傳 coroutine）"""
+        if self.is_done(stage):
+            if restore is None or await restore(self.detail(stage)):
+                return self._skip(stage)
+            logger.info(f"階段 {stage} 的產出已不存在，重新執行")
+
+        started_at = self._begin(stage)
+        try:
+            detail = await coro_factory()
+        except Exception as e:
+            self._fail(stage, started_at, e)
+            raise
+        detail = self._finish(stage, started_at, detail)
+        await asyncio.to_thread(self._persist_shared)
+        return detail
+
+    def summary(self):
+        """
+        本次執行摘要（放入回應）
+
+        Returns:
+            dict: {"skipped_stages", "skipped_stage_count", "stage_seconds", "stage_memory"}
+        """
+        return {
+            "skipped_stages": self.skipped,
+            "skipped_stage_count": len(self.skipped),
+            "stage_seconds": self.timings,
+            "stage_memory": self.memory,
+        }
@@ -0,0 +1,68 @@
+"""
+街頭藝人申請系統 - 申請處理進度事件
+
+每個申請（user_id + timestamp）處理時依序發出進度事件：
+queued → downloading → filling → converting → uploading → recording → done / failed
+
+事件寫入本機狀態儲存的 job_events，同一 instance 的所有 worker 都讀得到：
+- GET /jobs/<user_id>/<timestamp>/events?after=<seq>：立即回傳 JSON Lines（輪詢用，不佔住執行緒）
+- ASGI 模式同一路徑以 Accept: text/event-stream 取得 SSE，事件迴圈中以非同步等待輪詢，
+  不為每個監聽者配置執行緒
+"""
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+STAGES = ["queued", "downloading", "filling", "converting", "uploading", "recording"]
+TERMINAL_STAGES = ["done", "failed"]
+
+
+class JobProgress:
+    """單一申請的進度事件發送器（未開啟本機狀態儲存時不記錄）"""
+
+    def __init__(self, store, user_id, timestamp):
+        """
+        Args:
+            store (StateStore | None): 本機狀態儲存
+            user_id (str): 用戶 ID
+            timestamp (str): 申請時間戳記
+        """
+        self.store = store
+        self.user_id = user_id
+        self.timestamp = timestamp
+
+    def __call__(self, stage, **detail):
+        """
+        發出進度事件（寫入失敗不影響申請處理）
+
+        Args:
+            stage (str): 進度階段
+            **detail: 附加資訊
+        """
+        if self.store is None or not self.timestamp:
+            return
+        try:
+            self.store.append_event(self.user_id, self.timestamp, stage, detail)
+        except Exception as e:
+            logger.warning(f"寫入進度事件失敗 {stage}: {str(e)}")
+
+
+def no_progress(stage, **detail):
+    """不記錄進度（DocumentProcessor 方法的預設值）"""
+
+
+def is_finished(events):
+    """事件中是否已有結束事件"""
+    return any(event["stage"] in TERMINAL_STAGES for event in events)
+
+
+def to_json_lines(events):
+    """事件轉為 JSON Lines"""
+    return "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+
+
+def to_sse(event):
+    """事件轉為 Server-Sent Events 格式（id 為序號，斷線重連時以 Last-Event-ID 續傳）"""
+    return f"id: {event['seq']}\nevent: {event['stage']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
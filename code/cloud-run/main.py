@@ -12,19 +12,35 @@ Phase 5: 文件處理系統
 
 import os
 import json
+import atexit
+import hashlib
 import logging
 import tempfile
+import threading
 import subprocess
 from datetime import datetime
 import pytz
-from flask import Flask, request, jsonify
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from flask import Flask, Response, request, jsonify
 from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 from docx import Document
 import io
 
 from config import config
+import resilience
+from metrics import metrics
+from credential_provider import credential_provider
+from file_pool import FilePool, FILE_POOL
+import preload
+import conversion_pool
+import memory_accounting
+import output_cache
+import pregenerate
+import warmup
+import record_partition
+import batch_runner
+from state_store import StateStore, SheetsReplicator, STATE_STORE, TERMINAL_STATUSES
+from job_journal import JobJournal, SharedJournal
+from job_progress import JobProgress, no_progress, to_json_lines
 
 # 設定日誌
 logging.basicConfig(
@@ -42,19 +58,18 @@ class DocumentProcessor:
     def __init__(self):
         """初始化 Google API 客戶端"""
         try:
-            # 取得服務帳戶憑證
-            service_account_info = config.get_service_account_info()
-            credentials = service_account.Credentials.from_service_account_info(
-                service_account_info,
-                scopes=[
-                    'https://www.googleapis.com/auth/drive',
-                    'https://www.googleapis.com/auth/spreadsheets'
-                ]
-            )
+            # 取得程序共用的服務帳戶憑證（背景自動刷新 token）
+            credentials = credential_provider.get_credentials()
+            
+            self.credentials = credentials
+            
+            # Word 模板內容快取（模板很少變動，避免每次申請都從 Drive 下載）
+            self._template_bytes = None
+            self._template_fingerprint = None
+            self._template_lock = threading.Lock()
             
             # 初始化 API 客戶端
-            self.drive_service = build('drive', 'v3', credentials=credentials)
-            self.sheets_service = build('sheets', 'v4', credentials=credentials)
+            self.reset_clients()
             
             logger.info("Google API 客戶端初始化成功")
             
@@ -62,41 +77,211 @@ class DocumentProcessor:
             logger.error(f"初始化 Google API 客戶端失敗: {str(e)}")
             raise
     
+    def reset_clients(self):
+        """捨棄已建立的 Drive / Sheets 客戶端（fork 後呼叫，避免與其他程序共用 HTTP 連線）"""
+        self._clients = threading.local()
+    
+    @property
+    def drive_service(self):
+        """本執行緒的 Drive 客戶端（httplib2 連線不能跨執行緒共用，每個執行緒各自建立）"""
+        service = getattr(self._clients, "drive", None)
+        if service is None:
+            service = self._clients.drive = preload.build_service('drive', 'v3', self.credentials)
+        return service
+    
+    @property
+    def sheets_service(self):
+        """本執行緒的 Sheets 客戶端"""
+        service = getattr(self._clients, "sheets", None)
+        if service is None:
+            service = self._clients.sheets = self.build_sheets_service()
+        return service
+    
+    def build_sheets_service(self):
+        """建立新的 Sheets 客戶端（背景執行緒各自使用，httplib2 連線不能跨執行緒共用）"""
+        return preload.build_service('sheets', 'v4', self.credentials)
+    
+    def get_template_bytes(self):
+        """
+        取得 Word 模板內容（第一次從 Google Drive 下載，之後使用記憶體快取）
+        
+        Returns:
+            bytes | memoryview: Word 模板內容（preload 模式為共享記憶體的 memoryview，可直接寫檔或計算雜湊）
+        """
+        # gunicorn preload 模式：master 已將模板放入共享記憶體
+        shared_template = preload.get_shared_blob("word_template")
+        if shared_template is not None:
+            return shared_template
+        
+        with self._template_lock:
+            if self._template_bytes is None:
+                template_file_id = config.GOOGLE_DRIVE["TEMPLATE_WORD_FILE_ID"]
+                logger.info(f"下載 Word 模板到快取: {template_file_id}")
+                
+                request = self.drive_service.files().get_media(fileId=template_file_id)
+                buffer = io.BytesIO()
+                downloader = MediaIoBaseDownload(buffer, request)
+                done = False
+                while done is False:
+                    status, done = resilience.call(downloader.next_chunk, "drive")
+                
+                self._template_bytes = buffer.getvalue()
+                logger.info(f"Word 模板已快取: {len(self._template_bytes)} bytes")
+            
+            return self._template_bytes
+    
+    def get_template_fingerprint(self):
+        """
+        Word 模板內容的 SHA-256（輸出快取鍵的一部分，模板更新後舊快取自動失效）
+        
+        Returns:
+            str: 十六進位雜湊值
+        """
+        if self._template_fingerprint is None:
+            self._template_fingerprint = hashlib.sha256(self.get_template_bytes()).hexdigest()
+        return self._template_fingerprint
+    
+    def template_is_cached(self):
+        """
+        Word 模板是否已下載並計算好雜湊（預熱狀態使用，不觸發下載）
+        
+        Returns:
+            bool: 已快取時為 True
+        """
+        return self._template_fingerprint is not None
+    
     def download_template(self, temp_dir):
         """
-        從 Google Drive 下載 Word 模板
+        將 Word 模板寫入臨時目錄（內容來自模板快取）
         
         Args:
             temp_dir (str): 臨時目錄路徑
             
         Returns:
-            str: 下載的模板檔案路徑
+            str: 模板檔案路徑
         """
         try:
-            logger.info("開始下載 Word 模板")
+            logger.info("開始準備 Word 模板")
             
-            # 直接使用模板檔案 ID（方案 B）
-            template_file_id = config.GOOGLE_DRIVE["TEMPLATE_WORD_FILE_ID"]
-            logger.info(f"使用 Word 模板檔案 ID: {template_file_id}")
-            
-            # 下載檔案
-            request = self.drive_service.files().get_media(fileId=template_file_id)
             file_name = config.GOOGLE_DRIVE["TEMPLATE_FILE_NAME"]
             template_path = os.path.join(temp_dir, file_name)
             
             with open(template_path, 'wb') as f:
-                downloader = MediaIoBaseDownload(f, request)
-                done = False
-                while done is False:
-                    status, done = downloader.next_chunk()
+                f.write(self.get_template_bytes())
             
-            logger.info(f"模板下載完成: {template_path}")
+            logger.info(f"模板準備完成: {template_path}")
             return template_path
             
         except Exception as e:
             logger.error(f"下載模板失敗: {str(e)}")
             raise
     
+    @staticmethod
+    def build_output_file_names(application_data):
+        """
+        產生輸出檔案名稱（沿用原 GAS copyWordTemplate 的命名規則，不含副檔名）
+        
+        Returns:
+            tuple: (word_file_name, pdf_file_name)
+        """
+        year = application_data.get("year")
+        month = application_data.get("month")
+        
+        if not year or not month:
+            raise ValueError(f"缺少必要參數: year={year}, month={month}")
+        
+        now_dt = datetime.now(pytz.timezone('Asia/Taipei'))
+        month_str = f"{int(month):02d}"
+        base_file_name = f"申請表_{year}年{month_str}月_{month_str}{now_dt.day:02d}_{now_dt.hour:02d}{now_dt.minute:02d}"
+        return f"{base_file_name}_待處理", base_file_name
+    
+    def provision_output_files(self, application_data, pool=None):
+        """
+        由 Cloud Run 建立輸出用的 Word/PDF 檔案（取代 GAS 端的模板複製）
+        
+        優先從檔案池領取；檔案池不可用時，以一次批次請求建立兩個空白檔案，
+        內容稍後由 upload_word / upload_pdf 覆蓋。
+        
+        Args:
+            application_data (dict): 申請資料（會寫入 copiedFileId、pdfFileId 等欄位）
+            pool (FilePool): 檔案池（可選）
+            
+        Returns:
+            dict: {"word_file_id", "word_url", "word_file_name", "pdf_file_id", "pdf_url", "pdf_file_name"}
+        """
+        try:
+            word_file_name, pdf_file_name = self.build_output_file_names(application_data)
+            
+            provisioned = None
+            if pool is not None:
+                try:
+                    provisioned = pool.claim(word_file_name, pdf_file_name)
+                except Exception as e:
+                    logger.warning(f"檔案池領取失敗，改為直接建立: {str(e)}")
+            
+            if provisioned:
+                logger.info("從檔案池領取輸出檔案")
+                word_file_id = provisioned["copiedFileId"]
+                word_url = provisioned["wordUrl"]
+                pdf_file_id = provisioned["pdfFileId"]
+                pdf_url = provisioned["pdfUrl"]
+            else:
+                logger.info("以批次請求建立輸出檔案")
+                folder_id = config.GOOGLE_DRIVE["GENERATED_FOLDER_ID"]
+                
+                # 只重送失敗的部分（建立檔案不是冪等操作，只重試配額錯誤）
+                created, errors = resilience.execute_batch(self.drive_service, {
+                    'word': self.drive_service.files().create(
+                        body={
+                            'name': word_file_name,
+                            'parents': [folder_id],
+                            'mimeType': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+                        },
+                        fields='id,webViewLink'
+                    ),
+                    'pdf': self.drive_service.files().create(
+                        body={
+                            'name': pdf_file_name,
+                            'parents': [folder_id],
+                            'mimeType': 'application/pdf'
+                        },
+                        fields='id,webViewLink'
+                    ),
+                }, "drive", idempotent=False)
+                
+                if errors:
+                    # 另一個已建立的檔案不會被使用，刪除避免殘留
+                    for response in created.values():
+                        try:
+                            resilience.execute(self.drive_service.files().delete(fileId=response['id']), "drive")
+                        except Exception as cleanup_error:
+                            logger.warning(f"刪除殘留輸出檔案失敗 {response['id']}: {str(cleanup_error)}")
+                    raise Exception(f"建立輸出檔案失敗: {'; '.join(f'{k}: {v}' for k, v in errors.items())}")
+                
+                word_file_id = created['word'].get('id')
+                word_url = created['word'].get('webViewLink')
+                pdf_file_id = created['pdf'].get('id')
+                pdf_url = created['pdf'].get('webViewLink')
+            
+            application_data["copiedFileId"] = word_file_id
+            application_data["pdfFileId"] = pdf_file_id
+            application_data["copiedFileName"] = word_file_name + ".docx"
+            application_data["pdfFileName"] = pdf_file_name + ".pdf"
+            
+            logger.info(f"輸出檔案已建立: Word {word_file_id}, PDF {pdf_file_id}")
+            return {
+                "word_file_id": word_file_id,
+                "word_url": word_url,
+                "word_file_name": word_file_name + ".docx",
+                "pdf_file_id": pdf_file_id,
+                "pdf_url": pdf_url,
+                "pdf_file_name": pdf_file_name + ".pdf"
+            }
+            
+        except Exception as e:
+            logger.error(f"建立輸出檔案失敗: {str(e)}")
+            raise
+    
     def download_copied_file(self, copied_file_id, temp_dir):
         """
         從 Google Drive 下載已複製的 Word 檔案（方案 B）
@@ -112,7 +297,7 @@ class DocumentProcessor:
             logger.info(f"開始下載已複製的 Word 檔案: {copied_file_id}")
             
             # 取得檔案資訊
-            file_metadata = self.drive_service.files().get(fileId=copied_file_id).execute()
+            file_metadata = resilience.execute(self.drive_service.files().get(fileId=copied_file_id), "drive")
             file_name = file_metadata.get('name', 'copied_template.docx')
             
             logger.info(f"檔案名稱: {file_name}")
@@ -126,7 +311,7 @@ class DocumentProcessor:
                 downloader = MediaIoBaseDownload(copied_file, request)
                 done = False
                 while done is False:
-                    status, done = downloader.next_chunk()
+                    status, done = resilience.call(downloader.next_chunk, "drive")
                     logger.info(f"下載進度: {int(status.progress() * 100)}%")
             
             logger.info(f"已複製檔案下載完成: {copied_file_path}")
@@ -136,6 +321,40 @@ class DocumentProcessor:
             logger.error(f"下載已複製檔案失敗: {str(e)}")
             raise
     
+    @staticmethod
+    def build_replacements(application_data):
+        """
+        產生模板替換資料（佔位符 -> 填入值）
+        
+        Args:
+            application_data (dict): 申請資料
+            
+        Returns:
+            dict: 替換資料
+        """
+        replacements = {
+            config.TEMPLATE_PROCESSING["URL_PLACEHOLDER"]: application_data.get("video_url", ""),
+        }
+        
+        # 處理日期替換
+        dates = application_data.get("selected_dates", [])
+        for i, placeholder in enumerate(config.TEMPLATE_PROCESSING["DATE_PLACEHOLDERS"]):
+            if i < len(dates):
+                # 格式化日期為 YYYY/MM/DD 格式
+                date_obj = dates[i]
+                if isinstance(date_obj, dict):
+                    # 如果是字典，提取 display 欄位
+                    date_str = date_obj.get("display", "")
+                else:
+                    # 如果是字串，直接使用
+                    date_str = str(date_obj)
+                replacements[placeholder] = date_str
+            else:
+                # 空白處理
+                replacements[placeholder] = ""
+        
+        return replacements
+    
     def fill_template(self, template_path, application_data, output_path):
         """
         填寫 Word 模板
@@ -152,26 +371,7 @@ class DocumentProcessor:
             doc = Document(template_path)
             
             # 準備替換資料
-            replacements = {
-                config.TEMPLATE_PROCESSING["URL_PLACEHOLDER"]: application_data.get("video_url", ""),
-            }
-            
-            # 處理日期替換
-            dates = application_data.get("selected_dates", [])
-            for i, placeholder in enumerate(config.TEMPLATE_PROCESSING["DATE_PLACEHOLDERS"]):
-                if i < len(dates):
-                    # 格式化日期為 YYYY/MM/DD 格式
-                    date_obj = dates[i]
-                    if isinstance(date_obj, dict):
-                        # 如果是字典，提取 display 欄位
-                        date_str = date_obj.get("display", "")
-                    else:
-                        # 如果是字串，直接使用
-                        date_str = str(date_obj)
-                    replacements[placeholder] = date_str
-                else:
-                    # 空白處理
-                    replacements[placeholder] = ""
+            replacements = self.build_replacements(application_data)
             
             logger.info(f"替換資料: {replacements}")
             
@@ -199,6 +399,25 @@ class DocumentProcessor:
             logger.error(f"填寫模板失敗: {str(e)}")
             raise
     
+    @staticmethod
+    def build_convert_command(word_path, temp_dir, profile_arg=None):
+        """產生 LibreOffice 轉換 PDF 的指令（profile_arg 指定轉換槽位的使用者設定檔）"""
+        return [
+            config.LIBREOFFICE["COMMAND"],
+            *([profile_arg] if profile_arg else []),
+            "--headless",
+            "--convert-to", "pdf",
+            "--outdir", temp_dir,
+            word_path
+        ]
+    
+    @staticmethod
+    def converted_pdf_path(word_path, temp_dir):
+        """LibreOffice 轉換後的 PDF 路徑"""
+        word_filename = os.path.basename(word_path)
+        pdf_filename = os.path.splitext(word_filename)[0] + ".pdf"
+        return os.path.join(temp_dir, pdf_filename)
+    
     def convert_to_pdf(self, word_path, temp_dir):
         """
         使用 LibreOffice 將 Word 轉換為 PDF
@@ -213,30 +432,24 @@ class DocumentProcessor:
         try:
             logger.info("開始轉換 PDF")
             
-            # 建構 LibreOffice 指令
-            cmd = [
-                config.LIBREOFFICE["COMMAND"],
-                "--headless",
-                "--convert-to", "pdf",
-                "--outdir", temp_dir,
-                word_path
-            ]
-            
-            # 執行轉換
-            result = subprocess.run(
-                cmd,
-                timeout=config.LIBREOFFICE["TIMEOUT_SECONDS"],
-                capture_output=True,
-                text=True
-            )
+            # 取得轉換槽位：同一個使用者設定檔不能同時執行兩個 LibreOffice
+            with conversion_pool.slot() as profile_arg:
+                # 建構 LibreOffice 指令
+                cmd = self.build_convert_command(word_path, temp_dir, profile_arg)
+                
+                # 執行轉換
+                result = subprocess.run(
+                    cmd,
+                    timeout=config.LIBREOFFICE["TIMEOUT_SECONDS"],
+                    capture_output=True,
+                    text=True
+                )
             
             if result.returncode != 0:
                 raise Exception(f"LibreOffice 轉換失敗: {result.stderr}")
             
             # 找到生成的 PDF 檔案
-            word_filename = os.path.basename(word_path)
-            pdf_filename = os.path.splitext(word_filename)[0] + ".pdf"
-            pdf_path = os.path.join(temp_dir, pdf_filename)
+            pdf_path = self.converted_pdf_path(word_path, temp_dir)
             
             if not os.path.exists(pdf_path):
                 raise Exception(f"找不到轉換後的 PDF: {pdf_path}")
@@ -248,80 +461,112 @@ class DocumentProcessor:
             logger.error(f"PDF 轉換失敗: {str(e)}")
             raise
     
+    def output_cache_key(self, application_data):
+        """
+        申請內容的輸出快取鍵（模板雜湊 + 替換資料）
+        
+        Returns:
+            str: 快取鍵
+        """
+        return output_cache.make_key(self.get_template_fingerprint(), self.build_replacements(application_data))
+    
+    def write_documents(self, temp_dir, docx_bytes, pdf_bytes):
+        """
+        將 Word 與 PDF 內容寫入臨時目錄（檔名與 render_documents 相同）
+        
+        Returns:
+            tuple: (word_path, pdf_path)
+        """
+        filled_word_path = os.path.join(temp_dir, "filled_template.docx")
+        pdf_path = self.converted_pdf_path(filled_word_path, temp_dir)
+        with open(filled_word_path, 'wb') as f:
+            f.write(docx_bytes)
+        with open(pdf_path, 'wb') as f:
+            f.write(pdf_bytes)
+        return filled_word_path, pdf_path
+    
+    def render_documents(self, application_data, temp_dir, source_file_id=None, cache=None, progress=no_progress):
+        """
+        產生填寫後的 Word 與 PDF（有輸出快取時優先使用快取）
+        
+        Args:
+            application_data (dict): 申請資料
+            temp_dir (str): 臨時目錄路徑
+            source_file_id (str): GAS 已複製的 Word 檔案 ID（未提供時使用模板快取）
+            cache (OutputCache): 輸出快取（可選）
+            progress (callable): 進度事件（可選）
+            
+        Returns:
+            tuple: (word_path, pdf_path, cache_hit)
+        """
+        filled_word_path = os.path.join(temp_dir, "filled_template.docx")
+        
+        cache_key = None
+        if cache is not None:
+            progress("downloading", source="output_cache")
+            cache_key = self.output_cache_key(application_data)
+            cached = cache.get(cache_key)
+            if cached:
+                logger.info(f"輸出快取命中，略過填寫與轉換: {cache_key[:12]}")
+                return (*self.write_documents(temp_dir, *cached), True)
+        
+        # 1. 取得 Word 檔案（GAS 複製的檔案需下載；否則直接使用模板快取）
+        progress("downloading", source="copied_file" if source_file_id else "template")
+        if source_file_id:
+            source_word_path = self.download_copied_file(source_file_id, temp_dir)
+        else:
+            source_word_path = self.download_template(temp_dir)
+        
+        # 2. 填寫模板
+        progress("filling")
+        self.fill_template(source_word_path, application_data, filled_word_path)
+        
+        # 3. 轉換為 PDF
+        progress("converting")
+        pdf_path = self.convert_to_pdf(filled_word_path, temp_dir)
+        
+        if cache is not None:
+            with open(filled_word_path, 'rb') as f:
+                docx_bytes = f.read()
+            with open(pdf_path, 'rb') as f:
+                pdf_bytes = f.read()
+            cache.put(cache_key, docx_bytes, pdf_bytes)
+        
+        return filled_word_path, pdf_path, False
+    
     def upload_word(self, word_path, application_data):
         """
-        上傳 Word 到 Google Drive（方案 B：覆蓋現有檔案）
+        上傳 Word 到 Google Drive（覆蓋 provision_output_files 建立的檔案）
         
         Args:
             word_path (str): Word 檔案路徑
-            application_data (dict): 申請資料
+            application_data (dict): 申請資料（需有 copiedFileId）
             
         Returns:
             str: 上傳後的檔案連結
         """
         try:
-            # 檢查是否為方案 B（有 copiedFileId）
             copied_file_id = application_data.get("copiedFileId")
+            if not copied_file_id:
+                raise ValueError("缺少 copiedFileId，輸出檔案尚未建立")
             
-            if copied_file_id:
-                logger.info(f"方案 B: 覆蓋現有 Word 檔案 {copied_file_id}")
-                
-                # 覆蓋現有檔案
-                media = MediaFileUpload(
-                    word_path, 
-                    mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                )
-                
-                file = self.drive_service.files().update(
-                    fileId=copied_file_id,
-                    media_body=media,
-                    fields='id,webViewLink'
-                ).execute()
-                
-                file_id = file.get('id')
-                file_url = file.get('webViewLink')
-                
-                logger.info(f"Word 覆蓋完成: {file_url}")
-                return file_url
-                
-            else:
-                logger.info("方案 A: 建立新 Word 檔案")
-                
-                # 生成檔案名稱
-                year = application_data.get("year")
-                month = application_data.get("month")
-                
-                # 檢查必要參數
-                if not year or not month:
-                    raise ValueError(f"缺少必要參數: year={year}, month={month}")
-                
-                # 使用與 PDF 類似的命名規則，但加上 _待處理 後綴
-                timestamp = application_data.get("timestamp", "")
-                filename = f"申請表_{year}年{month}月_{timestamp}_待處理.docx"
-                
-                # 建立新檔案
-                folder_id = config.GOOGLE_DRIVE["GENERATED_FOLDER_ID"]
-                media = MediaFileUpload(
-                    word_path, 
-                    mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-                )
-                
-                file_metadata = {
-                    'name': filename,
-                    'parents': [folder_id]
-                }
-                
-                file = self.drive_service.files().create(
-                    body=file_metadata,
-                    media_body=media,
-                    fields='id,webViewLink'
-                ).execute()
-                
-                file_id = file.get('id')
-                file_url = file.get('webViewLink')
-                
-                logger.info(f"Word 上傳完成: {file_url}")
-                return file_url
+            logger.info(f"覆蓋 Word 檔案 {copied_file_id}")
+            
+            media = MediaFileUpload(
+                word_path, 
+                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            )
+            
+            file = resilience.execute(self.drive_service.files().update(
+                fileId=copied_file_id,
+                media_body=media,
+                fields='id,webViewLink'
+            ), "drive")
+            
+            file_url = file.get('webViewLink')
+            
+            logger.info(f"Word 覆蓋完成: {file_url}")
+            return file_url
             
         except Exception as e:
             logger.error(f"Word 上傳失敗: {str(e)}")
@@ -329,75 +574,132 @@ class DocumentProcessor:
     
     def upload_pdf(self, pdf_path, application_data):
         """
-        上傳 PDF 到 Google Drive（方案 B：覆蓋現有檔案）
+        上傳 PDF 到 Google Drive（覆蓋 provision_output_files 建立的檔案）
         
         Args:
             pdf_path (str): PDF 檔案路徑
-            application_data (dict): 申請資料
+            application_data (dict): 申請資料（需有 pdfFileId）
             
         Returns:
             str: 上傳後的檔案連結
         """
         try:
-            # 檢查是否為方案 B（有 pdfFileId）
             pdf_file_id = application_data.get("pdfFileId")
+            if not pdf_file_id:
+                raise ValueError("缺少 pdfFileId，輸出檔案尚未建立")
             
-            if pdf_file_id:
-                logger.info(f"方案 B: 覆蓋現有 PDF 檔案 {pdf_file_id}")
-                
-                # 覆蓋現有檔案
-                media = MediaFileUpload(pdf_path, mimetype='application/pdf')
-                
-                file = self.drive_service.files().update(
-                    fileId=pdf_file_id,
-                    media_body=media,
-                    fields='id,webViewLink'
-                ).execute()
-                
-                file_id = file.get('id')
-                file_url = file.get('webViewLink')
-                
-                logger.info(f"PDF 覆蓋完成: {file_url}")
-                return file_url
-                
-            else:
-                logger.info("方案 A: 建立新 PDF 檔案")
-                
-                # 生成檔案名稱
-                year = application_data.get("year")
-                month = application_data.get("month")
-                
-                # 檢查必要參數
-                if not year or not month:
-                    raise ValueError(f"缺少必要參數: year={year}, month={month}")
-                
-                filename = config.generate_pdf_filename(year, month)
-                
-                # 建立新檔案
-                folder_id = config.GOOGLE_DRIVE["GENERATED_FOLDER_ID"]
-                media = MediaFileUpload(pdf_path, mimetype='application/pdf')
-                
-                file_metadata = {
-                    'name': filename,
-                    'parents': [folder_id]
-                }
-                
-                file = self.drive_service.files().create(
-                    body=file_metadata,
-                    media_body=media,
-                    fields='id,webViewLink'
-                ).execute()
-                
-                file_id = file.get('id')
-                file_url = file.get('webViewLink')
-                
-                logger.info(f"PDF 上傳完成: {file_url}")
-                return file_url
+            logger.info(f"覆蓋 PDF 檔案 {pdf_file_id}")
+            
+            media = MediaFileUpload(pdf_path, mimetype='application/pdf')
+            
+            file = resilience.execute(self.drive_service.files().update(
+                fileId=pdf_file_id,
+                media_body=media,
+                fields='id,webViewLink'
+            ), "drive")
+            
+            file_url = file.get('webViewLink')
+            
+            logger.info(f"PDF 覆蓋完成: {file_url}")
+            return file_url
             
         except Exception as e:
             logger.error(f"PDF 上傳失敗: {str(e)}")
             raise
     
+    @staticmethod
+    def match_record_row(values, user_id, application_data):
+        """
+        在申請記錄中找到對應的列號
+        
+        Args:
+            values (list): Sheets A:K 欄位資料
+            user_id (str): 用戶 ID
+            application_data (dict): 申請資料（包含時間戳記）
+            
+        Returns:
+            int | None: 列號（從 1 開始），找不到時回傳 None
+        """
+        # 改用時間戳記找到精確的記錄
+        target_timestamp = application_data.get("timestamp")
+        
+        if not target_timestamp:
+            # 向後相容：如果沒有時間戳記，回退到原來的邏輯
+            logger.warning("沒有時間戳記，使用 User ID 搜尋")
+            for i, row in enumerate(values):
+                if len(row) > 1 and row[1] == user_id and len(row) > 6 and row[6] == "待處理":
+                    return i + 1
+        else:
+            # 用時間戳記精確搜尋
+            logger.info(f"使用時間戳記搜尋記錄: {target_timestamp}")
+            for i, row in enumerate(values):
+                if len(row) > 0 and row[0] == target_timestamp:
+                    logger.info(f"找到匹配記錄在第 {i + 1} 行")
+                    return i + 1
+        
+        return None
+    
+    @staticmethod
+    def record_not_found_error(user_id, application_data):
+        """找不到申請記錄時的錯誤"""
+        target_timestamp = application_data.get("timestamp")
+        if target_timestamp:
+            return Exception(f"找不到時間戳記 {target_timestamp} 的申請記錄")
+        return Exception(f"找不到用戶 {user_id} 的待處理記錄")
+    
+    def locate_record(self, user_id, application_data):
+        """
+        找到申請記錄所在的工作表與列號（按月分頁時依時間戳記直接讀取對應分頁）
+        
+        Returns:
+            tuple: (sheet_name, target_row)
+        """
+        spreadsheet_id = config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"]
+        
+        for sheet_name in record_partition.candidate_sheet_names(application_data.get("timestamp")):
+            values = record_partition.read_records(self.sheets_service, spreadsheet_id, sheet_name)
+            target_row = self.match_record_row(values, user_id, application_data)
+            if target_row:
+                return sheet_name, target_row
+        
+        raise self.record_not_found_error(user_id, application_data)
+    
+    @staticmethod
+    def now_timestamp():
+        """台灣時區的 YYYYMMDD-HHmmss 統一時間格式"""
+        taiwan_tz = pytz.timezone('Asia/Taipei')
+        now_dt = datetime.now(taiwan_tz)
+        return f"{now_dt.year:04d}{now_dt.month:02d}{now_dt.day:02d}-{now_dt.hour:02d}{now_dt.minute:02d}{now_dt.second:02d}"
+    
+    @staticmethod
+    def build_status_values(status, pdf_url, error_message):
+        """
+        產生狀態欄位（G:K）的值
+        
+        Returns:
+            list: G, H, I, J, K 欄位
+        """
+        now = DocumentProcessor.now_timestamp()
+        
+        if status == "完成":
+            # 成功完成：更新狀態、錯誤訊息、PDF路徑、處理開始時間、處理完成時間
+            return [status, "", pdf_url, now, now]
+        # 處理失敗：更新狀態、錯誤訊息、處理開始時間、處理完成時間
+        return [status, error_message, "", now, now]
+    
+    @staticmethod
+    def build_status_update(sheet_name, target_row, status, pdf_url, error_message):
+        """
+        產生狀態欄位（G:K）的更新範圍與資料
+        
+        Returns:
+            tuple: (update_range, update_data)
+        """
+        update_data = [DocumentProcessor.build_status_values(status, pdf_url, error_message)]
+        update_range = f"{sheet_name}!G{target_row}:K{target_row}"
+        
+        return update_range, update_data
+    
     def update_sheets_status(self, user_id, application_data, pdf_url, status="完成", error_message=""):
         """
         更新 Google Sheets 狀態
@@ -413,69 +715,26 @@ class DocumentProcessor:
             logger.info(f"更新 Sheets 狀態: {status}")
             
             spreadsheet_id = config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"]
-            sheet_name = config.GOOGLE_SHEETS["SHEET_NAME"]
             
-            # 讀取現有資料，找到對應的用戶記錄
-            range_name = f"{sheet_name}!A:K"
-            result = self.sheets_service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id,
-                range=range_name
-            ).execute()
-            
-            values = result.get('values', [])
-            
-            # 改用時間戳記找到精確的記錄
-            target_row = None
-            target_timestamp = application_data.get("timestamp")
-            
-            if not target_timestamp:
-                # 向後相容：如果沒有時間戳記，回退到原來的邏輯
-                logger.warning("沒有時間戳記，使用 User ID 搜尋")
-                for i, row in enumerate(values):
-                    if len(row) > 1 and row[1] == user_id and len(row) > 6 and row[6] == "待處理":
-                        target_row = i + 1
-                        break
-            else:
-                # 用時間戳記精確搜尋
-                logger.info(f"使用時間戳記搜尋記錄: {target_timestamp}")
-                for i, row in enumerate(values):
-                    if len(row) > 0 and row[0] == target_timestamp:
-                        target_row = i + 1
-                        logger.info(f"找到匹配記錄在第 {target_row} 行")
-                        break
-            
-            if not target_row:
-                if target_timestamp:
-                    raise Exception(f"找不到時間戳記 {target_timestamp} 的申請記錄")
-                else:
-                    raise Exception(f"找不到用戶 {user_id} 的待處理記錄")
-            
-            # 更新狀態 - 使用台灣時區的 YYYYMMDD-HHmmss 統一時間格式
-            taiwan_tz = pytz.timezone('Asia/Taipei')
-            now_dt = datetime.now(taiwan_tz)
-            now = f"{now_dt.year:04d}{now_dt.month:02d}{now_dt.day:02d}-{now_dt.hour:02d}{now_dt.minute:02d}{now_dt.second:02d}"
-            update_data = []
-            
-            if status == "完成":
-                # 成功完成：更新狀態、錯誤訊息、PDF路徑、處理開始時間、處理完成時間
-                update_data = [
-                    [status, "", pdf_url, now, now]  # G, H, I, J, K 欄位
-                ]
-                update_range = f"{sheet_name}!G{target_row}:K{target_row}"
-            else:
-                # 處理失敗：更新狀態、錯誤訊息、處理開始時間、處理完成時間
-                update_data = [
-                    [status, error_message, "", now, now]  # G, H, I, J, K 欄位
-                ]
-                update_range = f"{sheet_name}!G{target_row}:K{target_row}"
+            # 依 GAS 建立的列標記寫入（封存刪除列造成列號位移時仍寫到正確的列）
+            if record_partition.update_status_by_key(
+                self.sheets_service, spreadsheet_id, user_id, application_data.get("timestamp"),
+                self.build_status_values(status, pdf_url, error_message)
+            ):
+                logger.info("Sheets 狀態更新完成（依列標記）")
+                return
+            
+            # 沒有標記的舊記錄：讀取現有資料，找到對應的用戶記錄
+            sheet_name, target_row = self.locate_record(user_id, application_data)
+            update_range, update_data = self.build_status_update(sheet_name, target_row, status, pdf_url, error_message)
             
             # 執行更新
-            self.sheets_service.spreadsheets().values().update(
+            resilience.execute(self.sheets_service.spreadsheets().values().update(
                 spreadsheetId=spreadsheet_id,
                 range=update_range,
                 valueInputOption='USER_ENTERED',
                 body={'values': update_data}
-            ).execute()
+            ), "sheets", quota="sheets_write")
             
             logger.info(f"Sheets 狀態更新完成: 行 {target_row}")
             
@@ -486,6 +745,313 @@ class DocumentProcessor:
 # 全域文件處理器實例
 doc_processor = DocumentProcessor()
 
+# 全域輸出快取（填寫後的 Word 與 PDF）
+output_cache_store = output_cache.OutputCache(doc_processor.credentials)
+
+# 全域共用檢查點（跨 instance 沿用已完成的處理階段）
+shared_journal = SharedJournal(doc_processor.credentials)
+
+# 全域檔案池（背景預建 Word/PDF 檔案對）
+file_pool = None
+
+# 全域申請狀態儲存（本機 SQLite，背景同步到 Sheets）
+application_store = StateStore() if STATE_STORE["ENABLED"] else None
+sheets_replicator = SheetsReplicator(application_store, doc_processor) if application_store else None
+
+def record_local_status(user_id, application_data, pdf_url="", status="完成", error_message=""):
+    """寫入本機儲存（需已開啟 STATE_STORE_ENABLED）"""
+    # 與 build_status_update 相同：完成時不寫錯誤訊息，失敗時不寫 PDF 連結
+    now = DocumentProcessor.now_timestamp()
+    if status == "完成":
+        application_store.set_status(user_id, application_data, status, pdf_url, "", now, now)
+    else:
+        application_store.set_status(user_id, application_data, status, "", error_message, now, now)
+
+def record_status(user_id, application_data, pdf_url="", status="完成", error_message=""):
+    """
+    記錄申請狀態（未開啟本機儲存時直接更新 Sheets；開啟時中間狀態交由背景同步，
+    完成/失敗仍直接寫入 Sheets，直接寫入失敗才交由背景同步重試）
+    
+    Args:
+        user_id (str): 用戶 ID
+        application_data (dict): 申請資料（包含時間戳記）
+        pdf_url (str): PDF 檔案連結
+        status (str): 狀態
+        error_message (str): 錯誤訊息
+    """
+    if application_store is None:
+        doc_processor.update_sheets_status(user_id, application_data, pdf_url, status, error_message)
+        return
+    
+    record_local_status(user_id, application_data, pdf_url, status, error_message)
+    if status in TERMINAL_STATUSES:
+        # /tmp 可能隨 instance 縮減消失，回應後背景同步也可能被節流：結束狀態不只依賴背景同步
+        try:
+            doc_processor.update_sheets_status(user_id, application_data, pdf_url, status, error_message)
+            application_store.mark_written(user_id, application_data.get("timestamp"))
+            return
+        except Exception as e:
+            logger.warning(f"直接寫入 Sheets 失敗，交由背景同步重試: {str(e)}")
+    sheets_replicator.notify()
+
+def start_background_services():
+    """
+    啟動本程序的背景服務（憑證刷新、檔案池補充、Sheets 狀態同步、記憶體回報）
+    
+    preload 模式下 master 不啟動（執行緒無法跨 fork），改由 gunicorn post_fork 在每個 worker 呼叫
+    """
+    global file_pool
+    
+    # 確保本程序的 token 刷新執行緒已啟動
+    credential_provider.get_credentials()
+    
+    if FILE_POOL["ENABLED"] and file_pool is None:
+        file_pool = FilePool(doc_processor.credentials)
+        file_pool.start()
+        atexit.register(file_pool.drain)
+    
+    if sheets_replicator is not None and sheets_replicator.start():
+        atexit.register(sheets_replicator.stop)
+    
+    preload.start_worker_reporter()
+
+if preload.PRELOAD_IN_MASTER:
+    preload.preload_shared_assets(doc_processor)
+elif os.environ.get("STREET_ARTIST_CLI") != "1":
+    # batch_runner 等命令列工具在匯入前設定 STREET_ARTIST_CLI，只啟動自己需要的服務
+    start_background_services()
+
+metrics.register_gauge("workers.memory", preload.worker_memory_reports)
+metrics.register_gauge("conversion.slots", conversion_pool.status)
+if application_store is not None:
+    metrics.register_gauge("state_store.sync", application_store.sync_status)
+
+OUTPUT_FILE_FIELDS = ("copiedFileId", "pdfFileId", "copiedFileName", "pdfFileName")
+
+def sha256_of_file(path):
+    """檔案內容的 SHA-256"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def process_documents(app_data, journal, progress=no_progress):
+    """
+    建立輸出檔案、填寫轉換並上傳（依檢查點略過已完成的階段）
+    
+    Args:
+        app_data (dict): 申請資料（會補上輸出檔案 ID 與檔名）
+        journal (JobJournal): 階段檢查點
+        progress (callable): 進度事件（可選）
+        
+    Returns:
+        tuple: (word_url, pdf_url, output_cache_hit)
+    """
+    copied_file_id = app_data.get("copiedFileId")
+    
+    def provision():
+        if copied_file_id:
+            logger.info(f"使用方案 B: 編輯已複製檔案 {copied_file_id}")
+        else:
+            # GAS 未傳送檔案 ID：由 Cloud Run 自行建立輸出檔案
+            logger.info("由 Cloud Run 建立輸出檔案")
+            doc_processor.provision_output_files(app_data, file_pool)
+        return {field: app_data.get(field) for field in OUTPUT_FILE_FIELDS}
+    
+    # 重試時沿用先前建立的檔案，不再建立新的 Drive 檔案
+    app_data.update(journal.run("provision", provision))
+    
+    uploads_pending = not (journal.is_done("upload_word") and journal.is_done("upload_pdf"))
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        logger.info(f"使用臨時目錄: {temp_dir}")
+        paths = {}
+        
+        def render():
+            # 填寫模板並轉換為 PDF（輸出快取命中時直接使用）
+            word_path, pdf_path, cache_hit = doc_processor.render_documents(
+                app_data, temp_dir, source_file_id=copied_file_id, cache=output_cache_store, progress=progress
+            )
+            paths.update(word=word_path, pdf=pdf_path)
+            return {
+                "cache_key": doc_processor.output_cache_key(app_data),
+                "docx_sha256": sha256_of_file(word_path),
+                "pdf_sha256": sha256_of_file(pdf_path),
+                "output_cache_hit": cache_hit
+            }
+        
+        def restore_render(detail):
+            # 上傳都已完成時不需要檔案內容
+            if not uploads_pending:
+                return True
+            cached = output_cache_store.get(detail.get("cache_key", ""))
+            if not cached:
+                return False
+            docx_bytes, pdf_bytes = cached
+            if (hashlib.sha256(docx_bytes).hexdigest() != detail.get("docx_sha256")
+                    or hashlib.sha256(pdf_bytes).hexdigest() != detail.get("pdf_sha256")):
+                return False
+            word_path, pdf_path = doc_processor.write_documents(temp_dir, docx_bytes, pdf_bytes)
+            paths.update(word=word_path, pdf=pdf_path)
+            return True
+        
+        rendered = journal.run("render", render, restore=restore_render)
+        journal.annotate("render", temp_dir_kb=memory_accounting.dir_size_kb(temp_dir))
+        
+        if uploads_pending:
+            progress("uploading")
+        
+        # 上傳填寫後的 Word 回 Google Drive
+        word_url = journal.run("upload_word", lambda: {
+            "word_url": doc_processor.upload_word(paths["word"], app_data)
+        })["word_url"]
+        logger.info(f"Word 檔案已上傳: {word_url}")
+        
+        # 上傳 PDF
+        pdf_url = journal.run("upload_pdf", lambda: {
+            "pdf_url": doc_processor.upload_pdf(paths["pdf"], app_data)
+        })["pdf_url"]
+        logger.info(f"PDF 檔案已上傳: {pdf_url}")
+    
+    return word_url, pdf_url, rendered.get("output_cache_hit", False)
+
+# 全域處理權（/process-application 與批次處理共用，背景心跳）
+record_claims = record_partition.RecordClaims(doc_processor.build_sheets_service)
+metrics.register_gauge("record_claims", record_claims.status)
+
+def claim_application(user_id, timestamp, fail_open=True):
+    """
+    取得申請的處理權（避免 /process-application 與批次處理重複處理同一筆記錄）
+    
+    Args:
+        fail_open (bool): Sheets 無法連線時是否照常處理（批次處理傳入 False）
+        
+    Returns:
+        bool: 是否取得處理權
+    """
+    try:
+        return record_claims.claim(doc_processor.sheets_service, user_id, timestamp)
+    except Exception as e:
+        logger.warning(f"取得處理權失敗（{'繼續處理' if fail_open else '略過'}）: {str(e)}")
+        return fail_open
+
+def release_application(user_id, timestamp):
+    """釋放處理權（處理結束後呼叫，成功或失敗皆同；失敗只記錄警告，標記在心跳逾時後即可接手）"""
+    try:
+        record_claims.release(doc_processor.sheets_service, user_id, timestamp)
+    except Exception as e:
+        logger.warning(f"釋放處理權失敗: {str(e)}")
+
+def build_callback_data(user_id, group_id, timestamp, app_data=None, pdf_url=None, word_url=None, error=None):
+    """
+    產生 GAS handleCloudRunCallback 的回調資料
+    
+    Args:
+        group_id (str): LINE 群組 ID（批次處理沒有時為 None，GAS 改傳給用戶）
+        error (Exception | str): 處理失敗的原因（提供時產生失敗通知）
+        
+    Returns:
+        dict: 回調資料
+    """
+    if error is not None:
+        return {
+            "success": False,
+            "user_id": user_id,
+            "group_id": group_id,
+            "timestamp": timestamp or "",
+            "message": f"文件處理失敗: {str(error)}"
+        }
+    return {
+        "success": True,
+        "user_id": user_id,
+        "group_id": group_id,
+        "timestamp": timestamp,
+        "pdf_file_id": app_data.get("pdfFileId"),
+        "pdf_url": pdf_url,
+        "word_file_id": app_data.get("copiedFileId"),
+        "word_url": word_url,
+        "message": "✅ 申請表已準備好"
+    }
+
+def send_gas_callback(gas_callback_url, callback_data):
+    """回調 GAS（失敗只記錄錯誤，不影響處理結果）"""
+    logger.info("📤 準備回調 GAS")
+    logger.info(f"📋 回調資料: {callback_data}")
+    try:
+        import requests
+        callback_response = requests.post(gas_callback_url, json=callback_data, timeout=10)
+        logger.info(f"✅ 已回調 GAS: {callback_response.status_code}")
+    except Exception as callback_error:
+        logger.error(f"⚠️ 回調 GAS 失敗: {str(callback_error)}")
+
+def batch_notifier(gas_callback_url):
+    """
+    批次處理的 GAS 回調（與 /process-application 相同格式；批次沒有 group_id，GAS 改傳給用戶）
+    
+    Returns:
+        callable | None: (user_id, app_data, result, error)，未設定回調 URL 時回傳 None
+    """
+    if not gas_callback_url:
+        return None
+    
+    def notify(user_id, app_data, result=None, error=None):
+        if error is not None:
+            callback_data = build_callback_data(user_id, None, app_data.get("timestamp"), error=error)
+        else:
+            callback_data = build_callback_data(
+                user_id, None, app_data.get("timestamp"), app_data, result["pdf_url"], result["word_url"]
+            )
+        send_gas_callback(gas_callback_url, callback_data)
+    return notify
+
+def run_application(user_id, app_data, progress=None):
+    """
+    處理單一申請：記錄狀態、處理文件（依檢查點續做）、記錄完成
+    
+    Args:
+        user_id (str): 用戶 ID
+        app_data (dict): 申請資料（包含時間戳記）
+        progress (JobProgress): 進度事件（未提供時自動建立）
+        
+    Returns:
+        dict: {"word_url", "pdf_url", "output_cache_hit", "journal", "memory"}
+    """
+    progress = progress or JobProgress(application_store, user_id, app_data.get("timestamp"))
+    memory = memory_accounting.MemoryProbe()
+    
+    try:
+        # 更新狀態為「文件處理中」
+        record_status(user_id, app_data, "", "文件處理中")
+        
+        # 同一申請重試時從第一個未完成的階段繼續
+        journal = JobJournal(application_store, user_id, app_data.get("timestamp"), shared_journal)
+        journal.load_shared()
+        word_url, pdf_url, cache_hit = process_documents(app_data, journal, progress)
+        
+        logger.info("✅ Phase 5: 文件處理完成")
+        
+        # ===== 階段 5: Shortcut 半自動化方案（跳過網站自動化）=====
+        logger.info("📱 階段 5: 準備 Shortcut 半自動化方案")
+        
+        # 更新狀態為「完成」
+        progress("recording")
+        record_status(user_id, app_data, pdf_url, "完成", "")
+        logger.info("✅ 狀態已更新為「完成」")
+    except Exception as e:
+        progress("failed", error=str(e))
+        memory_accounting.record_request(f"{user_id}/{app_data.get('timestamp')}", {**memory.delta(), "status": "失敗"})
+        raise
+    
+    progress("done", pdf_url=pdf_url, word_url=word_url)
+    memory_report = memory.delta()
+    memory_accounting.record_request(f"{user_id}/{app_data.get('timestamp')}", {**memory_report, "status": "完成"})
+    
+    return {
+        "word_url": word_url,
+        "pdf_url": pdf_url,
+        "output_cache_hit": cache_hit,
+        "journal": journal.summary(),
+        "memory": memory_report
+    }
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康檢查端點"""
@@ -495,6 +1061,80 @@ def health_check():
         "service": "document-processor"
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """程序內指標（重試次數、斷路器狀態等）"""
+    return jsonify({
+        "timestamp": datetime.now().isoformat(),
+        **metrics.snapshot()
+    })
+
+@app.route('/debug/memory', methods=['GET'])
+def debug_memory():
+    """本 worker 的記憶體用量、最近申請的記憶體摘要與 tracemalloc 前 N 名（MEMORY_TRACEMALLOC=true）"""
+    return jsonify({
+        "timestamp": datetime.now().isoformat(),
+        **memory_accounting.debug_report(request.args.get("top", type=int))
+    })
+
+@app.route('/claim-file-pair', methods=['POST'])
+def claim_file_pair():
+    """
+    從檔案池領取一組已建立的 Word/PDF 檔案並改名（取代 GAS 的兩次 makeCopy）
+    
+    預期的 JSON 格式：
+    {
+        "word_file_name": "申請表_2025年10月_1012_0316_待處理",
+        "pdf_file_name": "申請表_2025年10月_1012_0316"
+    }
+    """
+    try:
+        request_data = request.get_json() or {}
+        word_file_name = request_data.get("word_file_name")
+        pdf_file_name = request_data.get("pdf_file_name")
+        
+        if not word_file_name or not pdf_file_name:
+            return jsonify({"success": False, "error": "缺少檔案名稱"}), 400
+        
+        if file_pool is None:
+            return jsonify({"success": False, "error": "檔案池未啟用"}), 503
+        
+        claimed = file_pool.claim(word_file_name, pdf_file_name)
+        if claimed is None:
+            return jsonify({"success": False, "error": "檔案池已空"}), 503
+        
+        return jsonify({
+            "success": True,
+            **claimed,
+            "wordFileName": word_file_name + ".docx",
+            "pdfFileName": pdf_file_name + ".pdf",
+            "pool_remaining": file_pool.size()
+        })
+        
+    except Exception as e:
+        logger.error(f"領取檔案池檔案失敗: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/prefetch', methods=['POST'])
+def prefetch():
+    """
+    申請流程預熱（GAS 在使用者開始申請時呼叫，可頻繁呼叫）
+    
+    立即回傳；模板快取、token 刷新與 LibreOffice 預熱在背景執行，已預熱時直接回傳。
+    
+    預期的 JSON 格式（可選）：
+    {
+        "user_id": "用戶ID",
+        "application_data": {"year": 2025, "month": 11, "selected_dates": [...], "video_url": "..."}
+    }
+    """
+    request_data = request.get_json(silent=True) or {}
+    result = warmup.prefetch(doc_processor, output_cache_store, request_data.get("application_data"))
+    return jsonify({"success": True, **result})
+
 @app.route('/process-application', methods=['POST'])
 def process_application():
     """
@@ -510,12 +1150,16 @@ def process_application():
             "selected_dates": ["2025/10/5"],
             "video_url": "https://drive.google.com/...",
             "video_source": "常用影片",
-            "copiedFileId": "...",
-            "pdfFileId": "..."
+            "copiedFileId": "...",  # 可選：未提供時由 Cloud Run 自行建立檔案
+            "pdfFileId": "..."      # 可選
         },
         "gas_callback_url": "GAS回調URL"  # Phase 6: 新增回調URL
     }
     """
+    # 每個申請有獨立的 Google API 重試預算
+    resilience.start_request_budget()
+    claimed = False
+    
     try:
         # 解析請求資料
         application_data = request.get_json()
@@ -538,101 +1182,36 @@ def process_application():
         logger.info(f"👤 用戶: {user_id}, 時間戳記: {timestamp}")
         logger.info(f"📋 申請資料: {app_data}")
         
+        # 同一筆記錄正由其他請求或批次處理中時不重複處理（也不覆寫其狀態）
+        # 回傳 202：GAS 視為處理中，結果由持有者完成後回調
+        if not claim_application(user_id, timestamp):
+            logger.info(f"申請 {timestamp} 正由其他程序處理中，略過")
+            return jsonify({
+                "success": True,
+                "claimed_elsewhere": True,
+                "message": "此申請正由其他程序處理中，完成後會回調",
+                "user_id": user_id
+            }), 202
+        claimed = True
+        
         # ===== Phase 5: 文件處理 =====
         logger.info("📄 Phase 5: 開始文件處理...")
         
-        # 更新 Sheets 狀態為「文件處理中」
-        doc_processor.update_sheets_status(user_id, app_data, "", "文件處理中")
-        
-        # 檢查是否為方案 B（GAS 複製 + Cloud Run 編輯）
-        copied_file_id = app_data.get("copiedFileId")
-        pdf_url = ""
-        
-        if copied_file_id:
-            logger.info(f"使用方案 B: 編輯已複製檔案 {copied_file_id}")
-            
-            # 建立臨時目錄
-            with tempfile.TemporaryDirectory() as temp_dir:
-                logger.info(f"使用臨時目錄: {temp_dir}")
-                
-                # 1. 下載已複製的 Word 檔案
-                copied_word_path = doc_processor.download_copied_file(copied_file_id, temp_dir)
-                
-                # 2. 填寫模板
-                filled_word_path = os.path.join(temp_dir, "filled_template.docx")
-                doc_processor.fill_template(copied_word_path, app_data, filled_word_path)
-                
-                # 2.5. 上傳填寫後的 Word 回 Google Drive
-                word_url = doc_processor.upload_word(filled_word_path, app_data)
-                logger.info(f"Word 檔案已上傳: {word_url}")
-                
-                # 3. 轉換為 PDF
-                pdf_path = doc_processor.convert_to_pdf(filled_word_path, temp_dir)
-                
-                # 4. 上傳 PDF
-                pdf_url = doc_processor.upload_pdf(pdf_path, app_data)
-                logger.info(f"PDF 檔案已上傳: {pdf_url}")
-        else:
-            logger.info("使用方案 A: 下載模板檔案")
-            
-            # 建立臨時目錄
-            with tempfile.TemporaryDirectory() as temp_dir:
-                logger.info(f"使用臨時目錄: {temp_dir}")
-                
-                # 1. 下載模板
-                template_path = doc_processor.download_template(temp_dir)
-                
-                # 2. 填寫模板
-                filled_word_path = os.path.join(temp_dir, "filled_template.docx")
-                doc_processor.fill_template(template_path, app_data, filled_word_path)
-                
-                # 2.5. 上傳填寫後的 Word 到 Google Drive
-                word_url = doc_processor.upload_word(filled_word_path, app_data)
-                logger.info(f"Word 檔案已上傳: {word_url}")
-                
-                # 3. 轉換為 PDF
-                pdf_path = doc_processor.convert_to_pdf(filled_word_path, temp_dir)
-                
-                # 4. 上傳 PDF
-                pdf_url = doc_processor.upload_pdf(pdf_path, app_data)
-                logger.info(f"PDF 檔案已上傳: {pdf_url}")
-        
-        logger.info("✅ Phase 5: 文件處理完成")
-        
-        # ===== 階段 5: Shortcut 半自動化方案（跳過網站自動化）=====
-        logger.info("📱 階段 5: 準備 Shortcut 半自動化方案")
-        
-        # 更新 Sheets 狀態為「完成」
-        doc_processor.update_sheets_status(user_id, app_data, pdf_url, "完成", "")
-        logger.info("✅ Sheets 狀態已更新為「完成」")
+        progress = JobProgress(application_store, user_id, timestamp)
+        progress("queued")
+        result = run_application(user_id, app_data, progress)
+        # 完成狀態已寫入：重新送出可以立即取得處理權
+        release_application(user_id, timestamp)
+        claimed = False
+        pdf_url = result["pdf_url"]
+        word_url = result["word_url"]
         
         # 回調 GAS（如果有提供回調 URL）
         if gas_callback_url:
-            # 取得 group_id（從請求資料中）
-            group_id = application_data.get("group_id")
-            
-            callback_data = {
-                "success": True,
-                "user_id": user_id,
-                "group_id": group_id,
-                "timestamp": timestamp,
-                "pdf_file_id": app_data.get("pdfFileId"),
-                "message": "✅ 申請表已準備好"
-            }
-            
-            logger.info("📤 準備回調 GAS")
-            logger.info(f"📋 回調資料: {callback_data}")
-            
-            try:
-                import requests
-                callback_response = requests.post(
-                    gas_callback_url,
-                    json=callback_data,
-                    timeout=10
-                )
-                logger.info(f"✅ 已回調 GAS: {callback_response.status_code}")
-            except Exception as callback_error:
-                logger.error(f"⚠️ 回調 GAS 失敗: {str(callback_error)}")
+            # group_id 從請求資料中取得
+            send_gas_callback(gas_callback_url, build_callback_data(
+                user_id, application_data.get("group_id"), timestamp, app_data, pdf_url, word_url
+            ))
         
         logger.info("🎉 階段 5: 文件處理和回調完成")
         
@@ -641,6 +1220,13 @@ def process_application():
             "message": "申請處理完成，Shortcut 連結已發送",
             "pdf_url": pdf_url,
             "pdf_file_id": app_data.get("pdfFileId"),
+            "pdf_file_name": app_data.get("pdfFileName"),
+            "word_url": word_url,
+            "word_file_id": app_data.get("copiedFileId"),
+            "word_file_name": app_data.get("copiedFileName"),
+            "output_cache_hit": result["output_cache_hit"],
+            **result["journal"],
+            "memory": result["memory"],
             "user_id": user_id
         })
         
@@ -653,31 +1239,159 @@ def process_application():
             group_id = application_data.get("group_id") if application_data else None
             app_data = application_data.get("application_data", {}) if application_data else {}
             error_message = f"[文件處理] {str(e)}"
-            doc_processor.update_sheets_status(user_id, app_data, "", "失敗", error_message)
+            
+            # Sheets 斷路器開啟時不再直接寫入失敗狀態（避免服務中斷期間再多一次完整讀取）；
+            # 本機儲存開啟時只寫入 SQLite，由背景同步在 Sheets 恢復後寫回
+            if application_store is None and resilience.is_open("sheets"):
+                logger.warning("Sheets 斷路器開啟中，略過失敗狀態更新")
+            else:
+                record_status(user_id, app_data, "", "失敗", error_message)
             
             # 回調 GAS（失敗通知）
             gas_callback_url = application_data.get("gas_callback_url") if application_data else None
             if gas_callback_url:
-                callback_data = {
-                    "success": False,
-                    "user_id": user_id,
-                    "group_id": group_id,
-                    "timestamp": application_data.get("timestamp", ""),
-                    "message": f"文件處理失敗: {str(e)}"
-                }
-                
-                logger.info(f"📤 準備回調 GAS（失敗通知）")
-                logger.info(f"📋 回調資料: {callback_data}")
-                
-                try:
-                    import requests
-                    requests.post(gas_callback_url, json=callback_data, timeout=10)
-                    logger.info("✅ 已回調 GAS（失敗通知）")
-                except Exception as callback_error:
-                    logger.error(f"⚠️ 回調 GAS 失敗: {str(callback_error)}")
+                send_gas_callback(gas_callback_url, build_callback_data(
+                    user_id, group_id, application_data.get("timestamp"), error=e
+                ))
         except Exception as notify_error:
             logger.error(f"❌ 通知處理失敗: {str(notify_error)}")
         
+        # 失敗狀態寫入後才釋放，重試可以立即取得處理權
+        if claimed:
+            release_application(application_data.get("user_id"), application_data.get("timestamp"))
+        
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/application-status', methods=['GET'])
+def application_status():
+    """
+    查詢申請狀態與處理階段（讀取本機儲存，不呼叫 Sheets）
+    
+    查詢參數：user_id、timestamp
+    """
+    if application_store is None:
+        return jsonify({"success": False, "error": "未開啟本機狀態儲存（STATE_STORE_ENABLED）"}), 400
+    
+    user_id = request.args.get("user_id")
+    timestamp = request.args.get("timestamp")
+    record = application_store.get_application(user_id, timestamp)
+    if record is None:
+        return jsonify({"success": False, "error": "找不到申請記錄"}), 404
+    
+    return jsonify({
+        "success": True,
+        "user_id": user_id,
+        "timestamp": timestamp,
+        "status": record["status"],
+        "pdf_url": record["pdf_url"],
+        "error_message": record["error_message"],
+        "synced": record["synced"],
+        "last_sync_error": record["last_sync_error"],
+        "stages": application_store.get_stages(user_id, timestamp)
+    })
+
+@app.route('/jobs/<user_id>/<timestamp>/events', methods=['GET'])
+def job_events(user_id, timestamp):
+    """
+    申請處理進度事件（JSON Lines，立即回傳；以 after 參數帶上次最後的序號輪詢）
+    
+    ASGI 模式下同一路徑支援 Accept: text/event-stream 的 SSE 串流
+    """
+    if application_store is None:
+        return jsonify({"success": False, "error": "未開啟本機狀態儲存（STATE_STORE_ENABLED）"}), 400
+    
+    events = application_store.events_after(user_id, timestamp, request.args.get("after", 0, type=int))
+    return Response(to_json_lines(events), mimetype="application/x-ndjson")
+
+@app.route('/process-pending', methods=['POST'])
+def process_pending():
+    """
+    批次處理申請記錄中所有「待處理」的申請（申請時段開放時由排程或手動觸發）
+    
+    預期的 JSON 格式（皆為可選）：
+    {
+        "parallelism": 4,
+        "limit": 20,
+        "dry_run": false,
+        "gas_callback_url": "GAS回調URL"  # 未提供時使用 GAS_CALLBACK_URL 環境變數
+    }
+    """
+    try:
+        request_data = request.get_json(silent=True) or {}
+        summary = batch_runner.run_pending(
+            doc_processor,
+            run_application,
+            lambda user_id, app_data, error: record_status(user_id, app_data, "", "失敗", error),
+            lambda user_id, timestamp: claim_application(user_id, timestamp, fail_open=False),
+            release_application,
+            store=application_store,
+            parallelism=request_data.get("parallelism"),
+            limit=request_data.get("limit"),
+            dry_run=bool(request_data.get("dry_run")),
+            notify=batch_notifier(request_data.get("gas_callback_url") or batch_runner.BATCH["GAS_CALLBACK_URL"])
+        )
+        return jsonify({"success": summary.get("failed", 0) == 0, **summary})
+        
+    except Exception as e:
+        logger.error(f"批次處理失敗: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/pregenerate', methods=['POST'])
+def pregenerate_applications():
+    """
+    預先產生預設日期的申請文件（由 Cloud Scheduler 在申請時段開放前觸發）
+    
+    預期的 JSON 格式（皆為可選）：
+    {
+        "applicants": [{"user_id": "用戶ID", "video_url": "https://drive.google.com/..."}],
+        "months": [{"year": 2025, "month": 11}]
+    }
+    未提供 applicants 時從申請記錄讀取每位申請人最近使用的影片；
+    未提供 months 時使用即將開放申請的月份。
+    """
+    try:
+        request_data = request.get_json(silent=True) or {}
+        months = [(int(m["year"]), int(m["month"])) for m in request_data.get("months", [])]
+        
+        summary = pregenerate.pregenerate(
+            doc_processor,
+            output_cache_store,
+            applicants=request_data.get("applicants"),
+            months=months or None
+        )
+        
+        return jsonify({"success": summary["failed"] == 0, **summary})
+        
+    except Exception as e:
+        logger.error(f"預先產生申請文件失敗: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/archive-records', methods=['POST'])
+def archive_records():
+    """
+    將原工作表中已結束的申請記錄搬到各月分頁（由 Cloud Scheduler 定期觸發）
+    """
+    if not record_partition.RECORD_PARTITION["ENABLED"]:
+        return jsonify({
+            "success": False,
+            "error": "未開啟按月分頁（RECORD_PARTITION_BY_MONTH）"
+        }), 400
+    
+    try:
+        summary = record_partition.archive_records(doc_processor.sheets_service)
+        return jsonify({"success": True, **summary})
+        
+    except Exception as e:
+        logger.error(f"封存申請記錄失敗: {str(e)}")
         return jsonify({
             "success": False,
             "error": str(e)
@@ -719,7 +1433,7 @@ def website_automation():
         from website_automation_cloud import WebsiteAutomationCloud
         
         # 建立自動化實例（階段 2B：Cloud Run 測試，不提交）
-        automation = WebsiteAutomationCloud(stage="2B")
+        automation = WebsiteAutomationCloud(stage="2B", trace=request_data.get("trace"))
         
         # 執行網站自動化
         result = automation.run_automation(application_data)
@@ -0,0 +1,187 @@
+"""
+街頭藝人申請系統 - 每個申請的記憶體用量
+
+Cloud Run instance 的記憶體上限是固定的，python-docx、模板快取與 LibreOffice 子程序
+都會佔用記憶體，但過去只能從 instance 的整體用量推測哪個環節最耗記憶體。
+
+記錄項目：
+- 程序 RSS（/proc/self/status 的 VmRSS）與 RSS 高峰（VmHWM，程序層級，並行請求會互相影響）
+- RUSAGE_CHILDREN 的 ru_maxrss：已結束子程序（soffice）中最大的 RSS
+- 臨時目錄大小（/tmp 在 Cloud Run 為記憶體檔案系統，同樣計入記憶體用量）
+- 可選 tracemalloc（MEMORY_TRACEMALLOC=true）：Python 配置的記憶體與前 N 名配置位置，
+  每個階段另附該階段期間增加最多的前 N 名配置位置（快照比較，程序層級，並行請求會互相影響）
+
+每個階段的差異放入回應的 stage_memory，每個申請的摘要保留最近 MEMORY_HISTORY 筆，
+由 /debug/memory 查詢。
+"""
+
+import os
+import gc
+import time
+import logging
+import resource
+import threading
+import tracemalloc
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 記憶體紀錄設定（可用 Cloud Run 環境變數覆寫）
+MEMORY = {
+    "TRACEMALLOC": os.environ.get("MEMORY_TRACEMALLOC", "false").lower() == "true",
+    "TRACEMALLOC_FRAMES": int(os.environ.get("MEMORY_TRACEMALLOC_FRAMES", "1")),
+    "TOP_N": int(os.environ.get("MEMORY_TOP_N", "10")),
+    "HISTORY": int(os.environ.get("MEMORY_HISTORY", "50")),
+}
+
+if MEMORY["TRACEMALLOC"] and not tracemalloc.is_tracing():
+    tracemalloc.start(MEMORY["TRACEMALLOC_FRAMES"])
+
+_history = deque(maxlen=MEMORY["HISTORY"])
+_history_lock = threading.Lock()
+
+
+def read_status_kb():
+    """
+    讀取 /proc/self/status 的 RSS 與 RSS 高峰（KB）
+
+    Returns:
+        dict: {"rss_kb", "hwm_kb"}
+    """
+    fields = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, value = line.split(":", 1)
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return {"rss_kb": fields.get("VmRSS", 0), "hwm_kb": fields.get("VmHWM", 0)}
+
+
+def children_maxrss_kb():
+    """已結束子程序中最大的 RSS（KB，Linux 的 ru_maxrss 單位即為 KB）"""
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+def dir_size_kb(path):
+    """目錄內所有檔案的大小（KB）"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total // 1024
+
+
+def snapshot():
+    """
+    目前的記憶體用量
+
+    Returns:
+        dict: rss_kb、hwm_kb、children_maxrss_kb，開啟 tracemalloc 時加上 traced_kb
+    """
+    sample = {**read_status_kb(), "children_maxrss_kb": children_maxrss_kb()}
+    if tracemalloc.is_tracing():
+        sample["traced_kb"] = tracemalloc.get_traced_memory()[0] // 1024
+    return sample
+
+
+def allocation_diff(started, limit=None):
+    """
+    與開始時的 tracemalloc 快照比較，增加最多的前 N 名配置位置
+
+    Args:
+        started (tracemalloc.Snapshot): 開始時的快照
+
+    Returns:
+        list: [{"location", "size_diff_kb", "count_diff"}, ...]
+    """
+    stats = tracemalloc.take_snapshot().compare_to(started, "lineno")
+    return [
+        {"location": str(stat.traceback), "size_diff_kb": stat.size_diff // 1024, "count_diff": stat.count_diff}
+        for stat in stats[:limit or MEMORY["TOP_N"]]
+        if stat.size_diff > 0
+    ]
+
+
+class MemoryProbe:
+    """記錄一段處理期間的記憶體變化"""
+
+    def __init__(self):
+        self.started = snapshot()
+        self._traces = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+
+    def delta(self, **extra):
+        """
+        與開始時的差異
+
+        Returns:
+            dict: rss_kb（結束時）、rss_delta_kb、hwm_kb、children_maxrss_kb（子程序高峰有增加時才有值），
+                開啟 tracemalloc 時另有 traced_delta_kb 與 top_allocation_diff
+        """
+        now = snapshot()
+        report = {
+            "rss_kb": now["rss_kb"],
+            "rss_delta_kb": now["rss_kb"] - self.started["rss_kb"],
+            "hwm_kb": now["hwm_kb"],
+        }
+        # ru_maxrss 只會增加：本段期間有子程序創下新高峰時才歸給本段
+        if now["children_maxrss_kb"] > self.started["children_maxrss_kb"]:
+            report["children_maxrss_kb"] = now["children_maxrss_kb"]
+        if "traced_kb" in now and "traced_kb" in self.started:
+            report["traced_delta_kb"] = now["traced_kb"] - self.started["traced_kb"]
+        if self._traces is not None and tracemalloc.is_tracing():
+            report["top_allocation_diff"] = allocation_diff(self._traces)
+            self._traces = None
+        report.update(extra)
+        return report
+
+
+def record_request(label, report):
+    """保留申請的記憶體摘要（/debug/memory）"""
+    with _history_lock:
+        _history.append({"label": label, "at": time.time(), **report})
+
+
+def top_allocations(limit=None):
+    """
+    tracemalloc 前 N 名配置位置（未開啟時回傳空清單）
+
+    Returns:
+        list: [{"location", "size_kb", "count"}, ...]
+    """
+    if not tracemalloc.is_tracing():
+        return []
+    stats = tracemalloc.take_snapshot().statistics("lineno")
+    return [
+        {"location": str(stat.traceback), "size_kb": stat.size // 1024, "count": stat.count}
+        for stat in stats[:limit or MEMORY["TOP_N"]]
+    ]
+
+
+def debug_report(top_n=None):
+    """
+    /debug/memory 的內容
+
+    Returns:
+        dict: 程序、子程序、GC、最近申請與 tracemalloc 資訊
+    """
+    with _history_lock:
+        history = list(_history)
+
+    report = {
+        "pid": os.getpid(),
+        "process": snapshot(),
+        "gc": {"counts": gc.get_count(), "frozen": gc.get_freeze_count()},
+        "recent_requests": history,
+        "tracemalloc": tracemalloc.is_tracing(),
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report["traced"] = {"current_kb": current // 1024, "peak_kb": peak // 1024}
+        report["top_allocations"] = top_allocations(top_n)
+    return report
@@ -0,0 +1,66 @@
+"""
+街頭藝人申請系統 - 程序內指標
+
+提供執行緒安全的計數器與即時狀態（gauge），由 /metrics 端點輸出為 JSON。
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """計數器與 gauge 註冊表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+
+    def increment(self, name, amount=1):
+        """
+        計數器加值
+
+        Args:
+            name (str): 指標名稱（例如 "drive.retries"）
+            amount (int): 增加量
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def register_gauge(self, name, provider):
+        """
+        註冊即時狀態提供函數（輸出時才呼叫）
+
+        Args:
+            name (str): 指標名稱
+            provider (callable): 回傳可 JSON 序列化值的函數
+        """
+        with self._lock:
+            self._gauges[name] = provider
+
+    def snapshot(self):
+        """
+        取得所有指標目前的值
+
+        Returns:
+            dict: {"counters": {...}, "gauges": {...}}
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        gauge_values = {}
+        for name, provider in gauges.items():
+            try:
+                gauge_values[name] = provider()
+            except Exception as e:
+                logger.warning(f"讀取指標 {name} 失敗: {str(e)}")
+                gauge_values[name] = None
+
+        return {"counters": counters, "gauges": gauge_values}
+
+
+# 全域指標
+metrics = Metrics()
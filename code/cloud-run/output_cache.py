@@ -0,0 +1,152 @@
+"""
+街頭藝人申請系統 - 申請文件輸出快取
+
+以「模板雜湊 + 替換資料」為鍵，快取填寫後的 Word 與轉換後的 PDF。
+相同內容的申請（例如 /pregenerate 預先產生的預設日期申請、失敗後重試）不需再填寫與轉換。
+
+儲存位置：
+- 本機目錄（OUTPUT_CACHE_DIR），同一個 instance 內重複使用
+- 可選 GCS bucket（OUTPUT_CACHE_BUCKET），instance 縮減到零或更換後仍可命中
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 輸出快取設定（可用 Cloud Run 環境變數覆寫）
+OUTPUT_CACHE = {
+    "DIR": os.environ.get("OUTPUT_CACHE_DIR", "/tmp/output-cache"),
+    "BUCKET": os.environ.get("OUTPUT_CACHE_BUCKET", ""),
+    "MAX_AGE_SECONDS": int(os.environ.get("OUTPUT_CACHE_MAX_AGE_SECONDS", str(45 * 24 * 3600))),
+}
+
+DOCX_NAME = "filled.docx"
+PDF_NAME = "output.pdf"
+
+
+def make_key(template_fingerprint, replacements):
+    """
+    產生快取鍵
+
+    Args:
+        template_fingerprint (str): 模板內容雜湊
+        replacements (dict): 模板替換資料
+
+    Returns:
+        str: 快取鍵
+    """
+    payload = json.dumps({"template": template_fingerprint, "replacements": replacements}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class OutputCache:
+    """Word/PDF 輸出快取（本機目錄 + 可選 GCS）"""
+
+    def __init__(self, credentials=None):
+        """
+        Args:
+            credentials: 服務帳戶憑證（設定 OUTPUT_CACHE_BUCKET 時使用）
+        """
+        self.credentials = credentials
+        self._bucket = None
+
+    def _gcs_bucket(self):
+        if not OUTPUT_CACHE["BUCKET"]:
+            return None
+        if self._bucket is None:
+            from google.cloud import storage
+            client = storage.Client(credentials=self.credentials, project=self.credentials.project_id)
+            self._bucket = client.bucket(OUTPUT_CACHE["BUCKET"])
+        return self._bucket
+
+    def _local_dir(self, key):
+        return os.path.join(OUTPUT_CACHE["DIR"], key)
+
+    def contains(self, key):
+        """
+        本機是否已有快取（不讀取 GCS，供 /prefetch 快速判斷）
+
+        Args:
+            key (str): 快取鍵
+
+        Returns:
+            bool: 是否命中
+        """
+        pdf_path = os.path.join(self._local_dir(key), PDF_NAME)
+        return os.path.exists(pdf_path) and time.time() - os.path.getmtime(pdf_path) < OUTPUT_CACHE["MAX_AGE_SECONDS"]
+
+    def get(self, key):
+        """
+        讀取快取
+
+        Args:
+            key (str): 快取鍵
+
+        Returns:
+            tuple | None: (docx_bytes, pdf_bytes)，未命中時回傳 None
+        """
+        local_dir = self._local_dir(key)
+        pdf_path = os.path.join(local_dir, PDF_NAME)
+        if self.contains(key):
+            with open(os.path.join(local_dir, DOCX_NAME), 'rb') as f:
+                docx_bytes = f.read()
+            with open(pdf_path, 'rb') as f:
+                pdf_bytes = f.read()
+            metrics.increment("output_cache.local_hits")
+            return docx_bytes, pdf_bytes
+
+        try:
+            bucket = self._gcs_bucket()
+            if bucket is not None:
+                pdf_blob = bucket.blob(f"output-cache/{key}/{PDF_NAME}")
+                if pdf_blob.exists():
+                    docx_bytes = bucket.blob(f"output-cache/{key}/{DOCX_NAME}").download_as_bytes()
+                    pdf_bytes = pdf_blob.download_as_bytes()
+                    self._put_local(key, docx_bytes, pdf_bytes)
+                    metrics.increment("output_cache.gcs_hits")
+                    return docx_bytes, pdf_bytes
+        except Exception as e:
+            logger.warning(f"讀取 GCS 輸出快取失敗: {str(e)}")
+
+        metrics.increment("output_cache.misses")
+        return None
+
+    def _put_local(self, key, docx_bytes, pdf_bytes):
+        local_dir = self._local_dir(key)
+        os.makedirs(local_dir, exist_ok=True)
+        # 先寫 Word 再寫 PDF：get() 以 PDF 是否存在判斷快取完整
+        for name, content in ((DOCX_NAME, docx_bytes), (PDF_NAME, pdf_bytes)):
+            path = os.path.join(local_dir, name)
+            with open(path + ".tmp", 'wb') as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
+
+    def put(self, key, docx_bytes, pdf_bytes):
+        """
+        寫入快取（GCS 寫入失敗不影響主流程）
+
+        Args:
+            key (str): 快取鍵
+            docx_bytes (bytes): 填寫後的 Word
+            pdf_bytes (bytes): 轉換後的 PDF
+        """
+        self._put_local(key, docx_bytes, pdf_bytes)
+
+        try:
+            bucket = self._gcs_bucket()
+            if bucket is not None:
+                bucket.blob(f"output-cache/{key}/{DOCX_NAME}").upload_from_string(
+                    docx_bytes,
+                    content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+                )
+                bucket.blob(f"output-cache/{key}/{PDF_NAME}").upload_from_string(pdf_bytes, content_type='application/pdf')
+        except Exception as e:
+            logger.warning(f"寫入 GCS 輸出快取失敗: {str(e)}")
+
+        metrics.increment("output_cache.writes")
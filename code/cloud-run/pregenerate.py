@@ -0,0 +1,133 @@
+"""
+街頭藝人申請系統 - 預設日期申請文件預先產生
+
+GAS 的 getDefaultDates 固定選擇目標月份的前幾個週六，多數使用者直接接受預設值。
+排程（Cloud Scheduler）在申請時段開放前呼叫 /pregenerate，為每位申請人與目標月份
+先產生預設日期的 Word/PDF 並放入輸出快取；真正的申請送達且內容相同時，
+process_application 只需上傳檔案與更新 Sheets。
+"""
+
+import os
+import time
+import calendar
+import logging
+import tempfile
+from datetime import datetime
+
+import pytz
+
+from config import config
+import record_partition
+
+logger = logging.getLogger(__name__)
+
+# 預先產生設定（需與 GAS CONFIG.PHASE3 一致，可用 Cloud Run 環境變數覆寫）
+PREGENERATE = {
+    "SATURDAY_COUNT": int(os.environ.get("DEFAULT_SATURDAY_COUNT", "3")),
+    # 第一時段申請下 1 個月、第二時段申請下 2 個月，排程時兩者都預先產生
+    "MONTH_OFFSETS": [int(m) for m in os.environ.get("PREGENERATE_MONTH_OFFSETS", "1,2").split(",")],
+}
+
+
+def default_dates(year, month, count=None):
+    """
+    取得預設申請日期（與 GAS getDefaultDates / getSaturdays 相同：前 N 個週六）
+
+    Args:
+        year (int): 年份
+        month (int): 月份（1-12）
+        count (int): 週六數量
+
+    Returns:
+        list: [{"date": 4, "day": "六", "display": "10月4日週六"}, ...]
+    """
+    count = count if count is not None else PREGENERATE["SATURDAY_COUNT"]
+    saturdays = []
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        if calendar.weekday(year, month, day) == calendar.SATURDAY:
+            saturdays.append({"date": day, "day": "六", "display": f"{month}月{day}日週六"})
+    return saturdays[:count] if count > 0 else saturdays
+
+
+def upcoming_target_months(now=None):
+    """
+    取得即將開放申請的目標月份
+
+    Returns:
+        list: [(year, month), ...]
+    """
+    now = now or datetime.now(pytz.timezone('Asia/Taipei'))
+    months = []
+    for offset in PREGENERATE["MONTH_OFFSETS"]:
+        index = now.month - 1 + offset
+        months.append((now.year + index // 12, index % 12 + 1))
+    return months
+
+
+def load_applicants(doc_processor):
+    """
+    從申請記錄取得每位申請人最近一次使用的影片連結
+
+    Returns:
+        list: [{"user_id": str, "video_url": str}, ...]
+    """
+    spreadsheet_id = config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"]
+
+    latest = {}
+    for sheet_name in record_partition.recent_sheet_names():
+        values = record_partition.read_records(doc_processor.sheets_service, spreadsheet_id, sheet_name, columns="A:F")
+        for row in values[1:]:
+            # B. 用戶ID、F. 影片連結；依時間順序讀取，後出現的覆蓋先前的
+            if len(row) > 5 and row[1] and row[5]:
+                latest[row[1]] = row[5]
+
+    return [{"user_id": user_id, "video_url": video_url} for user_id, video_url in latest.items()]
+
+
+def pregenerate(doc_processor, cache, applicants=None, months=None):
+    """
+    為每位申請人與目標月份產生預設日期的申請文件
+
+    Args:
+        doc_processor (DocumentProcessor): 文件處理器
+        cache (OutputCache): 輸出快取
+        applicants (list): 申請人清單，未提供時從申請記錄讀取
+        months (list): [(year, month), ...]，未提供時使用即將開放的月份
+
+    Returns:
+        dict: 執行摘要
+    """
+    started = time.monotonic()
+    applicants = applicants if applicants is not None else load_applicants(doc_processor)
+    months = months or upcoming_target_months()
+
+    summary = {"generated": 0, "already_cached": 0, "failed": 0, "items": []}
+    for applicant in applicants:
+        for year, month in months:
+            app_data = {
+                "year": str(year),
+                "month": str(month),
+                "selected_dates": default_dates(year, month),
+                "video_url": applicant.get("video_url", "")
+            }
+            item = {"user_id": applicant.get("user_id"), "year": year, "month": month}
+
+            try:
+                with tempfile.TemporaryDirectory() as temp_dir:
+                    _, _, cache_hit = doc_processor.render_documents(app_data, temp_dir, cache=cache)
+                item["status"] = "already_cached" if cache_hit else "generated"
+                summary[item["status"]] += 1
+            except Exception as e:
+                logger.error(f"預先產生失敗 {item}: {str(e)}")
+                item["status"] = "failed"
+                item["error"] = str(e)
+                summary["failed"] += 1
+
+            summary["items"].append(item)
+
+    summary["elapsed_seconds"] = round(time.monotonic() - started, 2)
+    logger.info(
+        f"預先產生完成：新產生 {summary['generated']}、已快取 {summary['already_cached']}、"
+        f"失敗 {summary['failed']}，耗時 {summary['elapsed_seconds']} 秒"
+    )
+    return summary
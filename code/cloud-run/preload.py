@@ -0,0 +1,198 @@
+"""
+街頭藝人申請系統 - gunicorn preload 與多 worker 記憶體共享
+
+提高 gunicorn --workers 時，每個 worker 原本都各自下載模板、建立 API 客戶端、
+載入 python-docx/lxml。preload 模式下由 master 先完成一次，worker fork 後直接使用：
+1. Word 模板寫入 /dev/shm 並以唯讀 mmap 對應，所有 worker 共用同一份實體記憶體
+2. Drive / Sheets discovery 文件預先讀入，worker 以 build_from_document 建立客戶端
+3. 預載完成後 gc.freeze()，避免 GC 掃描觸發 copy-on-write
+4. 每個 worker 定期回報 RSS / PSS / 共享記憶體，彙整於 /metrics
+"""
+
+import os
+import gc
+import json
+import mmap
+import time
+import logging
+import threading
+
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+
+logger = logging.getLogger(__name__)
+
+# gunicorn.conf.py 在 preload_app 開啟時設定此環境變數（在 master 載入應用前）
+PRELOAD_IN_MASTER = os.environ.get("STREET_ARTIST_PRELOAD") == "1"
+
+PRELOAD = {
+    "SHM_DIR": os.environ.get("PRELOAD_SHM_DIR", "/dev/shm/street-artist"),
+    "WORKER_REPORT_INTERVAL_SECONDS": int(os.environ.get("WORKER_REPORT_INTERVAL_SECONDS", "30")),
+}
+
+DISCOVERY_SERVICES = [("drive", "v3"), ("sheets", "v4")]
+
+_shared_blobs = {}
+_discovery_docs = {}
+_reporter_pid = None
+
+
+# ===== 共享唯讀資料 =====
+
+def put_shared_blob(name, content):
+    """
+    將資料寫入 /dev/shm 並以唯讀 mmap 對應（fork 後的 worker 共用同一份實體記憶體）
+
+    Args:
+        name (str): 資料名稱
+        content (bytes): 資料內容
+    """
+    os.makedirs(PRELOAD["SHM_DIR"], exist_ok=True)
+    path = os.path.join(PRELOAD["SHM_DIR"], name)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+    with open(path, 'rb') as f:
+        _shared_blobs[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    logger.info(f"共享資料已載入 {path}: {len(content)} bytes")
+
+
+def get_shared_blob(name):
+    """
+    讀取共享資料（回傳 mmap 的唯讀 memoryview，不複製到程序私有記憶體；
+    呼叫端直接寫檔或計算雜湊，需要 bytes 時才自行複製）
+
+    Returns:
+        memoryview | None: 資料內容，未預載時回傳 None
+    """
+    blob = _shared_blobs.get(name)
+    return memoryview(blob) if blob is not None else None
+
+
+# ===== API 客戶端 =====
+
+def load_discovery_docs():
+    """預先讀入 Drive / Sheets 的 discovery 文件（套件內建的靜態文件）"""
+    for service_name, version in DISCOVERY_SERVICES:
+        doc = discovery_cache.get_static_doc(service_name, version)
+        if doc:
+            _discovery_docs[(service_name, version)] = doc
+    logger.info(f"已預載 discovery 文件: {list(_discovery_docs.keys())}")
+
+
+def build_service(service_name, version, credentials):
+    """
+    建立 Google API 客戶端（有預載的 discovery 文件時不需再讀檔解析）
+
+    Returns:
+        googleapiclient.discovery.Resource: API 客戶端
+    """
+    doc = _discovery_docs.get((service_name, version))
+    if doc is not None:
+        return build_from_document(doc, credentials=credentials)
+    return build(service_name, version, credentials=credentials)
+
+
+def preload_shared_assets(doc_processor):
+    """
+    在 gunicorn master 預載所有 worker 共用的資料（fork 前呼叫）
+
+    Args:
+        doc_processor (DocumentProcessor): 用於下載 Word 模板
+    """
+    started = time.monotonic()
+    load_discovery_docs()
+    put_shared_blob("word_template", doc_processor.get_template_bytes())
+
+    # 預載期間建立的物件不再被 GC 掃描，避免 worker 因 GC 寫入而複製記憶體頁
+    gc.collect()
+    gc.freeze()
+    logger.info(f"master 預載完成，耗時 {time.monotonic() - started:.2f} 秒")
+
+
+# ===== 記憶體回報 =====
+
+def read_memory_usage(pid="self"):
+    """
+    讀取程序的記憶體用量（/proc/<pid>/smaps_rollup，單位 KB）
+
+    Returns:
+        dict: rss_kb、pss_kb、shared_kb、private_kb
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _worker_report_dir():
+    return os.path.join(PRELOAD["SHM_DIR"], "workers")
+
+
+def _write_worker_report():
+    os.makedirs(_worker_report_dir(), exist_ok=True)
+    report = {"pid": os.getpid(), "updated_at": time.time(), **read_memory_usage()}
+    path = os.path.join(_worker_report_dir(), f"{os.getpid()}.json")
+    with open(path + ".tmp", 'w') as f:
+        json.dump(report, f)
+    os.replace(path + ".tmp", path)
+
+
+def start_worker_reporter():
+    """啟動本 worker 的記憶體回報執行緒（每個程序只啟動一次）"""
+    global _reporter_pid
+    if _reporter_pid == os.getpid():
+        return
+    _reporter_pid = os.getpid()
+
+    def report_loop():
+        while True:
+            try:
+                _write_worker_report()
+            except Exception as e:
+                logger.warning(f"寫入 worker 記憶體回報失敗: {str(e)}")
+            time.sleep(PRELOAD["WORKER_REPORT_INTERVAL_SECONDS"])
+
+    threading.Thread(target=report_loop, name="worker-memory-reporter", daemon=True).start()
+
+
+def worker_memory_reports():
+    """
+    彙整所有存活 worker 的記憶體回報（/metrics gauge）
+
+    Returns:
+        dict: {"workers": [...], "total_rss_kb", "total_pss_kb"}
+    """
+    workers = []
+    report_dir = _worker_report_dir()
+    if os.path.isdir(report_dir):
+        for file_name in os.listdir(report_dir):
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(report_dir, file_name)
+            try:
+                with open(path) as f:
+                    report = json.load(f)
+                os.kill(report["pid"], 0)
+                workers.append(report)
+            except ProcessLookupError:
+                # worker 已結束，移除過期回報
+                os.remove(path)
+            except Exception:
+                continue
+
+    return {
+        "workers": sorted(workers, key=lambda w: w["pid"]),
+        "total_rss_kb": sum(w["rss_kb"] for w in workers),
+        # PSS 將共享頁依共用程序數分攤，加總即為實際佔用
+        "total_pss_kb": sum(w["pss_kb"] for w in workers),
+    }
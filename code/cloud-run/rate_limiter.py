@@ -0,0 +1,164 @@
+"""
+街頭藝人申請系統 - Google API 用戶端限流
+
+Sheets 對服務帳戶約有每分鐘 60 次的讀取/寫入配額，每筆申請至少 4 次 Sheets 呼叫，
+批次處理十幾筆申請就會觸發 429。
+
+此模組以程序共用的 token bucket 在送出前先限流，取不到 token 時短暫等待而不是失敗。
+每個配額（Sheets 讀取、Sheets 寫入、Drive）各自一個 bucket，狀態輸出到 /metrics。
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 各配額每分鐘請求數（可用 Cloud Run 環境變數覆寫）
+RATE_LIMITS = {
+    "sheets_read": int(os.environ.get("RATE_LIMIT_SHEETS_READ_PER_MINUTE", "60")),
+    "sheets_write": int(os.environ.get("RATE_LIMIT_SHEETS_WRITE_PER_MINUTE", "60")),
+    "drive": int(os.environ.get("RATE_LIMIT_DRIVE_PER_MINUTE", "300")),
+}
+
+# 取 token 的最長等待秒數，超過後仍送出請求（交由重試層處理 429）
+MAX_WAIT_SECONDS = float(os.environ.get("RATE_LIMIT_MAX_WAIT_SECONDS", "30"))
+
+
+class TokenBucket:
+    """執行緒安全的 token bucket"""
+
+    def __init__(self, name, rate_per_minute, capacity=None):
+        """
+        Args:
+            name (str): 配額名稱
+            rate_per_minute (int): 每分鐘補充的 token 數
+            capacity (int): bucket 容量（允許的突發量），預設為每分鐘量的 1/6
+        """
+        self.name = name
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1, rate_per_minute // 6)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.waits = 0
+        self.total_wait_seconds = 0.0
+        self.wait_timeouts = 0
+        self._lock = threading.Lock()
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def _try_take(self):
+        """
+        嘗試取出一個 token
+
+        Returns:
+            float: 0 表示已取得；否則為預估需等待的秒數
+        """
+        with self._lock:
+            self._refill_locked()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate_per_second
+
+    def _record_wait(self, wait_seconds, timed_out):
+        with self._lock:
+            if timed_out:
+                self.wait_timeouts += 1
+            else:
+                self.waits += 1
+                self.total_wait_seconds += wait_seconds
+
+    def acquire(self, max_wait=MAX_WAIT_SECONDS):
+        """
+        取得一個 token，不足時等待
+
+        Args:
+            max_wait (float): 最長等待秒數
+
+        Returns:
+            bool: 是否在時限內取得 token
+        """
+        started = time.monotonic()
+        while True:
+            sleep_seconds = self._try_take()
+            elapsed = time.monotonic() - started
+            if sleep_seconds == 0:
+                if elapsed > 0.001:
+                    self._record_wait(elapsed, timed_out=False)
+                return True
+
+            if elapsed + sleep_seconds > max_wait:
+                self._record_wait(elapsed, timed_out=True)
+                logger.warning(f"{self.name} 限流等待超過 {max_wait} 秒，直接送出請求")
+                return False
+
+            logger.info(f"{self.name} 配額暫時用完，等待 {sleep_seconds:.1f} 秒")
+            time.sleep(sleep_seconds)
+
+    async def acquire_async(self, max_wait=MAX_WAIT_SECONDS):
+        """acquire 的 asyncio 版本（等待時不佔用執行緒）"""
+        started = time.monotonic()
+        while True:
+            sleep_seconds = self._try_take()
+            elapsed = time.monotonic() - started
+            if sleep_seconds == 0:
+                if elapsed > 0.001:
+                    self._record_wait(elapsed, timed_out=False)
+                return True
+
+            if elapsed + sleep_seconds > max_wait:
+                self._record_wait(elapsed, timed_out=True)
+                logger.warning(f"{self.name} 限流等待超過 {max_wait} 秒，直接送出請求")
+                return False
+
+            await asyncio.sleep(sleep_seconds)
+
+    def status(self):
+        with self._lock:
+            self._refill_locked()
+            return {
+                "tokens": round(self.tokens, 2),
+                "capacity": self.capacity,
+                "rate_per_minute": round(self.rate_per_second * 60),
+                "waits": self.waits,
+                "total_wait_seconds": round(self.total_wait_seconds, 2),
+                "wait_timeouts": self.wait_timeouts,
+            }
+
+
+_buckets = {}
+for _name, _rate in RATE_LIMITS.items():
+    _buckets[_name] = TokenBucket(_name, _rate)
+    metrics.register_gauge(f"rate_limit.{_name}", _buckets[_name].status)
+
+
+def acquire(name):
+    """
+    取得指定配額的 token（未設定的配額不限流）
+
+    Args:
+        name (str): 配額名稱（sheets_read、sheets_write、drive）
+
+    Returns:
+        bool: 是否在時限內取得 token
+    """
+    bucket = _buckets.get(name)
+    if bucket is None:
+        return True
+    return bucket.acquire()
+
+
+async def acquire_async(name):
+    """acquire 的 asyncio 版本"""
+    bucket = _buckets.get(name)
+    if bucket is None:
+        return True
+    return await bucket.acquire_async()
@@ -0,0 +1,634 @@
+"""
+街頭藝人申請系統 - 申請記錄按月分頁
+
+申請記錄表單一工作表會隨時間無限成長，update_sheets_status 每次讀取 A:K 的資料量也跟著變大。
+開啟 RECORD_PARTITION_BY_MONTH 後：
+- GAS 將新申請寫入「{SHEET_NAME}_YYYYMM」分頁（月份取自時間戳記 YYYYMMDD-HHmmss）
+- Cloud Run 依時間戳記直接讀取對應分頁，找不到時再回退到原工作表（分頁前的舊記錄）
+- /archive-records 將原工作表中已結束（完成/失敗）的記錄搬到各月分頁，原工作表只剩進行中的記錄
+
+每次讀取的資料量只與當月申請數有關，不隨歷史累積成長。
+
+兩端的開關必須同時開啟：Cloud Run 的 RECORD_PARTITION_BY_MONTH=true 與 GAS Config.js 的
+CONFIG.PHASE4.GOOGLE_SHEETS.PARTITION_BY_MONTH: true。只開 Cloud Run 端時新記錄仍寫入原工作表，
+每次更新都要先讀空的月分頁再回退；只開 GAS 端時 Cloud Run 讀不到月分頁的記錄。
+
+封存以 deleteDimension 刪除列會讓其他列的列號位移，因此 GAS 新增記錄時以 developer metadata
+（record_key = 時間戳記|用戶ID）標記該列，狀態更新依標記寫入（update_status_by_key），不使用列號；
+沒有標記的舊記錄才改以搜尋列號更新。封存時同樣依標記找出原工作表的列再刪除，並為搬到月分頁的列重新標記。
+
+/process-application 與批次處理可能同時處理同一筆記錄，開始處理前以 claim_record 取得處理權：
+試算表範圍的 developer metadata（record_claim）以記錄決定 metadataId，而 metadataId 在試算表內
+必須唯一，重複建立會失敗，等同對處理權做 compare-and-set。逾時的處理權以「刪除舊標記 + 建立新標記」
+的單一 batchUpdate 接手（全部成功或全部失敗），同時接手的程序只有一個會成功。
+持有者處理中每 CLAIM_HEARTBEAT_SECONDS 更新一次標記時間，處理結束（成功或失敗）即釋放；
+instance 中斷時心跳停止，CLAIM_TTL_SECONDS 後 GAS 重試或批次處理即可接手，由檢查點從第一個未完成的階段繼續。
+"""
+
+import os
+import re
+import time
+import uuid
+import socket
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+import pytz
+from googleapiclient.errors import HttpError
+
+from config import config
+from metrics import metrics
+import resilience
+
+logger = logging.getLogger(__name__)
+
+# 分頁設定（需與 GAS CONFIG.PHASE4.GOOGLE_SHEETS.PARTITION_BY_MONTH 一致）
+RECORD_PARTITION = {
+    "ENABLED": os.environ.get("RECORD_PARTITION_BY_MONTH", "false").lower() == "true",
+    # 已結束的狀態才會被搬移，處理中的記錄留在原工作表
+    "ARCHIVE_STATUSES": ["完成", "失敗"],
+    # 處理權心跳間隔：持有者處理中定期更新標記時間
+    "CLAIM_HEARTBEAT_SECONDS": int(os.environ.get("RECORD_CLAIM_HEARTBEAT_SECONDS", "20")),
+    # 超過此時間沒有心跳表示持有者已中斷（instance 當機或被終止），重試或批次處理可以接手
+    "CLAIM_TTL_SECONDS": int(os.environ.get("RECORD_CLAIM_TTL_SECONDS", "90")),
+    # 處理權標記保留時間（試算表範圍的 metadata 有總字數上限，過期標記由批次處理清除）
+    "CLAIM_RETENTION_SECONDS": int(os.environ.get("RECORD_CLAIM_RETENTION_SECONDS", str(7 * 24 * 3600))),
+}
+
+# 申請記錄列的 developer metadata（GAS tagApplicationRow 建立，隨列移動）
+RECORD_KEY_METADATA = "record_key"
+
+# 申請記錄處理權的 developer metadata（試算表範圍，值為 時間戳記|用戶ID|持有者|最後心跳時間）
+RECORD_CLAIM_METADATA = "record_claim"
+
+_TIMESTAMP_PATTERN = re.compile(r"^(\d{4})(\d{2})\d{2}-\d{6}$")
+
+
+def partition_name(base_sheet_name, timestamp):
+    """
+    取得時間戳記對應的月分頁名稱
+
+    Args:
+        base_sheet_name (str): 原工作表名稱
+        timestamp (str): YYYYMMDD-HHmmss
+
+    Returns:
+        str | None: 分頁名稱，時間戳記格式不符時回傳 None
+    """
+    match = _TIMESTAMP_PATTERN.match(timestamp or "")
+    if not match:
+        return None
+    return f"{base_sheet_name}_{match.group(1)}{match.group(2)}"
+
+
+def candidate_sheet_names(timestamp=None, base_sheet_name=None):
+    """
+    依搜尋順序列出可能存放記錄的工作表
+
+    Args:
+        timestamp (str): 申請時間戳記（未提供時使用台灣時間的當月分頁）
+        base_sheet_name (str): 原工作表名稱
+
+    Returns:
+        list: 工作表名稱（分頁優先，原工作表最後）
+    """
+    base_sheet_name = base_sheet_name or config.GOOGLE_SHEETS["SHEET_NAME"]
+    if not RECORD_PARTITION["ENABLED"]:
+        return [base_sheet_name]
+
+    if not timestamp:
+        timestamp = datetime.now(pytz.timezone('Asia/Taipei')).strftime("%Y%m%d-%H%M%S")
+
+    partition = partition_name(base_sheet_name, timestamp)
+    return [partition, base_sheet_name] if partition else [base_sheet_name]
+
+
+def recent_sheet_names(months=2, base_sheet_name=None):
+    """
+    列出原工作表與最近幾個月的分頁（依時間先後，供需要近期歷史的讀取使用）
+
+    Args:
+        months (int): 包含當月在內的月數
+
+    Returns:
+        list: 工作表名稱
+    """
+    base_sheet_name = base_sheet_name or config.GOOGLE_SHEETS["SHEET_NAME"]
+    if not RECORD_PARTITION["ENABLED"]:
+        return [base_sheet_name]
+
+    now = datetime.now(pytz.timezone('Asia/Taipei'))
+    names = [base_sheet_name]
+    for offset in range(months - 1, -1, -1):
+        index = now.year * 12 + now.month - 1 - offset
+        names.append(f"{base_sheet_name}_{index // 12:04d}{index % 12 + 1:02d}")
+    return names
+
+
+def record_key_filter(user_id, timestamp):
+    """
+    依 record_key 標記找到申請記錄列的 DataFilter
+
+    Returns:
+        dict: Sheets API DataFilter
+    """
+    return {"developerMetadataLookup": {
+        "locationType": "ROW",
+        "metadataKey": RECORD_KEY_METADATA,
+        "metadataValue": f"{timestamp}|{user_id}",
+    }}
+
+
+def status_update_by_key(user_id, timestamp, status_values):
+    """
+    依標記寫入狀態欄位的 DataFilterValueRange（A:F 為 None，Sheets 不變更這些儲存格）
+
+    Args:
+        status_values (list): G:K 欄位的值
+
+    Returns:
+        dict: values.batchUpdateByDataFilter 的 data 項目
+    """
+    return {
+        "dataFilter": record_key_filter(user_id, timestamp),
+        "majorDimension": "ROWS",
+        "values": [[None] * 6 + list(status_values)],
+    }
+
+
+def update_status_by_key(sheets_service, spreadsheet_id, user_id, timestamp, status_values):
+    """
+    依 record_key 標記更新狀態（列號位移時仍寫入正確的列）
+
+    Args:
+        sheets_service: Sheets 客戶端
+        spreadsheet_id (str): 試算表 ID
+        user_id (str): 用戶 ID
+        timestamp (str): 申請時間戳記
+        status_values (list): G:K 欄位的值
+
+    Returns:
+        bool: 是否找到有標記的列（False 時呼叫端改以列號更新）
+    """
+    if not timestamp:
+        return False
+    result = resilience.execute(sheets_service.spreadsheets().values().batchUpdateByDataFilter(
+        spreadsheetId=spreadsheet_id,
+        body={
+            "valueInputOption": "USER_ENTERED",
+            "data": [status_update_by_key(user_id, timestamp, status_values)]
+        }
+    ), "sheets", quota="sheets_write")
+    return result.get("totalUpdatedRows", 0) > 0
+
+
+def claim_metadata_id(user_id, timestamp):
+    """處理權標記的 metadataId（由記錄決定，1 ~ 2^31-1）"""
+    digest = hashlib.sha256(f"{timestamp}|{user_id}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % 0x7fffffff + 1
+
+
+def _claim_value(user_id, timestamp, owner, claimed_at):
+    return f"{timestamp}|{user_id}|{owner}|{int(claimed_at)}"
+
+
+def _claim_request(user_id, timestamp, value):
+    return {"createDeveloperMetadata": {"developerMetadata": {
+        "metadataId": claim_metadata_id(user_id, timestamp),
+        "metadataKey": RECORD_CLAIM_METADATA,
+        "metadataValue": value,
+        "location": {"spreadsheet": True},
+        "visibility": "DOCUMENT",
+    }}}
+
+
+def _claim_filter(user_id, timestamp, value):
+    return {"developerMetadataLookup": {"metadataId": claim_metadata_id(user_id, timestamp), "metadataValue": value}}
+
+
+def _claimed_at(metadata_value):
+    try:
+        return int(metadata_value.rsplit("|", 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def claim_record(sheets_service, spreadsheet_id, user_id, timestamp, owner):
+    """
+    取得申請記錄的處理權（compare-and-set，同一時間只有一個程序取得）
+
+    Args:
+        sheets_service: Sheets 客戶端
+        spreadsheet_id (str): 試算表 ID
+        user_id (str): 用戶 ID
+        timestamp (str): 申請時間戳記
+        owner (str): 持有者識別（每次取得不同）
+
+    Returns:
+        str | None: 取得時回傳標記值（心跳與釋放時使用），其他程序持有中回傳 None
+    """
+    metadata_id = claim_metadata_id(user_id, timestamp)
+    value = _claim_value(user_id, timestamp, owner, time.time())
+    try:
+        resilience.execute(sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": [_claim_request(user_id, timestamp, value)]}
+        ), "sheets", quota="sheets_write", idempotent=False)
+        return value
+    except HttpError as e:
+        # 400：metadataId 已存在
+        if e.resp.status != 400:
+            raise
+
+    try:
+        existing = resilience.execute(sheets_service.spreadsheets().developerMetadata().get(
+            spreadsheetId=spreadsheet_id,
+            metadataId=metadata_id
+        ), "sheets", quota="sheets_read")
+    except HttpError as e:
+        # 標記剛被釋放：交給下一次處理
+        if e.resp.status == 404:
+            return None
+        raise
+
+    current = existing.get("metadataValue", "")
+    if existing.get("metadataKey") != RECORD_CLAIM_METADATA or not current.startswith(f"{timestamp}|{user_id}|"):
+        logger.warning(f"處理權標記 {metadata_id} 屬於其他記錄（{current}），略過 {timestamp}")
+        return None
+    # 持有者仍在處理時會持續更新心跳；超過 CLAIM_TTL_SECONDS 沒有更新表示持有者已中斷
+    if time.time() - _claimed_at(current) < RECORD_PARTITION["CLAIM_TTL_SECONDS"]:
+        return None
+
+    # 刪除舊標記與建立新標記在同一個 batchUpdate，其他程序已接手時整批失敗
+    try:
+        resilience.execute(sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": [
+                {"deleteDeveloperMetadata": {"dataFilter": _claim_filter(user_id, timestamp, current)}},
+                _claim_request(user_id, timestamp, value),
+            ]}
+        ), "sheets", quota="sheets_write", idempotent=False)
+    except HttpError as e:
+        if e.resp.status == 400:
+            return None
+        raise
+    metrics.increment("record_claim.takeovers")
+    logger.info(f"接手已中斷的處理權: {timestamp} {user_id}（{current}）")
+    return value
+
+
+def release_claim(sheets_service, spreadsheet_id, user_id, timestamp, value):
+    """
+    釋放處理權（只刪除自己的標記；已被其他程序接手時不影響）
+    """
+    resilience.execute(sheets_service.spreadsheets().batchUpdate(
+        spreadsheetId=spreadsheet_id,
+        body={"requests": [{"deleteDeveloperMetadata": {"dataFilter": _claim_filter(user_id, timestamp, value)}}]}
+    ), "sheets", quota="sheets_write")
+
+
+class RecordClaims:
+    """本程序持有的處理權：取得、背景心跳與釋放"""
+
+    def __init__(self, build_sheets_service):
+        """
+        Args:
+            build_sheets_service (callable): 建立心跳執行緒專用的 Sheets 客戶端
+        """
+        self.build_sheets_service = build_sheets_service
+        self._held = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    @staticmethod
+    def _spreadsheet_id():
+        return config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"]
+
+    def claim(self, sheets_service, user_id, timestamp):
+        """
+        取得處理權並開始心跳
+
+        Returns:
+            bool: 是否取得處理權
+        """
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        value = claim_record(sheets_service, self._spreadsheet_id(), user_id, timestamp, owner)
+        if value is None:
+            return False
+        with self._lock:
+            self._held[(user_id, timestamp)] = value
+        self._ensure_thread()
+        return True
+
+    def release(self, sheets_service, user_id, timestamp):
+        """停止心跳並釋放處理權（成功或失敗都呼叫，重試與重新送出可以立即取得）"""
+        # 持有鎖期間心跳不會改變標記值，刪除條件與 Sheets 上的值一致
+        with self._lock:
+            value = self._held.pop((user_id, timestamp), None)
+            if value is not None:
+                release_claim(sheets_service, self._spreadsheet_id(), user_id, timestamp, value)
+
+    def _beat(self, sheets_service):
+        with self._lock:
+            for (user_id, timestamp), value in list(self._held.items()):
+                renewed = _claim_value(user_id, timestamp, value.split("|")[2], time.time())
+                try:
+                    result = resilience.execute(sheets_service.spreadsheets().batchUpdate(
+                        spreadsheetId=self._spreadsheet_id(),
+                        body={"requests": [{"updateDeveloperMetadata": {
+                            "dataFilters": [_claim_filter(user_id, timestamp, value)],
+                            "developerMetadata": {"metadataValue": renewed},
+                            "fields": "metadataValue",
+                        }}]}
+                    ), "sheets", quota="sheets_write")
+                except Exception as e:
+                    logger.warning(f"處理權心跳失敗 {timestamp}: {str(e)}")
+                    continue
+                updated = result.get("replies", [{}])[0].get("updateDeveloperMetadata", {}).get("developerMetadata")
+                if updated:
+                    self._held[(user_id, timestamp)] = renewed
+                else:
+                    # 心跳中斷太久，已被其他程序接手
+                    logger.warning(f"處理權已被接手: {timestamp} {user_id}")
+                    metrics.increment("record_claim.lost")
+                    del self._held[(user_id, timestamp)]
+
+    def _heartbeat_loop(self):
+        sheets_service = self.build_sheets_service()
+        while True:
+            time.sleep(RECORD_PARTITION["CLAIM_HEARTBEAT_SECONDS"])
+            self._beat(sheets_service)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread_pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self._heartbeat_loop, name="record-claim-heartbeat", daemon=True)
+            self._thread.start()
+
+    def status(self):
+        """
+        持有中的處理權（/metrics gauge）
+
+        Returns:
+            dict: {"held"}
+        """
+        with self._lock:
+            return {"held": len(self._held)}
+
+
+def prune_claims(sheets_service, spreadsheet_id):
+    """
+    刪除超過保留時間的處理權標記
+
+    Returns:
+        int: 刪除的標記數
+    """
+    result = resilience.execute(sheets_service.spreadsheets().developerMetadata().search(
+        spreadsheetId=spreadsheet_id,
+        body={"dataFilters": [{"developerMetadataLookup": {
+            "locationType": "SPREADSHEET",
+            "metadataKey": RECORD_CLAIM_METADATA,
+        }}]}
+    ), "sheets", quota="sheets_read")
+
+    cutoff = time.time() - RECORD_PARTITION["CLAIM_RETENTION_SECONDS"]
+    expired = [
+        matched["developerMetadata"]["metadataId"]
+        for matched in result.get("matchedDeveloperMetadata", [])
+        if _claimed_at(matched["developerMetadata"].get("metadataValue", "")) < cutoff
+    ]
+    if not expired:
+        return 0
+
+    resilience.execute(sheets_service.spreadsheets().batchUpdate(
+        spreadsheetId=spreadsheet_id,
+        body={"requests": [
+            {"deleteDeveloperMetadata": {"dataFilter": {"developerMetadataLookup": {"metadataId": metadata_id}}}}
+            for metadata_id in expired
+        ]}
+    ), "sheets", quota="sheets_write")
+    logger.info(f"已清除 {len(expired)} 個過期的處理權標記")
+    return len(expired)
+
+
+def read_records(sheets_service, spreadsheet_id, sheet_name, columns="A:K"):
+    """
+    讀取工作表資料（分頁尚未建立時回傳空清單）
+
+    Returns:
+        list: 儲存格資料
+    """
+    try:
+        result = resilience.execute(sheets_service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=f"{sheet_name}!{columns}"
+        ), "sheets", quota="sheets_read")
+    except HttpError as e:
+        # 不存在的工作表：Sheets API 回傳 400 Unable to parse range
+        if e.resp.status == 400:
+            logger.info(f"工作表 {sheet_name} 不存在，略過")
+            return []
+        raise
+
+    return result.get('values', [])
+
+
+def _record_key_value(row):
+    return f"{row[0]}|{row[1]}" if len(row) > 1 and row[0] and row[1] else None
+
+
+def _tag_requests(sheet_id, first_index, rows):
+    """為附加到分頁的列建立 record_key 標記（封存後仍可依標記更新狀態）"""
+    requests = []
+    for offset, row in enumerate(rows):
+        key = _record_key_value(row)
+        if key is None:
+            continue
+        requests.append({"createDeveloperMetadata": {"developerMetadata": {
+            "metadataKey": RECORD_KEY_METADATA,
+            "metadataValue": key,
+            "location": {"dimensionRange": {
+                "sheetId": sheet_id,
+                "dimension": "ROWS",
+                "startIndex": first_index + offset,
+                "endIndex": first_index + offset + 1,
+            }},
+            "visibility": "DOCUMENT",
+        }}})
+    return requests
+
+
+def _locate_rows_to_delete(sheets_service, spreadsheet_id, base_sheet_name, base_sheet_id, moved):
+    """
+    找出原工作表中要刪除的列（0 起算）
+
+    有標記的列依 record_key 的目前位置；沒有標記的舊記錄確認原列號的時間戳記與用戶 ID 仍相符才刪除。
+
+    Args:
+        moved (list): [(讀取時的列索引, 列資料)]
+
+    Returns:
+        list: 列索引
+    """
+    keys = {key for _, row in moved if (key := _record_key_value(row))}
+    result = resilience.execute(sheets_service.spreadsheets().developerMetadata().search(
+        spreadsheetId=spreadsheet_id,
+        body={"dataFilters": [
+            {"developerMetadataLookup": {"locationType": "ROW", "metadataKey": RECORD_KEY_METADATA, "metadataValue": key}}
+            for key in keys
+        ]}
+    ), "sheets", quota="sheets_read") if keys else {}
+
+    indexes = set()
+    tagged = set()
+    for matched in result.get("matchedDeveloperMetadata", []):
+        metadata = matched["developerMetadata"]
+        dimension_range = metadata.get("location", {}).get("dimensionRange", {})
+        # 附加到月分頁的複本也有相同標記，只取原工作表的列
+        if dimension_range.get("sheetId") == base_sheet_id:
+            indexes.add(dimension_range["startIndex"])
+            tagged.add(metadata.get("metadataValue"))
+
+    untagged = [(index, row) for index, row in moved if _record_key_value(row) not in tagged]
+    if untagged:
+        verify = resilience.execute(sheets_service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[f"{base_sheet_name}!A{index + 1}:B{index + 1}" for index, _ in untagged]
+        ), "sheets", quota="sheets_read")
+        for (index, row), value_range in zip(untagged, verify.get("valueRanges", [])):
+            values = value_range.get("values", [[]])
+            if values and values[0][:2] == row[:2]:
+                indexes.add(index)
+            else:
+                logger.warning(f"封存：第 {index + 1} 列已變動，略過刪除 {row[:2]}")
+    return sorted(indexes, reverse=True)
+
+
+def archive_records(sheets_service, spreadsheet_id=None, base_sheet_name=None):
+    """
+    將原工作表中已結束的記錄搬到各月分頁
+
+    同一時間只允許一個封存執行（以處理權標記作為試算表範圍的鎖）：重疊執行（例如 Cloud Scheduler 重試）
+    會重複附加，並以位移後的列號刪除到進行中的記錄。
+
+    Returns:
+        dict: {"moved": int, "partitions": {分頁名稱: 筆數}, "skipped": int}，其他封存執行中時另有 "locked": True
+    """
+    spreadsheet_id = spreadsheet_id or config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"]
+    base_sheet_name = base_sheet_name or config.GOOGLE_SHEETS["SHEET_NAME"]
+
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    lock = claim_record(sheets_service, spreadsheet_id, "archive", base_sheet_name, owner)
+    if lock is None:
+        logger.info("其他封存執行中，略過")
+        return {"moved": 0, "partitions": {}, "skipped": 0, "locked": True}
+    try:
+        return _archive_records(sheets_service, spreadsheet_id, base_sheet_name)
+    finally:
+        try:
+            release_claim(sheets_service, spreadsheet_id, "archive", base_sheet_name, lock)
+        except Exception as e:
+            logger.warning(f"釋放封存鎖失敗（{RECORD_PARTITION['CLAIM_TTL_SECONDS']} 秒後逾時）: {str(e)}")
+
+
+def _archive_records(sheets_service, spreadsheet_id, base_sheet_name):
+    values = read_records(sheets_service, spreadsheet_id, base_sheet_name)
+    if len(values) <= 1:
+        return {"moved": 0, "partitions": {}, "skipped": 0}
+
+    header = values[0]
+    by_partition = {}
+    moved = []
+    skipped = 0
+    for index, row in enumerate(values[1:], start=1):
+        status = row[6] if len(row) > 6 else ""
+        partition = partition_name(base_sheet_name, row[0] if row else "")
+        if partition is None or status not in RECORD_PARTITION["ARCHIVE_STATUSES"]:
+            skipped += 1
+            continue
+        by_partition.setdefault(partition, []).append(row)
+        moved.append((index, row))
+
+    if not moved:
+        return {"moved": 0, "partitions": {}, "skipped": skipped}
+
+    spreadsheet = resilience.execute(sheets_service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields="sheets.properties(sheetId,title)"
+    ), "sheets", quota="sheets_read")
+    sheet_ids = {s["properties"]["title"]: s["properties"]["sheetId"] for s in spreadsheet.get("sheets", [])}
+
+    # 1. 建立缺少的月分頁並寫入標題列
+    missing = [name for name in by_partition if name not in sheet_ids]
+    if missing:
+        result = resilience.execute(sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": [{"addSheet": {"properties": {"title": name}}} for name in missing]}
+        ), "sheets", quota="sheets_write", idempotent=False)
+        for reply in result.get("replies", []):
+            properties = reply["addSheet"]["properties"]
+            sheet_ids[properties["title"]] = properties["sheetId"]
+        resilience.execute(sheets_service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={
+                "valueInputOption": "RAW",
+                "data": [{"range": f"{name}!A1", "values": [header]} for name in missing]
+            }
+        ), "sheets", quota="sheets_write")
+
+    # 2. 先附加到月分頁並標記，再從原工作表刪除（中途失敗只會留下重複記錄，不會遺失）
+    tag_requests = []
+    for name, rows in sorted(by_partition.items()):
+        result = resilience.execute(sheets_service.spreadsheets().values().append(
+            spreadsheetId=spreadsheet_id,
+            range=f"{name}!A:K",
+            valueInputOption="RAW",
+            insertDataOption="INSERT_ROWS",
+            body={"values": rows}
+        ), "sheets", quota="sheets_write", idempotent=False)
+        _, first_row = _parse_range_start(result["updates"]["updatedRange"])
+        tag_requests.extend(_tag_requests(sheet_ids[name], first_row - 1, rows))
+    if tag_requests:
+        resilience.execute(sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": tag_requests}
+        ), "sheets", quota="sheets_write", idempotent=False)
+
+    # 3. 依標記的目前位置刪除，由下往上刪除避免列號位移
+    base_sheet_id = sheet_ids[base_sheet_name]
+    delete_requests = [
+        {"deleteDimension": {"range": {
+            "sheetId": base_sheet_id,
+            "dimension": "ROWS",
+            "startIndex": index,
+            "endIndex": index + 1
+        }}}
+        for index in _locate_rows_to_delete(sheets_service, spreadsheet_id, base_sheet_name, base_sheet_id, moved)
+    ]
+    if delete_requests:
+        resilience.execute(sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"requests": delete_requests}
+        ), "sheets", quota="sheets_write", idempotent=False)
+
+    partitions = {name: len(rows) for name, rows in by_partition.items()}
+    logger.info(f"申請記錄封存完成：搬移 {len(moved)} 筆到 {partitions}，刪除 {len(delete_requests)} 列，保留 {skipped} 筆")
+    return {"moved": len(moved), "partitions": partitions, "skipped": skipped}
+
+
+def _parse_range_start(a1_range):
+    """
+    解析 A1 範圍的分頁與起始列（例如 'Sheet 1'!A5:K7 → ('Sheet 1', 5)）
+
+    Returns:
+        tuple: (sheet_name, first_row)
+    """
+    sheet_part, cells = a1_range.rsplit("!", 1)
+    if sheet_part.startswith("'") and sheet_part.endswith("'"):
+        sheet_part = sheet_part[1:-1].replace("''", "'")
+    return sheet_part, int(re.search(r"\d+", cells).group())
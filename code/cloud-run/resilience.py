@@ -0,0 +1,378 @@
+"""
+街頭藝人申請系統 - Google API 重試與斷路器
+
+所有 Drive / Sheets 的 execute() 都透過此模組呼叫：
+1. 暫時性錯誤（429、5xx、配額錯誤、連線逾時）以有上限的指數退避 + jitter 重試
+2. 配額錯誤優先採用 Retry-After，否則至少等待 QUOTA_MIN_DELAY_SECONDS
+3. 每個請求有重試預算，避免單一申請在服務中斷時無限重試
+4. 每個 API 一個斷路器，連續失敗後直接快速失敗，冷卻後只放行一個試探請求；
+   配額錯誤代表 API 正常運作，不計入斷路器
+5. 每次送出（含重試）前先向 rate_limiter 取得對應配額的 token
+6. 非冪等請求（建立檔案、附加列）逾時或 5xx 後可能已經生效，只在配額錯誤（確定未執行）時重試
+7. 批次請求中個別失敗的部分只重送失敗的部分（execute_batch）
+"""
+
+import os
+import time
+import json
+import random
+import socket
+import asyncio
+import logging
+import threading
+import contextvars
+
+from googleapiclient.errors import HttpError
+
+from metrics import metrics
+import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# 重試與斷路器設定（可用 Cloud Run 環境變數覆寫）
+RESILIENCE = {
+    "MAX_ATTEMPTS": int(os.environ.get("GOOGLE_API_MAX_ATTEMPTS", "5")),
+    "BASE_DELAY_SECONDS": float(os.environ.get("GOOGLE_API_BASE_DELAY_SECONDS", "0.5")),
+    "MAX_DELAY_SECONDS": float(os.environ.get("GOOGLE_API_MAX_DELAY_SECONDS", "16")),
+    "QUOTA_MIN_DELAY_SECONDS": float(os.environ.get("GOOGLE_API_QUOTA_MIN_DELAY_SECONDS", "5")),
+    "REQUEST_RETRY_BUDGET": int(os.environ.get("GOOGLE_API_REQUEST_RETRY_BUDGET", "8")),
+    "BREAKER_FAILURE_THRESHOLD": int(os.environ.get("GOOGLE_API_BREAKER_FAILURE_THRESHOLD", "5")),
+    "BREAKER_RESET_SECONDS": float(os.environ.get("GOOGLE_API_BREAKER_RESET_SECONDS", "30")),
+}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+QUOTA_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded", "RESOURCE_EXHAUSTED"}
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，請求直接失敗"""
+
+
+class CircuitBreaker:
+    """單一 API 的斷路器（closed → open → half_open → closed）"""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0
+        self.probe_started_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        是否允許送出請求
+
+        Returns:
+            bool: open 狀態且冷卻未結束，或 half_open 狀態已有試探請求進行中時回傳 False
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                if now - self.opened_at < RESILIENCE["BREAKER_RESET_SECONDS"]:
+                    return False
+                self.state = "half_open"
+                logger.info(f"斷路器 {self.name} 進入 half_open，放行試探請求")
+            if self.state == "half_open":
+                # 同時只放行一個試探請求（試探請求超過冷卻時間仍無結果時改放行下一個）
+                if self.probe_started_at is not None and now - self.probe_started_at < RESILIENCE["BREAKER_RESET_SECONDS"]:
+                    return False
+                self.probe_started_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"斷路器 {self.name} 已恢復（closed）")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.probe_started_at = None
+
+    def release_probe(self):
+        """試探請求結束但無法判斷 API 狀態（配額錯誤、程式錯誤），讓下一個請求試探"""
+        with self._lock:
+            self.probe_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.probe_started_at = None
+            self.consecutive_failures += 1
+            should_open = (
+                self.state == "half_open"
+                or self.consecutive_failures >= RESILIENCE["BREAKER_FAILURE_THRESHOLD"]
+            )
+            if should_open and self.state != "open":
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                metrics.increment(f"{self.name}.breaker_opened")
+                logger.error(f"斷路器 {self.name} 開啟：連續失敗 {self.consecutive_failures} 次")
+
+    def is_open(self):
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < RESILIENCE["BREAKER_RESET_SECONDS"]
+
+    def status(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+# 以 contextvar 保存預算：執行緒模式下每個執行緒各自一份，asyncio 模式下每個 task 各自一份
+_retry_budget = contextvars.ContextVar("retry_budget", default=None)
+
+
+def get_breaker(api):
+    """取得（必要時建立）指定 API 的斷路器"""
+    with _breakers_lock:
+        if api not in _breakers:
+            _breakers[api] = CircuitBreaker(api)
+            metrics.register_gauge(f"{api}.breaker", _breakers[api].status)
+        return _breakers[api]
+
+
+def is_open(api):
+    """指定 API 的斷路器是否開啟中"""
+    return get_breaker(api).is_open()
+
+
+def start_request_budget(budget=None):
+    """
+    為目前請求設定重試預算（每個 HTTP 請求開始時呼叫）
+
+    Args:
+        budget (int): 重試次數上限，預設 REQUEST_RETRY_BUDGET
+    """
+    _retry_budget.set(budget if budget is not None else RESILIENCE["REQUEST_RETRY_BUDGET"])
+
+
+def _consume_retry_budget():
+    """扣除一次重試預算；未設定預算（背景執行緒）時不限制"""
+    budget = _retry_budget.get()
+    if budget is None:
+        return True
+    if budget <= 0:
+        return False
+    _retry_budget.set(budget - 1)
+    return True
+
+
+def _error_reason(error):
+    """取出 HttpError 的 reason（例如 rateLimitExceeded）"""
+    try:
+        content = json.loads(error.content.decode("utf-8"))
+        err = content.get("error", {})
+        reasons = [e.get("reason") for e in err.get("errors", [])]
+        reasons.append(err.get("status"))
+        return next((r for r in reasons if r in QUOTA_REASONS), reasons[0] if reasons else None)
+    except Exception:
+        return None
+
+
+def _is_quota_error(error):
+    if not isinstance(error, HttpError):
+        return False
+    return error.resp.status == 429 or _error_reason(error) in QUOTA_REASONS
+
+
+def _is_retryable(error):
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUS or _is_quota_error(error)
+    return isinstance(error, (socket.timeout, TimeoutError, ConnectionError))
+
+
+def _retry_delay(error, attempt):
+    """計算等待秒數：full jitter 指數退避；配額錯誤優先採用 Retry-After"""
+    delay = random.uniform(0, min(RESILIENCE["MAX_DELAY_SECONDS"], RESILIENCE["BASE_DELAY_SECONDS"] * (2 ** (attempt - 1))))
+    if _is_quota_error(error):
+        retry_after = error.resp.get("retry-after")
+        try:
+            delay = max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            delay = max(delay, RESILIENCE["QUOTA_MIN_DELAY_SECONDS"])
+    return delay
+
+
+def _handle_failure(error, api, breaker, attempt, idempotent=True):
+    """
+    記錄失敗並決定是否重試
+
+    Args:
+        idempotent (bool): 請求重送是否安全；否則只在配額錯誤時重試
+
+    Returns:
+        float | None: 重試前的等待秒數；None 表示不重試（呼叫端應拋出原錯誤）
+    """
+    if not _is_retryable(error):
+        # 4xx 代表 API 有回應
+        if isinstance(error, HttpError):
+            breaker.record_success()
+        else:
+            breaker.release_probe()
+        return None
+
+    quota_error = _is_quota_error(error)
+    if quota_error:
+        breaker.release_probe()
+        metrics.increment(f"{api}.quota_errors")
+    else:
+        breaker.record_failure()
+        metrics.increment(f"{api}.transient_errors")
+
+    if not idempotent and not quota_error:
+        metrics.increment(f"{api}.non_idempotent_not_retried")
+        logger.error(f"{api} API 非冪等請求失敗，可能已生效，不自動重試: {str(error)}")
+        return None
+
+    if attempt >= RESILIENCE["MAX_ATTEMPTS"]:
+        logger.error(f"{api} API 重試 {attempt} 次仍失敗: {str(error)}")
+        return None
+    if not _consume_retry_budget():
+        metrics.increment(f"{api}.retry_budget_exhausted")
+        logger.error(f"{api} API 本次請求重試預算已用完: {str(error)}")
+        return None
+
+    delay = _retry_delay(error, attempt)
+    metrics.increment(f"{api}.retries")
+    logger.warning(f"{api} API 暫時性錯誤，{delay:.1f} 秒後重試（第 {attempt} 次）: {str(error)}")
+    return delay
+
+
+def _check_breaker(api, breaker):
+    if not breaker.allow():
+        metrics.increment(f"{api}.breaker_rejected")
+        raise CircuitOpenError(f"{api} API 斷路器開啟中，暫停呼叫")
+
+
+def call(func, api, quota=None, idempotent=True):
+    """
+    以限流、重試與斷路器保護執行一個 Google API 呼叫
+
+    Args:
+        func (callable): 實際呼叫（例如 request.execute 或 downloader.next_chunk）
+        api (str): API 名稱（"drive" 或 "sheets"），決定使用的斷路器
+        quota (str): 限流配額名稱（sheets_read、sheets_write、drive），預設與 api 相同
+        idempotent (bool): 重送是否安全（files().create、values().append 等應傳 False）
+
+    Returns:
+        func 的回傳值
+    """
+    breaker = get_breaker(api)
+    attempt = 0
+    while True:
+        attempt += 1
+        _check_breaker(api, breaker)
+        rate_limiter.acquire(quota or api)
+
+        try:
+            result = func()
+            breaker.record_success()
+            return result
+        except Exception as e:
+            delay = _handle_failure(e, api, breaker, attempt, idempotent)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+
+async def call_async(coro_factory, api, quota=None, idempotent=True):
+    """
+    call 的 asyncio 版本（限流與退避等待都不佔用執行緒）
+
+    Args:
+        coro_factory (callable): 每次嘗試都回傳新 coroutine 的函數
+        api (str): API 名稱
+        quota (str): 限流配額名稱，預設與 api 相同
+        idempotent (bool): 重送是否安全
+
+    Returns:
+        coroutine 的結果
+    """
+    breaker = get_breaker(api)
+    attempt = 0
+    while True:
+        attempt += 1
+        _check_breaker(api, breaker)
+        await rate_limiter.acquire_async(quota or api)
+
+        try:
+            result = await coro_factory()
+            breaker.record_success()
+            return result
+        except Exception as e:
+            delay = _handle_failure(e, api, breaker, attempt, idempotent)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+
+
+def execute(request, api, quota=None, idempotent=True, **kwargs):
+    """
+    request.execute() 的重試版本
+
+    Args:
+        request: googleapiclient 的 HttpRequest 或 BatchHttpRequest
+        api (str): API 名稱（"drive" 或 "sheets"）
+        quota (str): 限流配額名稱，預設與 api 相同
+        idempotent (bool): 重送是否安全（建立檔案、附加列應傳 False）
+        **kwargs: 傳給 execute() 的參數（例如 http）
+
+    Returns:
+        execute() 的回傳值
+    """
+    return call(lambda: request.execute(**kwargs), api, quota, idempotent)
+
+
+def execute_batch(service, requests, api, quota=None, idempotent=True, **kwargs):
+    """
+    執行批次請求，個別失敗的部分以指數退避只重送失敗的部分
+
+    Args:
+        service: 建立批次的 googleapiclient 服務（new_batch_http_request）
+        requests (dict): {request_id: HttpRequest}
+        api (str): API 名稱
+        quota (str): 限流配額名稱，預設與 api 相同
+        idempotent (bool): 各部分重送是否安全（含建立檔案時傳 False，只重試配額錯誤）
+        **kwargs: 傳給 execute() 的參數（例如 http）
+
+    Returns:
+        tuple: ({request_id: 回應}, {request_id: 錯誤}），錯誤為無法重試或重試後仍失敗的部分
+    """
+    breaker = get_breaker(api)
+    responses = {}
+    errors = {}
+    pending = dict(requests)
+    attempt = 0
+
+    while pending:
+        attempt += 1
+        failed = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                failed[request_id] = exception
+            else:
+                responses[request_id] = response
+
+        batch = service.new_batch_http_request(callback=callback)
+        for request_id, request in pending.items():
+            batch.add(request, request_id=request_id)
+        # 整個批次的失敗由 call 處理（含建立檔案時同樣不重送）
+        execute(batch, api, quota, idempotent, **kwargs)
+
+        retry = {}
+        delay = 0
+        for request_id, error in failed.items():
+            part_delay = _handle_failure(error, api, breaker, attempt, idempotent)
+            if part_delay is None:
+                errors[request_id] = error
+            else:
+                retry[request_id] = pending[request_id]
+                delay = max(delay, part_delay)
+
+        pending = retry
+        if pending:
+            logger.warning(f"{api} 批次請求 {len(pending)} 個部分失敗，{delay:.1f} 秒後只重送失敗的部分")
+            time.sleep(delay)
+
+    return responses, errors
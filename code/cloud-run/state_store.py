@@ -0,0 +1,704 @@
+"""
+街頭藝人申請系統 - 申請狀態本機儲存（SQLite WAL）與 Sheets 同步
+
+原本每次狀態更新都要讀取整張申請記錄表再寫回，狀態查詢也只能讀 Sheets。
+改為：
+1. 申請記錄與處理階段先寫入本機 SQLite（WAL 模式，多執行緒/多 worker 可同時讀寫）
+2. 背景同步執行緒將未同步的狀態批次寫回 Sheets（一次 values.batchUpdate）
+3. 有 GAS 列標記（record_key）的記錄依標記一次批次寫入，不需讀取 Sheets；
+   沒有標記的舊記錄記住分頁與列號，每次同步以一次 values.batchGet 確認這些列的時間戳記仍相符，
+   不符（例如封存搬移）時重新搜尋，Sheets 成為報表用的鏡像
+4. 定期對帳：只讀取已同步記錄所在的列（一次 batchGetByDataFilter），Sheets 狀態與本機不同時重新標記為未同步
+
+Cloud Run 的 /tmp 為記憶體檔案系統，instance 縮減後本機資料會消失；請求式計費的 CPU 在回應後
+也會被節流，背景同步不保證及時執行。因此完成/失敗等結束狀態由呼叫端直接寫入 Sheets，
+本機儲存只負責中間狀態、處理階段與進度事件；直接寫入失敗時才交由背景同步重試。
+預設關閉（STATE_STORE_ENABLED=true 開啟）。
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+from googleapiclient.errors import HttpError
+
+from config import config
+from metrics import metrics
+import resilience
+import record_partition
+
+logger = logging.getLogger(__name__)
+
+# 結束狀態：呼叫端直接寫入 Sheets（mark_written），不只依賴背景同步
+TERMINAL_STATUSES = ("完成", "失敗")
+
+# 本機狀態儲存設定（可用 Cloud Run 環境變數覆寫）
+STATE_STORE = {
+    "ENABLED": os.environ.get("STATE_STORE_ENABLED", "false").lower() == "true",
+    "PATH": os.environ.get("STATE_STORE_PATH", "/tmp/street-artist/state.db"),
+    "SYNC_INTERVAL_SECONDS": float(os.environ.get("STATE_SYNC_INTERVAL_SECONDS", "2")),
+    "RECONCILE_INTERVAL_SECONDS": int(os.environ.get("STATE_RECONCILE_INTERVAL_SECONDS", "300")),
+    "SYNC_LEASE_SECONDS": int(os.environ.get("STATE_SYNC_LEASE_SECONDS", "60")),
+    "MAX_SYNC_ATTEMPTS": int(os.environ.get("STATE_MAX_SYNC_ATTEMPTS", "20")),
+    "SYNC_BATCH_SIZE": int(os.environ.get("STATE_SYNC_BATCH_SIZE", "50")),
+    "RECONCILE_WINDOW_SECONDS": int(os.environ.get("STATE_RECONCILE_WINDOW_SECONDS", str(7 * 24 * 3600))),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS applications (
+    timestamp TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    application_data TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT '待處理',
+    error_message TEXT NOT NULL DEFAULT '',
+    pdf_url TEXT NOT NULL DEFAULT '',
+    started_at TEXT NOT NULL DEFAULT '',
+    finished_at TEXT NOT NULL DEFAULT '',
+    sheet_name TEXT,
+    sheet_row INTEGER,
+    version INTEGER NOT NULL DEFAULT 0,
+    synced_version INTEGER NOT NULL DEFAULT 0,
+    sync_attempts INTEGER NOT NULL DEFAULT 0,
+    sync_lease_until REAL NOT NULL DEFAULT 0,
+    last_sync_error TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (timestamp, user_id)
+);
+CREATE INDEX IF NOT EXISTS applications_unsynced ON applications (synced_version, version);
+CREATE TABLE IF NOT EXISTS job_stages (
+    timestamp TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    detail TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (timestamp, user_id, stage)
+);
+CREATE TABLE IF NOT EXISTS job_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    at REAL NOT NULL,
+    detail TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS job_events_by_job ON job_events (timestamp, user_id, seq);
+"""
+
+
+class StateStore:
+    """申請記錄與處理階段的本機 SQLite 儲存"""
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str): SQLite 檔案路徑
+        """
+        self.path = path or STATE_STORE["PATH"]
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        """每個執行緒（與 fork 後的程序）使用自己的連線"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ===== 申請記錄 =====
+
+    def upsert_application(self, user_id, application_data):
+        """
+        記錄申請（已存在時只更新申請資料，不覆蓋狀態）
+
+        Args:
+            user_id (str): 用戶 ID
+            application_data (dict): 申請資料（包含時間戳記）
+        """
+        self._connect().execute(
+            """
+            INSERT INTO applications (timestamp, user_id, application_data, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (timestamp, user_id) DO UPDATE SET application_data = excluded.application_data
+            """,
+            (application_data.get("timestamp") or "", user_id, json.dumps(application_data, ensure_ascii=False), time.time())
+        )
+
+    def set_status(self, user_id, application_data, status, pdf_url="", error_message="", started_at="", finished_at=""):
+        """
+        更新申請狀態（標記為未同步，由 SheetsReplicator 寫回 Sheets）
+
+        Args:
+            user_id (str): 用戶 ID
+            application_data (dict): 申請資料（包含時間戳記）
+            status (str): 狀態
+            pdf_url (str): PDF 檔案連結
+            error_message (str): 錯誤訊息
+            started_at (str): 處理開始時間（YYYYMMDD-HHmmss）
+            finished_at (str): 處理完成時間（YYYYMMDD-HHmmss）
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.upsert_application(user_id, application_data)
+            conn.execute(
+                """
+                UPDATE applications
+                SET status = ?, pdf_url = ?, error_message = ?, started_at = ?, finished_at = ?,
+                    version = version + 1, sync_attempts = 0, updated_at = ?
+                WHERE timestamp = ? AND user_id = ?
+                """,
+                (status, pdf_url, error_message, started_at, finished_at, time.time(),
+                 application_data.get("timestamp") or "", user_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_application(self, user_id, timestamp):
+        """
+        讀取申請記錄
+
+        Returns:
+            dict | None: 申請記錄（含同步狀態），不存在時回傳 None
+        """
+        row = self._connect().execute(
+            "SELECT * FROM applications WHERE timestamp = ? AND user_id = ?",
+            (timestamp or "", user_id)
+        ).fetchone()
+        if row is None:
+            return None
+
+        record = dict(row)
+        record["application_data"] = json.loads(record["application_data"])
+        record["synced"] = record["synced_version"] >= record["version"]
+        return record
+
+    def list_applications(self, status=None, limit=100):
+        """
+        列出最近的申請記錄
+
+        Returns:
+            list: 申請記錄
+        """
+        query = "SELECT timestamp, user_id, status, pdf_url, error_message, version, synced_version FROM applications"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY timestamp DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self._connect().execute(query, params).fetchall()]
+
+    # ===== 處理階段 =====
+
+    def record_stage(self, user_id, timestamp, stage, status, detail=None, started_at=None, finished_at=None):
+        """
+        記錄處理階段
+
+        Args:
+            stage (str): 階段名稱
+            status (str): running / done / failed
+            detail (dict): 階段產出（檔案 ID、雜湊等）
+        """
+        self._connect().execute(
+            """
+            INSERT INTO job_stages (timestamp, user_id, stage, status, started_at, finished_at, detail)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (timestamp, user_id, stage) DO UPDATE SET
+                status = excluded.status,
+                started_at = COALESCE(excluded.started_at, job_stages.started_at),
+                finished_at = excluded.finished_at,
+                detail = excluded.detail
+            """,
+            (timestamp or "", user_id, stage, status, started_at, finished_at, json.dumps(detail or {}, ensure_ascii=False))
+        )
+
+    def get_stages(self, user_id, timestamp):
+        """
+        讀取申請的所有處理階段
+
+        Returns:
+            dict: {stage: {"status", "started_at", "finished_at", "detail"}}
+        """
+        rows = self._connect().execute(
+            "SELECT stage, status, started_at, finished_at, detail FROM job_stages WHERE timestamp = ? AND user_id = ?",
+            (timestamp or "", user_id)
+        ).fetchall()
+        return {
+            row["stage"]: {
+                "status": row["status"],
+                "started_at": row["started_at"],
+                "finished_at": row["finished_at"],
+                "detail": json.loads(row["detail"]),
+            }
+            for row in rows
+        }
+
+    # ===== 進度事件 =====
+
+    def append_event(self, user_id, timestamp, stage, detail=None):
+        """
+        新增進度事件
+
+        Returns:
+            int: 事件序號
+        """
+        cursor = self._connect().execute(
+            "INSERT INTO job_events (timestamp, user_id, stage, at, detail) VALUES (?, ?, ?, ?, ?)",
+            (timestamp or "", user_id, stage, time.time(), json.dumps(detail or {}, ensure_ascii=False))
+        )
+        return cursor.lastrowid
+
+    def events_after(self, user_id, timestamp, after_seq=0):
+        """
+        讀取序號之後的進度事件
+
+        Returns:
+            list: [{"seq", "stage", "at", "detail"}, ...]
+        """
+        rows = self._connect().execute(
+            """
+            SELECT seq, stage, at, detail FROM job_events
+            WHERE timestamp = ? AND user_id = ? AND seq > ?
+            ORDER BY seq
+            """,
+            (timestamp or "", user_id, after_seq or 0)
+        ).fetchall()
+        return [
+            {"seq": row["seq"], "stage": row["stage"], "at": row["at"], "detail": json.loads(row["detail"])}
+            for row in rows
+        ]
+
+    # ===== 同步 =====
+
+    def lease_unsynced(self, limit=None):
+        """
+        取得待同步的記錄並設定租約（多個 worker 不會同時同步同一筆）
+
+        Returns:
+            list: 記錄
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """
+                SELECT * FROM applications
+                WHERE synced_version < version AND sync_lease_until < ? AND sync_attempts < ?
+                ORDER BY updated_at LIMIT ?
+                """,
+                (now, STATE_STORE["MAX_SYNC_ATTEMPTS"], limit or STATE_STORE["SYNC_BATCH_SIZE"])
+            ).fetchall()
+            for row in rows:
+                conn.execute(
+                    "UPDATE applications SET sync_lease_until = ? WHERE timestamp = ? AND user_id = ?",
+                    (now + STATE_STORE["SYNC_LEASE_SECONDS"], row["timestamp"], row["user_id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [dict(row) for row in rows]
+
+    def mark_synced(self, record, sheet_name, sheet_row):
+        """記錄已寫回 Sheets（同步期間若又有更新，version 較新，仍保持未同步）"""
+        self._connect().execute(
+            """
+            UPDATE applications
+            SET synced_version = ?, sheet_name = ?, sheet_row = ?, sync_lease_until = 0,
+                sync_attempts = 0, last_sync_error = ''
+            WHERE timestamp = ? AND user_id = ?
+            """,
+            (record["version"], sheet_name, sheet_row, record["timestamp"], record["user_id"])
+        )
+
+    def mark_sync_failed(self, record, error_message):
+        """記錄同步失敗（租約解除，下次同步再試）"""
+        self._connect().execute(
+            """
+            UPDATE applications
+            SET sync_attempts = sync_attempts + 1, sync_lease_until = 0, last_sync_error = ?
+            WHERE timestamp = ? AND user_id = ?
+            """,
+            (error_message, record["timestamp"], record["user_id"])
+        )
+
+    def mark_written(self, user_id, timestamp):
+        """呼叫端已直接寫入 Sheets：目前版本視為已同步"""
+        self._connect().execute(
+            """
+            UPDATE applications
+            SET synced_version = version, sync_attempts = 0, last_sync_error = ''
+            WHERE timestamp = ? AND user_id = ?
+            """,
+            (timestamp or "", user_id)
+        )
+
+    def mark_unsynced(self, timestamp, user_id):
+        """對帳發現 Sheets 與本機不同時重新同步"""
+        self._connect().execute(
+            "UPDATE applications SET synced_version = version - 1, sync_attempts = 0 WHERE timestamp = ? AND user_id = ?",
+            (timestamp, user_id)
+        )
+
+    def synced_records(self, since_seconds):
+        """
+        最近更新且已同步的記錄（對帳用）
+
+        Args:
+            since_seconds (int): 只包含這段時間內更新的記錄
+
+        Returns:
+            list: 記錄
+        """
+        return [dict(row) for row in self._connect().execute(
+            """
+            SELECT timestamp, user_id, status, pdf_url, sheet_name, sheet_row FROM applications
+            WHERE synced_version >= version AND updated_at > ?
+            """,
+            (time.time() - since_seconds,)
+        ).fetchall()]
+
+    def sync_status(self):
+        """
+        同步狀態（/metrics gauge）
+
+        Returns:
+            dict: 未同步筆數與放棄同步筆數
+        """
+        row = self._connect().execute(
+            """
+            SELECT
+                SUM(CASE WHEN synced_version < version AND sync_attempts < ? THEN 1 ELSE 0 END) AS pending,
+                SUM(CASE WHEN synced_version < version AND sync_attempts >= ? THEN 1 ELSE 0 END) AS abandoned
+            FROM applications
+            """,
+            (STATE_STORE["MAX_SYNC_ATTEMPTS"], STATE_STORE["MAX_SYNC_ATTEMPTS"])
+        ).fetchone()
+        return {"pending": row["pending"] or 0, "abandoned": row["abandoned"] or 0}
+
+
+class SheetsReplicator:
+    """將本機狀態批次寫回申請記錄表（背景執行緒）"""
+
+    def __init__(self, store, doc_processor):
+        """
+        Args:
+            store (StateStore): 本機狀態儲存
+            doc_processor (DocumentProcessor): 提供 Sheets 客戶端與記錄搜尋規則
+        """
+        self.store = store
+        self.doc_processor = doc_processor
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self._last_reconcile = time.monotonic()
+
+    def start(self):
+        """
+        啟動同步執行緒（每個程序只啟動一次）
+
+        Returns:
+            bool: 本次是否啟動
+        """
+        if self._thread_pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return False
+        self._stop.clear()
+        self._thread_pid = os.getpid()
+        # 自己的 Sheets 客戶端：httplib2 連線不能與請求執行緒共用
+        self.sheets_service = self.doc_processor.build_sheets_service()
+        self._thread = threading.Thread(target=self._sync_loop, name="sheets-replicator", daemon=True)
+        self._thread.start()
+        logger.info("Sheets 同步執行緒已啟動")
+        return True
+
+    def notify(self):
+        """有新的狀態需要同步"""
+        self._wake.set()
+
+    def stop(self):
+        """停止同步執行緒並盡量寫回剩餘的狀態"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        try:
+            self.sync_once()
+        except Exception as e:
+            logger.warning(f"關閉前同步失敗: {str(e)}")
+
+    def _sync_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(STATE_STORE["SYNC_INTERVAL_SECONDS"])
+            self._wake.clear()
+            try:
+                while self.sync_once():
+                    pass
+                if time.monotonic() - self._last_reconcile >= STATE_STORE["RECONCILE_INTERVAL_SECONDS"]:
+                    self._last_reconcile = time.monotonic()
+                    self.reconcile()
+            except Exception as e:
+                logger.warning(f"Sheets 同步失敗，稍後重試: {str(e)}")
+
+    @staticmethod
+    def _parse_updated_range(updated_range):
+        """
+        解析 Sheets 回傳的更新範圍（例如 'Sheet 1'!A5:K5）
+
+        Returns:
+            tuple: (sheet_name, sheet_row)
+        """
+        sheet_part, cells = updated_range.rsplit("!", 1)
+        if sheet_part.startswith("'") and sheet_part.endswith("'"):
+            sheet_part = sheet_part[1:-1].replace("''", "'")
+        return sheet_part, int(re.search(r"\d+", cells).group())
+
+    def _write_by_key(self, spreadsheet_id, records):
+        """
+        依 GAS 列標記一次寫入所有記錄（values.batchUpdateByDataFilter）
+
+        Returns:
+            tuple: ([(record, sheet_name, sheet_row)], 沒有標記的記錄)
+        """
+        data = [
+            record_partition.status_update_by_key(
+                record["user_id"], record["timestamp"],
+                [record["status"], record["error_message"], record["pdf_url"], record["started_at"], record["finished_at"]]
+            )
+            for record in records
+        ]
+        result = resilience.execute(self.sheets_service.spreadsheets().values().batchUpdateByDataFilter(
+            spreadsheetId=spreadsheet_id,
+            body={"valueInputOption": "USER_ENTERED", "data": data}
+        ), "sheets", quota="sheets_write")
+
+        updated = {}
+        for response in result.get("responses", []):
+            if not response.get("updatedRows"):
+                continue
+            key = response.get("dataFilter", {}).get("developerMetadataLookup", {}).get("metadataValue")
+            updated[key] = self._parse_updated_range(response["updatedRange"])
+
+        written, untagged = [], []
+        for record in records:
+            location = updated.get(f"{record['timestamp']}|{record['user_id']}")
+            if location:
+                written.append((record, *location))
+            else:
+                untagged.append(record)
+        return written, untagged
+
+    def _verify_rows(self, spreadsheet_id, records):
+        """
+        以一次 values.batchGet 確認已知列號的時間戳記仍相符
+
+        Returns:
+            set: 列號仍正確的 (timestamp, user_id)
+        """
+        known = [record for record in records if record.get("sheet_name") and record.get("sheet_row")]
+        if not known:
+            return set()
+        try:
+            result = resilience.execute(self.sheets_service.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=[f"{record['sheet_name']}!A{record['sheet_row']}" for record in known]
+            ), "sheets", quota="sheets_read")
+        except HttpError as e:
+            # 其中一個分頁已不存在：全部改為重新搜尋
+            if e.resp.status == 400:
+                return set()
+            raise
+
+        verified = set()
+        for record, value_range in zip(known, result.get("valueRanges", [])):
+            values = value_range.get("values", [])
+            if values and values[0] and values[0][0] == record["timestamp"]:
+                verified.add((record["timestamp"], record["user_id"]))
+        return verified
+
+    def _locate(self, record, sheet_values, verified):
+        """找到記錄在 Sheets 的分頁與列號（同一批次的分頁只讀取一次）"""
+        if (record["timestamp"], record["user_id"]) in verified:
+            return record["sheet_name"], record["sheet_row"]
+
+        spreadsheet_id = config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"]
+
+        application_data = json.loads(record["application_data"])
+        for sheet_name in record_partition.candidate_sheet_names(record["timestamp"] or None):
+            if sheet_name not in sheet_values:
+                sheet_values[sheet_name] = record_partition.read_records(self.sheets_service, spreadsheet_id, sheet_name)
+            target_row = self.doc_processor.match_record_row(sheet_values[sheet_name], record["user_id"], application_data)
+            if target_row:
+                return sheet_name, target_row
+
+        raise self.doc_processor.record_not_found_error(record["user_id"], application_data)
+
+    def sync_once(self):
+        """
+        同步一批未同步的記錄
+
+        Returns:
+            int: 本次同步成功的筆數
+        """
+        records = self.store.lease_unsynced()
+        if not records:
+            return 0
+
+        spreadsheet_id = config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"]
+        try:
+            written, records = self._write_by_key(spreadsheet_id, records)
+        except Exception as e:
+            for record in records:
+                self.store.mark_sync_failed(record, str(e))
+            metrics.increment("state_store.sync_failures", len(records))
+            raise
+
+        for record, sheet_name, sheet_row in written:
+            self.store.mark_synced(record, sheet_name, sheet_row)
+        if written:
+            metrics.increment("state_store.synced", len(written))
+            logger.info(f"已依列標記同步 {len(written)} 筆狀態到 Sheets")
+        if not records:
+            return len(written)
+
+        # 沒有列標記的舊記錄：確認或搜尋列號後以列號寫入
+        verified = self._verify_rows(spreadsheet_id, records)
+        sheet_values = {}
+        located = []
+        for record in records:
+            try:
+                sheet_name, sheet_row = self._locate(record, sheet_values, verified)
+                located.append((record, sheet_name, sheet_row))
+            except Exception as e:
+                logger.warning(f"找不到要同步的記錄 {record['timestamp']}: {str(e)}")
+                self.store.mark_sync_failed(record, str(e))
+                metrics.increment("state_store.sync_failures")
+
+        if not located:
+            return len(written)
+
+        data = []
+        for record, sheet_name, sheet_row in located:
+            # G. 狀態、H. 錯誤訊息、I. PDF路徑、J. 處理開始時間、K. 處理完成時間
+            data.append({
+                "range": f"{sheet_name}!G{sheet_row}:K{sheet_row}",
+                "values": [[record["status"], record["error_message"], record["pdf_url"],
+                            record["started_at"], record["finished_at"]]]
+            })
+
+        try:
+            resilience.execute(self.sheets_service.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={"valueInputOption": "USER_ENTERED", "data": data}
+            ), "sheets", quota="sheets_write")
+        except Exception as e:
+            for record, _, _ in located:
+                self.store.mark_sync_failed(record, str(e))
+            metrics.increment("state_store.sync_failures", len(located))
+            raise
+
+        for record, sheet_name, sheet_row in located:
+            self.store.mark_synced(record, sheet_name, sheet_row)
+        metrics.increment("state_store.synced", len(located))
+        logger.info(f"已同步 {len(located)} 筆狀態到 Sheets")
+        return len(written) + len(located)
+
+    def _read_keyed_rows(self, spreadsheet_id, records):
+        """
+        以一次 values.batchGetByDataFilter 讀取有列標記的記錄所在列
+
+        Returns:
+            dict: {(timestamp, user_id): 列資料}
+        """
+        result = resilience.execute(self.sheets_service.spreadsheets().values().batchGetByDataFilter(
+            spreadsheetId=spreadsheet_id,
+            body={
+                "majorDimension": "ROWS",
+                "dataFilters": [record_partition.record_key_filter(r["user_id"], r["timestamp"]) for r in records]
+            }
+        ), "sheets", quota="sheets_read")
+
+        rows = {}
+        for matched in result.get("valueRanges", []):
+            values = matched.get("valueRange", {}).get("values", [])
+            for data_filter in matched.get("dataFilters", []):
+                key = data_filter.get("developerMetadataLookup", {}).get("metadataValue", "")
+                timestamp, _, user_id = key.partition("|")
+                rows[(timestamp, user_id)] = values[0] if values else []
+        return rows
+
+    def _read_located_rows(self, spreadsheet_id, records):
+        """
+        以一次 values.batchGet 讀取沒有列標記、已知列號的記錄所在列
+
+        Returns:
+            dict: {(timestamp, user_id): 列資料}
+        """
+        if not records:
+            return {}
+        try:
+            result = resilience.execute(self.sheets_service.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=[f"{r['sheet_name']}!A{r['sheet_row']}:K{r['sheet_row']}" for r in records]
+            ), "sheets", quota="sheets_read")
+        except HttpError as e:
+            # 其中一個分頁已不存在：全部視為不符，重新同步時會重新搜尋
+            if e.resp.status == 400:
+                return {(r["timestamp"], r["user_id"]): [] for r in records}
+            raise
+
+        rows = {}
+        for record, value_range in zip(records, result.get("valueRanges", [])):
+            values = value_range.get("values", [])
+            rows[(record["timestamp"], record["user_id"])] = values[0] if values else []
+        return rows
+
+    def reconcile(self):
+        """
+        對帳：只讀取已同步記錄所在的列（依列標記或已知列號），Sheets 狀態與本機不同時重新同步
+
+        Returns:
+            int: 重新標記的筆數
+        """
+        records = self.store.synced_records(STATE_STORE["RECONCILE_WINDOW_SECONDS"])
+        if not records:
+            return 0
+
+        spreadsheet_id = config.GOOGLE_SHEETS["APPLICATION_RECORD_ID"]
+        rows = self._read_keyed_rows(spreadsheet_id, records)
+        untagged = [r for r in records if (r["timestamp"], r["user_id"]) not in rows and r["sheet_name"]]
+        rows.update(self._read_located_rows(spreadsheet_id, untagged))
+
+        mismatched = 0
+        for record in records:
+            key = (record["timestamp"], record["user_id"])
+            if key not in rows:
+                # 沒有標記也不知道列號：無法對帳
+                continue
+            row = rows[key]
+            row_status = row[6] if len(row) > 6 else ""
+            if not row or row[0] != record["timestamp"] or row_status != record["status"]:
+                self.store.mark_unsynced(record["timestamp"], record["user_id"])
+                mismatched += 1
+
+        if mismatched:
+            metrics.increment("state_store.reconcile_mismatches", mismatched)
+            logger.info(f"對帳發現 {mismatched} 筆與 Sheets 不同，重新同步")
+            self.notify()
+        return mismatched
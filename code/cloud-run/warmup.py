@@ -0,0 +1,122 @@
+"""
+街頭藝人申請系統 - 申請流程預熱
+
+LINE 對話從「我要申請」到 executeFinalApplication 呼叫 Cloud Run 之間有好幾輪，
+這段時間 instance 閒置甚至縮減到零。GAS 在使用者進入申請流程時呼叫 /prefetch：
+1. 請求本身讓 Cloud Run 啟動 instance
+2. 背景下載 Word 模板到快取、確認 access token 不會在申請途中到期
+3. 執行一次 LibreOffice 轉換（第一次啟動需建立使用者設定檔，耗時最久）
+4. 有附上申請資料時，預先產生預設內容的 Word/PDF 放入輸出快取
+
+可頻繁呼叫：已預熱且沒有新的預先產生工作時立即回傳，不啟動背景執行緒。
+"""
+
+import time
+import logging
+import tempfile
+import threading
+
+from credential_provider import credential_provider, CREDENTIALS
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_worker = None
+_converter_warm = False
+
+
+def _credentials_are_warm():
+    remaining = credential_provider.seconds_until_expiry()
+    return remaining is not None and remaining > CREDENTIALS["REFRESH_MARGIN_SECONDS"]
+
+
+def _template_is_warm(doc_processor):
+    return doc_processor.template_is_cached()
+
+
+def warm_status(doc_processor):
+    """
+    目前的預熱狀態
+
+    Returns:
+        dict: {"template": bool, "credentials": bool, "converter": bool}
+    """
+    return {
+        "template": _template_is_warm(doc_processor),
+        "credentials": _credentials_are_warm(),
+        "converter": _converter_warm,
+    }
+
+
+def _warm_up(doc_processor, cache, application_data):
+    global _converter_warm
+    started = time.monotonic()
+
+    try:
+        if not _credentials_are_warm():
+            credential_provider.get_credentials()
+            credential_provider.refresh()
+
+        # 模板快取與雜湊（輸出快取鍵需要）
+        doc_processor.get_template_fingerprint()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            if application_data:
+                # 預先產生：轉換的同時也完成 LibreOffice 預熱
+                _, _, cache_hit = doc_processor.render_documents(application_data, temp_dir, cache=cache)
+                if not cache_hit:
+                    _converter_warm = True
+                logger.info(f"預熱：申請文件{'已在快取' if cache_hit else '已預先產生'}")
+
+            if not _converter_warm:
+                template_path = doc_processor.download_template(temp_dir)
+                doc_processor.convert_to_pdf(template_path, temp_dir)
+                _converter_warm = True
+
+        metrics.increment("prefetch.warmups")
+        logger.info(f"預熱完成，耗時 {time.monotonic() - started:.2f} 秒")
+    except Exception as e:
+        metrics.increment("prefetch.failures")
+        logger.warning(f"預熱失敗（不影響申請流程）: {str(e)}")
+
+
+def prefetch(doc_processor, cache=None, application_data=None):
+    """
+    觸發背景預熱（立即回傳，不等待預熱完成）
+
+    Args:
+        doc_processor (DocumentProcessor): 文件處理器
+        cache (OutputCache): 輸出快取（可選）
+        application_data (dict): 預設申請資料，提供時預先產生文件（可選）
+
+    Returns:
+        dict: {"status": "warm" | "warming" | "started", "warm": {...}}
+    """
+    global _worker
+
+    status = warm_status(doc_processor)
+    already_rendered = True
+    if application_data and cache is not None and status["template"]:
+        key = doc_processor.output_cache_key(application_data)
+        already_rendered = cache.contains(key)
+    elif application_data:
+        already_rendered = False
+
+    if all(status.values()) and already_rendered:
+        metrics.increment("prefetch.already_warm")
+        return {"status": "warm", "warm": status}
+
+    with _lock:
+        if _worker is not None and _worker.is_alive():
+            return {"status": "warming", "warm": status}
+
+        _worker = threading.Thread(
+            target=_warm_up,
+            args=(doc_processor, cache, application_data),
+            name="prefetch-warmup",
+            daemon=True
+        )
+        _worker.start()
+
+    return {"status": "started", "warm": status}
@@ -22,6 +22,9 @@ function doPost(e) {
         handleLineEvent(event);
       });
       
+      // 回覆都已送出，再執行不影響回覆內容的工作（例如預熱 Cloud Run）
+      flushAfterReplyTasks();
+      
       // 回傳 200 狀態碼給 LINE
       return ContentService.createTextOutput('OK').setMimeType(ContentService.MimeType.TEXT);
       
@@ -50,6 +53,32 @@ function doPost(e) {
   }
 }
 
+// 本次執行中回覆送出後才執行的工作
+const AFTER_REPLY_TASKS = [];
+
+/**
+ * 登記回覆送出後才執行的工作（避免慢速呼叫拖慢 LINE 回覆或讓 replyToken 過期）
+ * @param {string} name - 工作名稱（記錄用）
+ * @param {Function} task - 要執行的函數
+ */
+function runAfterReply(name, task) {
+  AFTER_REPLY_TASKS.push({ name: name, task: task });
+}
+
+/**
+ * 執行所有登記的工作（個別失敗不影響其他工作）
+ */
+function flushAfterReplyTasks() {
+  while (AFTER_REPLY_TASKS.length > 0) {
+    const entry = AFTER_REPLY_TASKS.shift();
+    try {
+      entry.task();
+    } catch (error) {
+      console.warn('⚠️ 回覆後工作失敗:', entry.name, error);
+    }
+  }
+}
+
 /**
  * GET 請求處理器 - 測試用
  */
@@ -282,13 +311,18 @@ function handleApplicationIntent(userId) {
   const defaultDates = getDefaultDates(targetMonth.month, targetMonth.year);
   
   // 設定用戶狀態
-  setUserState(userId, {
+  const newState = {
     currentStep: 'application_started',
     targetMonth: targetMonth,
     selectedDates: defaultDates.dates,
     useDefaultVideo: true,
     context: 'application'
-  });
+  };
+  setUserState(userId, newState);
+  
+  // 預熱 Cloud Run（使用者確認期間先啟動 instance 並預先產生預設文件）
+  // 回覆送出後才呼叫：冷啟動時不會拖慢回覆
+  runAfterReply('prefetchCloudRun', () => prefetchCloudRun(userId, newState));
   
   // 回覆預設選項
   return `老媽，現在可申請${targetMonth.display}場地。
@@ -571,7 +605,7 @@ function executeFinalApplication(userId, groupId = null) {
     if (CONFIG.PHASE4.ENABLE_SHEETS_RECORDING) {
       console.log('📊 Phase 4: 記錄申請資訊到 Sheets');
       
-      applicationData = prepareApplicationData(state);
+      applicationData = prepareApplicationData(state, userId);
       const recordSuccess = recordApplicationToSheets(userId, applicationData);
       
       if (!recordSuccess) {
@@ -585,40 +619,29 @@ function executeFinalApplication(userId, groupId = null) {
       console.log('🚀 Phase 5-6: 自動呼叫 Cloud Run 處理文件和網站自動化');
       
       if (!applicationData) {
-        applicationData = prepareApplicationData(state);
+        applicationData = prepareApplicationData(state, userId);
       }
       
-      // 步驟 1: GAS 複製 Word 模板
-      const copyResult = copyWordTemplate(applicationData);
-      
-      if (copyResult.success) {
-        console.log('✅ 模板複製成功，開始呼叫 Cloud Run');
-        
-        // 步驟 2: 呼叫 Cloud Run，傳送複製檔案的 ID、時間戳記和群組 ID
-        const cloudRunData = {
-          timestamp: applicationData.timestamp,  // 用於精確識別記錄
-          user_id: userId,                       // 用戶 ID
-          application_data: {
-            ...applicationData,
-            copiedFileId: copyResult.copiedFileId,
-            pdfFileId: copyResult.pdfFileId,
-            copiedFileName: copyResult.wordFileName,
-            pdfFileName: copyResult.pdfFileName
-          }
-        };
-        
-        // Phase 6: 傳入 groupId
-        const cloudRunResult = callCloudRunForDocumentProcessing(userId, cloudRunData, groupId);
-        
-        if (cloudRunResult.success) {
-          documentProcessingMessage = '\n🔄 文件處理和網站自動化已啟動\n📄 Word 檔案：' + copyResult.wordFileName + '\n📄 PDF 檔案：' + copyResult.pdfFileName + '\n🌐 系統將自動填寫表單，完成後會發送截圖';
-        } else {
-          documentProcessingMessage = '\n⚠️ 自動化啟動失敗，但檔案已準備\n📄 Word：' + copyResult.wordFileName + '\n📄 PDF：' + copyResult.pdfFileName;
-          console.error('❌ Cloud Run 呼叫失敗:', cloudRunResult.error);
+      // 單一 HTTP 呼叫：由 Cloud Run 建立 Word/PDF 檔案並處理文件（不再需要 GAS 先複製模板）
+      const cloudRunData = {
+        timestamp: applicationData.timestamp,  // 用於精確識別記錄
+        user_id: userId,                       // 用戶 ID
+        application_data: {
+          ...applicationData
         }
+      };
+      
+      // Phase 6: 傳入 groupId
+      const cloudRunResult = callCloudRunForDocumentProcessing(userId, cloudRunData, groupId);
+      
+      if (cloudRunResult.inProgress) {
+        documentProcessingMessage = '\n⏳ 文件處理中，完成後會發送連結';
+      } else if (cloudRunResult.success) {
+        const result = cloudRunResult.result || {};
+        documentProcessingMessage = '\n🔄 文件處理已完成\n📄 Word 檔案：' + result.word_file_name + '\n📄 PDF 檔案：' + result.pdf_file_name;
       } else {
-        documentProcessingMessage = '\n❌ 模板複製失敗，無法啟動自動化\n🔧 ' + copyResult.message;
-        console.error('❌ 模板複製失敗:', copyResult.message);
+        documentProcessingMessage = '\n⚠️ 文件處理失敗';
+        console.error('❌ Cloud Run 呼叫失敗:', cloudRunResult.error);
       }
     }
     
@@ -1413,8 +1436,7 @@ function recordApplicationToSheets(userId, applicationData) {
     console.log('📊 開始記錄申請資訊到 Sheets');
     
     const config = CONFIG.PHASE4.GOOGLE_SHEETS;
-    const sheet = SpreadsheetApp.openById(config.APPLICATION_RECORD_ID)
-      .getSheetByName(config.SHEET_NAME);
+    const sheet = getApplicationRecordSheet(applicationData.timestamp);
     
     if (!sheet) {
       console.error('❌ 找不到指定的工作表:', config.SHEET_NAME);
@@ -1436,10 +1458,21 @@ function recordApplicationToSheets(userId, applicationData) {
       ''                           // K. 處理完成時間
     ];
     
-    // 寫入資料
-    sheet.appendRow(rowData);
+    // 寫入資料並標記該列（Cloud Run 以標記更新狀態，不受封存刪除造成的列號位移影響）
+    // 鎖定避免其他申請同時附加，使 getLastRow 指到別人的列
+    const lock = LockService.getScriptLock();
+    lock.waitLock(10000);
+    try {
+      sheet.appendRow(rowData);
+      tagApplicationRow(sheet, sheet.getLastRow(), applicationData.timestamp, userId);
+    } finally {
+      lock.releaseLock();
+    }
     console.log('✅ 申請資訊已記錄到 Sheets');
     
+    // F 欄即為此申請人下次的常用影片
+    setApplicantVideoUrl(userId, applicationData.video_url);
+    
     return true;
     
   } catch (error) {
@@ -1448,6 +1481,66 @@ function recordApplicationToSheets(userId, applicationData) {
   }
 }
 
+/**
+ * 以 developer metadata 標記申請記錄列（與 Cloud Run record_partition.record_key 相同格式）
+ * 標記隨列移動，Cloud Run 依標記寫入狀態時不需要列號；標記失敗時 Cloud Run 改以列號更新
+ * @param {Sheet} sheet - 工作表
+ * @param {number} row - 列號
+ * @param {string} timestamp - 時間戳記
+ * @param {string} userId - 用戶ID
+ */
+function tagApplicationRow(sheet, row, timestamp, userId) {
+  try {
+    sheet.getRange(row + ':' + row).addDeveloperMetadata('record_key', timestamp + '|' + userId);
+  } catch (error) {
+    console.warn('⚠️ 標記申請記錄列失敗（Cloud Run 改以列號更新）:', error);
+  }
+}
+
+/**
+ * 取得申請記錄要寫入的工作表
+ * 開啟 PARTITION_BY_MONTH 時依時間戳記寫入「{SHEET_NAME}_YYYYMM」月分頁（不存在時建立並複製標題列），
+ * Cloud Run 依同樣規則直接讀取該分頁，讀取量不隨歷史記錄成長
+ * Config.js 需設定 CONFIG.PHASE4.GOOGLE_SHEETS.PARTITION_BY_MONTH: true，
+ * 且必須與 Cloud Run 的環境變數 RECORD_PARTITION_BY_MONTH=true 同時開啟
+ * @param {string} timestamp - 時間戳記（YYYYMMDD-HHmmss）
+ * @return {Sheet} 工作表
+ */
+function getApplicationRecordSheet(timestamp) {
+  const config = CONFIG.PHASE4.GOOGLE_SHEETS;
+  const spreadsheet = SpreadsheetApp.openById(config.APPLICATION_RECORD_ID);
+  const baseSheet = spreadsheet.getSheetByName(config.SHEET_NAME);
+  
+  if (!config.PARTITION_BY_MONTH || !/^\d{8}-\d{6}$/.test(timestamp || '')) {
+    return baseSheet;
+  }
+  
+  const partitionName = `${config.SHEET_NAME}_${timestamp.substring(0, 6)}`;
+  let partition = spreadsheet.getSheetByName(partitionName);
+  if (partition) {
+    return partition;
+  }
+  
+  // 同時有兩筆申請建立同一個分頁時避免重複建立
+  const lock = LockService.getScriptLock();
+  lock.waitLock(10000);
+  try {
+    partition = spreadsheet.getSheetByName(partitionName);
+    if (!partition) {
+      partition = spreadsheet.insertSheet(partitionName);
+      if (baseSheet && baseSheet.getLastColumn() > 0) {
+        const header = baseSheet.getRange(1, 1, 1, baseSheet.getLastColumn()).getValues();
+        partition.getRange(1, 1, 1, header[0].length).setValues(header);
+      }
+      console.log('📄 已建立月分頁:', partitionName);
+    }
+  } finally {
+    lock.releaseLock();
+  }
+  
+  return partition;
+}
+
 /**
  * 格式化日期陣列為 Sheets 儲存格式
  * @param {Array} selectedDates - 選擇的日期陣列
@@ -1497,25 +1590,55 @@ function formatDatesForSheet(selectedDates) {
   }).join(',');
 }
 
+/**
+ * 取得申請人的常用影片連結（即最近一次申請記錄的 F 欄，Cloud Run 預先產生文件也讀取該欄）
+ * @param {string} userId - 用戶ID
+ * @return {string|null} 影片連結，尚未申請過時回傳 null
+ */
+function getApplicantVideoUrl(userId) {
+  if (!userId) {
+    return null;
+  }
+  return PropertiesService.getScriptProperties().getProperty('LATEST_VIDEO_URL_' + userId);
+}
+
+/**
+ * 記錄申請人的常用影片連結
+ * @param {string} userId - 用戶ID
+ * @param {string} videoUrl - 影片連結
+ */
+function setApplicantVideoUrl(userId, videoUrl) {
+  if (!userId || !videoUrl) {
+    return;
+  }
+  try {
+    PropertiesService.getScriptProperties().setProperty('LATEST_VIDEO_URL_' + userId, videoUrl);
+  } catch (error) {
+    console.warn('⚠️ 記錄申請人常用影片失敗（不影響本次申請）:', error);
+  }
+}
+
 /**
  * 準備申請資料物件
  * @param {Object} state - 用戶狀態
+ * @param {string} userId - 用戶ID（決定常用影片）
  * @return {Object} 申請資料物件
  */
-function prepareApplicationData(state) {
+function prepareApplicationData(state, userId) {
   // 決定影片來源和連結
   let videoSource, video_url;
   
   if (state.useDefaultVideo) {
     videoSource = '常用影片';
     
-    // ✨ 修改：優先使用最新上傳的影片
+    // 優先使用申請人上次申請的影片（與 Cloud Run 預先產生文件相同），其次為最新上傳的影片
     try {
-      const latestVideoUrl = PropertiesService.getScriptProperties()
+      const applicantVideoUrl = getApplicantVideoUrl(userId);
+      const latestVideoUrl = applicantVideoUrl || PropertiesService.getScriptProperties()
         .getProperty('LATEST_VIDEO_URL');
       
       video_url = latestVideoUrl || CONFIG.PHASE3.GOOGLE_DRIVE.DEFAULT_VIDEO_URL;
-      console.log('📹 使用影片 URL:', latestVideoUrl ? '最新上傳' : '預設影片', video_url);
+      console.log('📹 使用影片 URL:', applicantVideoUrl ? '上次申請' : (latestVideoUrl ? '最新上傳' : '預設影片'), video_url);
     } catch (propError) {
       console.warn('⚠️ 讀取最新影片 URL 失敗，使用預設影片:', propError);
       video_url = CONFIG.PHASE3.GOOGLE_DRIVE.DEFAULT_VIDEO_URL;
@@ -1601,7 +1724,7 @@ function testSheetsRecording() {
  * @param {string} userId - 用戶ID
  * @param {Object} cloudRunData - 完整的 Cloud Run 請求資料
  * @param {string} groupId - 群組ID（用於回調通知）
- * @return {Object} 處理結果 {success: boolean, message: string, error?: string}
+ * @return {Object} 處理結果 {success: boolean, inProgress?: boolean, message: string, error?: string}
  */
 function callCloudRunForDocumentProcessing(userId, cloudRunData, groupId = null) {
   try {
@@ -1637,6 +1760,16 @@ function callCloudRunForDocumentProcessing(userId, cloudRunData, groupId = null)
     console.log('📥 Cloud Run 回應狀態:', responseCode);
     console.log('📄 Cloud Run 回應內容:', responseText);
     
+    if (responseCode === 202) {
+      // 同一筆申請正由其他請求或批次處理中：結果由該處理完成後回調，不視為失敗
+      console.log('⏳ 申請已在處理中，等待回調');
+      return {
+        success: true,
+        inProgress: true,
+        message: '申請已在處理中'
+      };
+    }
+    
     if (responseCode === 200) {
       try {
         const result = JSON.parse(responseText);
@@ -1798,67 +1931,36 @@ function testCloudRunConnection() {
 }
 
 /**
- * 複製 Word 模板檔案並建立 PDF 佔位檔案（Phase 5 方案 B）
- * @param {Object} applicationData - 申請資料
- * @return {Object} {success: boolean, copiedFileId: string, pdfFileId: string, message: string}
+ * 通知 Cloud Run 預熱（失敗不影響申請流程）
+ * @param {string} userId - 用戶ID
+ * @param {Object} state - 用戶狀態（用於預先產生預設文件）
  */
-function copyWordTemplate(applicationData) {
+function prefetchCloudRun(userId, state) {
   try {
-    console.log('📄 Phase 5: 複製 Word 模板檔案並建立 PDF 佔位檔案');
-    
-    const templateConfig = CONFIG.PHASE5.TEMPLATE;
-    const wordTemplateId = templateConfig.WORD_FILE_ID;
-    const pdfTemplateId = templateConfig.PDF_FILE_ID;
-    const generatedFolderId = templateConfig.GENERATED_FOLDER_ID;
-    
-    // 生成檔案名稱（包含時間戳記）
-    const now = new Date();
-    const year = applicationData.year;
-    const month = applicationData.month;
-    const monthStr = month.toString().padStart(2, '0');
-    const dayStr = now.getDate().toString().padStart(2, '0');
-    const hourStr = now.getHours().toString().padStart(2, '0');
-    const minuteStr = now.getMinutes().toString().padStart(2, '0');
-    
-    const baseFileName = `申請表_${year}年${monthStr}月_${monthStr}${dayStr}_${hourStr}${minuteStr}`;
-    const wordFileName = `${baseFileName}_待處理`;
-    const pdfFileName = `${baseFileName}`;
-    
-    console.log('📝 生成檔案名稱:', wordFileName, pdfFileName);
-    
-    // 取得模板檔案和目標資料夾
-    const wordTemplateFile = DriveApp.getFileById(wordTemplateId);
-    const pdfTemplateFile = DriveApp.getFileById(pdfTemplateId);
-    const generatedFolder = DriveApp.getFolderById(generatedFolderId);
-    
-    // 1. 複製 Word 檔案（方案 B：複製時就改名）
-    const copiedWordFile = wordTemplateFile.makeCopy(wordFileName, generatedFolder);
-    const copiedFileId = copiedWordFile.getId();
-    
-    // 2. 複製 PDF 檔案（方案 B：複製時就改名）
-    const copiedPdfFile = pdfTemplateFile.makeCopy(pdfFileName, generatedFolder);
-    const pdfFileId = copiedPdfFile.getId();
-    
-    console.log('✅ Word 複製成功:', copiedFileId);
-    console.log('✅ PDF 複製成功:', pdfFileId);
-    
-    return {
-      success: true,
-      copiedFileId: copiedFileId,
-      pdfFileId: pdfFileId,
-      wordFileName: wordFileName + '.docx',
-      pdfFileName: pdfFileName + '.pdf',
-      message: 'Word 模板和 PDF 模板複製成功'
+    const url = CONFIG.PHASE6.CLOUD_RUN.SERVICE_URL + '/prefetch';
+    const applicationData = prepareApplicationData(state, userId);
+    const options = {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      payload: JSON.stringify({
+        user_id: userId,
+        application_data: {
+          year: applicationData.year,
+          month: applicationData.month,
+          selected_dates: applicationData.selected_dates,
+          video_url: applicationData.video_url
+        }
+      }),
+      muteHttpExceptions: true
     };
     
+    const response = UrlFetchApp.fetch(url, options);
+    console.log('🔥 Cloud Run 預熱:', response.getResponseCode(), response.getContentText());
+    
   } catch (error) {
-    console.error('❌ 複製模板失敗:', error);
-    return {
-      success: false,
-      copiedFileId: null,
-      pdfFileId: null,
-      message: '模板複製失敗: ' + error.message
-    };
+    console.warn('⚠️ Cloud Run 預熱失敗（不影響申請）:', error);
   }
 }
 